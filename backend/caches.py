@@ -0,0 +1,243 @@
+"""In-process result caches."""
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from images import PreparedImage
+
+
+# In-process result cache
+class ResultCache:
+    """Bounded in-memory cache with TTL, LRU eviction and stale-while-revalidate.
+
+    Entries are evicted least-recently-used first once either ``max_entries``
+    or ``max_bytes`` is exceeded. An entry older than ``ttl`` but younger than
+    ``ttl + stale_ttl`` is still served, while a single background refresh
+    replaces it.
+    """
+
+    def __init__(self, ttl: float, stale_ttl: float = 0.0, max_entries: int = 1024,
+                 max_bytes: int = 8 * 1024 * 1024, sizeof=None, should_cache=None, on_evict=None):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof or (lambda value: len(repr(value)))
+        self.should_cache = should_cache or (lambda value: value is not None)
+        self.on_evict = on_evict
+        self._entries: "OrderedDict[Any, tuple]" = OrderedDict()  # key -> (value, size, stored_at)
+        self._bytes = 0
+        self._inflight: Dict[Any, asyncio.Task] = {}
+        self._refreshing: Dict[Any, asyncio.Task] = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, allow_stale: bool = False):
+        """Return a cached value or None. Expired entries are dropped."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, _, stored_at = entry
+        age = time.monotonic() - stored_at
+        if age > self.ttl + self.stale_ttl:
+            self.pop(key)
+            return None
+        if age > self.ttl and not allow_stale:
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        size = self.sizeof(value)
+        if size > self.max_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._bytes -= previous[1]
+        self._entries[key] = (value, size, time.monotonic())
+        self._bytes += size
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            evicted_key, (_, evicted_size, _) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            if self.on_evict:
+                self.on_evict(evicted_key)
+
+    def pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+        self._bytes -= entry[1]
+        if self.on_evict:
+            self.on_evict(key)
+        return entry[0]
+
+    def clear(self):
+        for key in list(self._entries):
+            self.pop(key)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+        }
+
+    async def get_or_load(self, key, loader):
+        """Return the cached value for ``key``, calling ``loader()`` on a miss.
+
+        Concurrent misses for the same key share one ``loader()`` call, which
+        keeps running if the caller that started it is cancelled. Results
+        rejected by ``should_cache`` (None by default) are returned but not cached.
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            age = time.monotonic() - entry[2]
+            if age <= self.ttl:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return entry[0]
+            if age <= self.ttl + self.stale_ttl:
+                self.stale_hits += 1
+                self._entries.move_to_end(key)
+                if key not in self._refreshing:
+                    task = asyncio.create_task(self._refresh(key, loader))
+                    self._refreshing[key] = task
+                    task.add_done_callback(lambda _, k=key: self._refreshing.pop(k, None))
+                return entry[0]
+            self.pop(key)
+
+        self.misses += 1
+        return await self._load(key, loader)
+
+    async def _refresh(self, key, loader):
+        try:
+            await self._load(key, loader)
+        except Exception as e:
+            logging.warning(f"Background cache refresh failed for {key!r}: {e}")
+
+    async def _load(self, key, loader):
+        # The load runs in a task owned by the cache, so a caller that gets
+        # cancelled (client disconnect) doesn't fail the others sharing it
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._run_loader(key, loader))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done, k=key: self._load_done(k, done))
+        return await asyncio.shield(task)
+
+    async def _run_loader(self, key, loader):
+        value = await loader()
+        if self.should_cache(value):
+            self.set(key, value)
+        return value
+
+    def _load_done(self, key, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # mark retrieved when every caller has gone
+
+
+# Image result cache
+class ImageResultCache:
+    """Result cache for image endpoints keyed on the normalized JPEG bytes.
+
+    Exact repeats are found by SHA-256. Near-duplicates (recompressed or
+    resized copies) are found by dHash within ``max_distance`` bits, using a
+    band index: the hash is split into ``max_distance + 1`` bands, so any two
+    hashes within the distance share at least one identical band.
+    """
+
+    def __init__(self, ttl: float, max_entries: int, max_bytes: int, max_distance: int = 3, should_cache=None):
+        self.max_distance = max(0, min(max_distance, 15))
+        self.bands = self.max_distance + 1
+        self.band_bits = 64 // self.bands
+        self._dhashes: Dict[str, int] = {}
+        self._band_index: Dict[tuple, set] = {}
+        self.near_hits = 0
+        self.cache = ResultCache(
+            ttl=ttl,
+            max_entries=max_entries,
+            max_bytes=max_bytes,
+            sizeof=lambda result: len(result.model_dump_json()) + 128,
+            should_cache=should_cache,
+            on_evict=self._forget,
+        )
+
+    def _bands(self, dhash: int):
+        mask = (1 << self.band_bits) - 1
+        return [(i, (dhash >> (i * self.band_bits)) & mask) for i in range(self.bands)]
+
+    def _remember(self, key: str, dhash: int):
+        if key not in self.cache._entries or key in self._dhashes:
+            return
+        self._dhashes[key] = dhash
+        for band in self._bands(dhash):
+            self._band_index.setdefault(band, set()).add(key)
+
+    def _forget(self, key: str):
+        dhash = self._dhashes.pop(key, None)
+        if dhash is None:
+            return
+        for band in self._bands(dhash):
+            keys = self._band_index.get(band)
+            if keys:
+                keys.discard(key)
+                if not keys:
+                    del self._band_index[band]
+
+    def _find_similar(self, dhash: int) -> Optional[str]:
+        # Near-uniform images (solid colours, blank frames) all hash alike
+        if not self.max_distance or not 4 <= dhash.bit_count() <= 60:
+            return None
+        best_key, best_distance = None, self.max_distance + 1
+        for band in self._bands(dhash):
+            for key in self._band_index.get(band, ()):
+                distance = (self._dhashes[key] ^ dhash).bit_count()
+                if distance < best_distance:
+                    best_key, best_distance = key, distance
+        return best_key
+
+    async def get_or_compute(self, prepared: PreparedImage, compute):
+        """Return a cached result for this image or a near-duplicate, else ``await compute()``.
+
+        Concurrent uploads of identical bytes share one ``compute()`` call.
+        """
+        key, dhash = prepared.digest, prepared.dhash
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.cache.hits += 1
+            return cached
+
+        similar_key = self._find_similar(dhash)
+        if similar_key is not None:
+            cached = self.cache.get(similar_key)
+            if cached is not None:
+                self.near_hits += 1
+                return cached
+
+        result = await self.cache.get_or_load(key, compute)
+        self._remember(key, dhash)
+        return result
+
+    async def get_or_compute_group(self, prepared: List[PreparedImage], tags: List[str], compute):
+        """Like ``get_or_compute`` for a set of images, each with a tag; exact matches only."""
+        parts = sorted(f"{image.digest}:{tag}" for image, tag in zip(prepared, tags))
+        key = "group:" + hashlib.sha256("|".join(parts).encode()).hexdigest()
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.cache.hits += 1
+            return cached
+        return await self.cache.get_or_load(key, compute)
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.cache.stats(), "near_hits": self.near_hits}
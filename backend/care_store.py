@@ -0,0 +1,100 @@
+"""Persistent species care store (SQLite, shared by all workers on the node)."""
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional
+
+from models import PlantCareInfo
+
+
+# Persistent species care store
+class SpeciesCareStore:
+    """On-disk store of parsed PlantCareInfo records keyed by Perenual species id.
+
+    Uses SQLite in WAL mode so every worker process on the node can read
+    while another one writes. Queries run in a worker thread so a lock wait
+    or a slow disk never blocks the event loop; a row that no longer parses
+    is treated as missing.
+    """
+
+    def __init__(self, path: str, max_age_days: float = 90):
+        self.path = path
+        self.max_age_seconds = max_age_days * 86400
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS species_care ("
+                " plant_id TEXT PRIMARY KEY,"
+                " data TEXT NOT NULL,"
+                " fetched_at REAL NOT NULL)"
+            )
+            self._conn = conn
+        return self._conn
+
+    async def get(self, plant_id: str, allow_stale: bool = False) -> Optional[PlantCareInfo]:
+        """Return the stored record, or None if missing (or too old unless ``allow_stale``)."""
+        return await asyncio.to_thread(self._get, plant_id, allow_stale)
+
+    async def put(self, care_info: PlantCareInfo):
+        await asyncio.to_thread(self._put, care_info)
+
+    async def fresh_ids(self, plant_ids: List[str]) -> set:
+        """Subset of ``plant_ids`` that already have a non-expired record."""
+        return await asyncio.to_thread(self._fresh_ids, plant_ids)
+
+    def _get(self, plant_id: str, allow_stale: bool) -> Optional[PlantCareInfo]:
+        try:
+            with self._lock:
+                row = self._connect().execute(
+                    "SELECT data, fetched_at FROM species_care WHERE plant_id = ?", (plant_id,)
+                ).fetchone()
+            if row is None:
+                return None
+            data, fetched_at = row
+            if not allow_stale and time.time() - fetched_at > self.max_age_seconds:
+                return None
+            return PlantCareInfo.model_validate_json(data)
+        except (sqlite3.Error, ValueError) as e:
+            logging.error(f"Error reading care store record {plant_id}: {e}")
+            return None
+
+    def _put(self, care_info: PlantCareInfo):
+        try:
+            with self._lock:
+                self._connect().execute(
+                    "INSERT OR REPLACE INTO species_care (plant_id, data, fetched_at) VALUES (?, ?, ?)",
+                    (care_info.plant_id, care_info.model_dump_json(), time.time()),
+                )
+        except sqlite3.Error as e:
+            logging.error(f"Error writing care store: {e}")
+
+    def _fresh_ids(self, plant_ids: List[str]) -> set:
+        cutoff = time.time() - self.max_age_seconds
+        found = set()
+        with self._lock:
+            conn = self._connect()
+            for i in range(0, len(plant_ids), 500):
+                chunk = plant_ids[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = conn.execute(
+                    f"SELECT plant_id FROM species_care WHERE fetched_at >= ? AND plant_id IN ({placeholders})",
+                    (cutoff, *chunk),
+                ).fetchall()
+                found.update(row[0] for row in rows)
+        return found
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,314 @@
+"""Chat answer cache and server-side chat sessions."""
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from caches import ResultCache
+from translation import RussianStemmer
+
+
+# Chat answer cache
+# Greetings, pronouns and particles that don't change what is being asked.
+# Question words ("почему", "какой", "сколько"), the negation "не" and
+# qualifiers such as "часто", "лучше", "правильно" or "надо" change the
+# answer and are deliberately kept.
+CHAT_STOPWORDS = frozenset("""
+    а б бы в во вот ведь вы да для его ее же здравствуй здравствуйте и из их к как ко ли ль мне меня
+    мое моего моей моем мои моих мой моя мы на ну о об он она они оно по подскажи подскажите пожалуйста
+    привет про расскажи расскажите с скажи скажите со там тетушка тетя то тут ты у что это эта эти этот
+    я plauntie
+""".split())
+
+
+class ChatAnswerCache:
+    """Answer cache for chat questions keyed on their normalized wording.
+
+    A question is reduced to the set of its stemmed words minus greetings
+    and particles, so case, punctuation, word order, inflection and filler
+    don't matter: "Как поливать фикус?" and "подскажите, как поливать
+    фикусы" share one entry. Only an exact match of that set is a hit; a
+    question that adds, drops or negates a word ("зимой", "не", a plant
+    name) is a different question and gets its own answer.
+    """
+
+    def __init__(self, ttl: float, max_entries: int, max_bytes: int, max_question_chars: int = 300,
+                 should_cache=None):
+        self.stemmer = RussianStemmer()
+        self.max_question_chars = max_question_chars
+        self.bypassed = 0
+        self.cache = ResultCache(
+            ttl=ttl,
+            max_entries=max_entries,
+            max_bytes=max_bytes,
+            sizeof=lambda answer: len(answer.encode()) + 128,
+            should_cache=should_cache or (lambda answer: bool(answer)),
+        )
+
+    def normalize(self, question: str) -> Optional[str]:
+        """Cache key for ``question``: its sorted stemmed content words, or None when it shouldn't be cached."""
+        if len(question) > self.max_question_chars:
+            return None
+        words = {
+            self.stemmer.stem(word) for word in RussianStemmer.words(question) if word not in CHAT_STOPWORDS
+        }
+        return " ".join(sorted(words)) or None
+
+    def lookup(self, question: str) -> Optional[str]:
+        """Cached answer for ``question``, else None."""
+        key = self.normalize(question)
+        if key is None:
+            self.bypassed += 1
+            return None
+        cached = self.cache.get(key)
+        if cached is None:
+            self.cache.misses += 1
+        else:
+            self.cache.hits += 1
+        return cached
+
+    def store(self, question: str, answer: str):
+        key = self.normalize(question)
+        if key is not None and self.cache.should_cache(answer):
+            self.cache.set(key, answer)
+
+    async def get_or_compute(self, question: str, compute):
+        """Return a cached answer for ``question``, else ``await compute()``.
+
+        Concurrent misses for the same normalized question share one ``compute()`` call.
+        """
+        key = self.normalize(question)
+        if key is None:
+            self.bypassed += 1
+            return await compute()
+        return await self.cache.get_or_load(key, compute)
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.cache.stats(), "bypassed": self.bypassed}
+
+
+# Chat sessions
+CHAT_SUMMARY_PROMPT = (
+    "Кратко перескажи разговор пользователя с Plauntie: какие у пользователя растения, проблемы и "
+    "что уже посоветовали. Пиши по-русски, в третьем лице, не больше нескольких предложений."
+)
+CHAT_SUMMARY_PREFIX = "Краткое содержание начала разговора: "
+
+
+def estimate_tokens(text: str) -> int:
+    """Conservative token estimate without a tokenizer (about 4 UTF-8 bytes per token)."""
+    return len(text.encode('utf-8')) // 4 + 4
+
+
+class ChatTurn(NamedTuple):
+    user: str
+    assistant: str
+    tokens: int
+
+
+class ChatSession:
+    __slots__ = ('id', 'turns', 'summary', 'summary_tokens', 'updated_at')
+
+    def __init__(self, session_id: str):
+        self.id = session_id
+        self.turns: List[ChatTurn] = []
+        self.summary: Optional[str] = None
+        self.summary_tokens = 0
+        self.updated_at = time.time()
+
+    @property
+    def tokens(self) -> int:
+        return self.summary_tokens + sum(turn.tokens for turn in self.turns)
+
+    def history(self) -> List[Dict[str, str]]:
+        messages = []
+        if self.summary:
+            messages.append({"role": "system", "content": CHAT_SUMMARY_PREFIX + self.summary})
+        for turn in self.turns:
+            messages.append({"role": "user", "content": turn.user})
+            messages.append({"role": "assistant", "content": turn.assistant})
+        return messages
+
+
+class ChatSessionStore:
+    """Chat histories in SQLite, shared by all workers on the node.
+
+    Sessions are only created here, with server-generated ids; the API
+    refuses messages for an unknown or expired id. A session's history is
+    kept within ``token_budget``. When a new turn pushes it over, the
+    oldest turns are removed in one go until the history is back under
+    ``compact_ratio * token_budget``, and handed to ``summarize`` in the
+    background. Between compactions turns are only appended, so
+    consecutive requests share a byte-identical prefix that provider-side
+    prompt caching can reuse. Idle sessions expire after ``idle_ttl``;
+    beyond ``max_sessions`` the least recently active go first. SQLite
+    calls run in a thread, off the event loop.
+    """
+
+    def __init__(self, path: str, max_sessions: int, idle_ttl: float, token_budget: int,
+                 compact_ratio: float = 0.5, summarize=None):
+        self.path = path
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.token_budget = token_budget
+        self.compact_ratio = compact_ratio
+        self.summarize = summarize
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._summarizing: set = set()  # session ids with a summary call running in this process
+        self._summary_tasks: set = set()
+        self.sessions = 0  # stored sessions as of the last create
+        self.compactions = 0
+        self.summaries = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS chat_sessions ("
+                " id TEXT PRIMARY KEY,"
+                " summary TEXT,"
+                " summary_tokens INTEGER NOT NULL,"
+                " turns TEXT NOT NULL,"
+                " updated_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS chat_sessions_updated_at ON chat_sessions (updated_at)")
+            self._conn = conn
+        return self._conn
+
+    def _load(self, conn: sqlite3.Connection, session_id: str) -> Optional[ChatSession]:
+        row = conn.execute(
+            "SELECT summary, summary_tokens, turns, updated_at FROM chat_sessions WHERE id = ?", (session_id,)
+        ).fetchone()
+        if row is None or time.time() - row[3] > self.idle_ttl:
+            return None
+        session = ChatSession(session_id)
+        session.summary, session.summary_tokens, turns, session.updated_at = row
+        session.turns = [ChatTurn(*turn) for turn in json.loads(turns)]
+        return session
+
+    @staticmethod
+    def _save(conn: sqlite3.Connection, session: ChatSession):
+        conn.execute(
+            "INSERT OR REPLACE INTO chat_sessions (id, summary, summary_tokens, turns, updated_at) VALUES (?, ?, ?, ?, ?)",
+            (session.id, session.summary, session.summary_tokens,
+             json.dumps(session.turns, ensure_ascii=False), session.updated_at),
+        )
+
+    def _create(self) -> ChatSession:
+        session = ChatSession(str(uuid.uuid4()))
+        with self._lock:
+            conn = self._connect()
+            self._save(conn, session)
+            conn.execute("DELETE FROM chat_sessions WHERE updated_at < ?", (time.time() - self.idle_ttl,))
+            count = conn.execute("SELECT COUNT(*) FROM chat_sessions").fetchone()[0]
+            if count > self.max_sessions:
+                conn.execute(
+                    "DELETE FROM chat_sessions WHERE id IN (SELECT id FROM chat_sessions ORDER BY updated_at LIMIT ?)",
+                    (count - self.max_sessions,),
+                )
+                count = self.max_sessions
+            self.sessions = count
+        return session
+
+    def _get(self, session_id: str) -> Optional[ChatSession]:
+        with self._lock:
+            return self._load(self._connect(), session_id)
+
+    def _delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._connect().execute("DELETE FROM chat_sessions WHERE id = ?", (session_id,)).rowcount > 0
+
+    def _append(self, session_id: str, turn: ChatTurn) -> Optional[Tuple[ChatSession, List[ChatTurn]]]:
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")  # another worker may append to the same session
+            try:
+                session = self._load(conn, session_id)
+                if session is None:
+                    conn.execute("ROLLBACK")
+                    return None
+                session.turns.append(turn)
+                dropped = self._compact(session) if session.tokens > self.token_budget else []
+                session.updated_at = time.time()
+                self._save(conn, session)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return session, dropped
+
+    def _compact(self, session: ChatSession) -> List[ChatTurn]:
+        target = self.token_budget * self.compact_ratio
+        tokens = session.tokens
+        evicted = 0
+        while evicted < len(session.turns) and tokens > target:
+            tokens -= session.turns[evicted].tokens
+            evicted += 1
+        dropped, session.turns = session.turns[:evicted], session.turns[evicted:]
+        return dropped
+
+    def _set_summary(self, session_id: str, summary: str) -> bool:
+        with self._lock:
+            return self._connect().execute(
+                "UPDATE chat_sessions SET summary = ?, summary_tokens = ? WHERE id = ?",
+                (summary, estimate_tokens(CHAT_SUMMARY_PREFIX + summary), session_id),
+            ).rowcount > 0
+
+    async def create(self) -> ChatSession:
+        return await asyncio.to_thread(self._create)
+
+    async def get(self, session_id: str) -> Optional[ChatSession]:
+        """The session, or None if it doesn't exist or has expired."""
+        return await asyncio.to_thread(self._get, session_id)
+
+    async def delete(self, session_id: str) -> bool:
+        return await asyncio.to_thread(self._delete, session_id)
+
+    async def append(self, session_id: str, user_message: str, answer: str):
+        """Add a turn to an existing session; a session that expired meanwhile is left alone."""
+        turn = ChatTurn(user_message, answer, estimate_tokens(user_message) + estimate_tokens(answer))
+        result = await asyncio.to_thread(self._append, session_id, turn)
+        if result is None:
+            return
+        session, dropped = result
+        if not dropped:
+            return
+        self.compactions += 1
+        if self.summarize is None or session.id in self._summarizing:
+            return  # the running summary misses these turns; better than stacking LLM calls
+        self._summarizing.add(session.id)
+        task = asyncio.create_task(self._summarize(session, dropped))
+        self._summary_tasks.add(task)
+        task.add_done_callback(self._summary_tasks.discard)
+
+    async def _summarize(self, session: ChatSession, turns: List[ChatTurn]):
+        try:
+            summary = await self.summarize(session.summary, turns)
+        finally:
+            self._summarizing.discard(session.id)
+        if summary and await asyncio.to_thread(self._set_summary, session.id, summary):
+            self.summaries += 1
+
+    async def close(self):
+        for task in list(self._summary_tasks):
+            task.cancel()
+        await asyncio.gather(*self._summary_tasks, return_exceptions=True)
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sessions": self.sessions,
+            "compactions": self.compactions,
+            "summaries": self.summaries,
+        }
@@ -0,0 +1,159 @@
+"""Settings for the Plauntie backend, read from the environment (and backend/.env)."""
+import os
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+# API Keys
+PERENUAL_API_KEY = os.environ.get('PERENUAL_API_KEY')
+PLANTNET_API_KEY = os.environ.get('PLANTNET_API_KEY')
+PLANTBOOK_CLIENT_ID = os.environ.get('PLANTBOOK_CLIENT_ID')
+PLANTBOOK_CLIENT_SECRET = os.environ.get('PLANTBOOK_CLIENT_SECRET')
+PLANTBOOK_API_TOKEN = os.environ.get('PLANTBOOK_API_TOKEN')
+KINDWISE_API_KEY = os.environ.get('KINDWISE_API_KEY')
+RAPIDAPI_KEY = os.environ.get('RAPIDAPI_KEY')
+
+OPENROUTER_API_KEY = os.environ.get('OPENROUTER_API_KEY')
+VAPID_PRIVATE_KEY = os.environ.get("VAPID_PRIVATE_KEY")
+VAPID_PUBLIC_KEY = os.environ.get("VAPID_PUBLIC_KEY")
+
+# Perenual search result cache
+SEARCH_CACHE_TTL_SECONDS = float(os.environ.get('SEARCH_CACHE_TTL_SECONDS', 6 * 3600))
+SEARCH_CACHE_STALE_SECONDS = float(os.environ.get('SEARCH_CACHE_STALE_SECONDS', 24 * 3600))
+SEARCH_CACHE_MAX_ENTRIES = int(os.environ.get('SEARCH_CACHE_MAX_ENTRIES', 2048))
+SEARCH_CACHE_MAX_BYTES = int(os.environ.get('SEARCH_CACHE_MAX_BYTES', 16 * 1024 * 1024))
+
+# RU->EN dictionary for search query translation
+PLANT_TRANSLATIONS_PATH = os.environ.get('PLANT_TRANSLATIONS_PATH', str(ROOT_DIR / 'plant_translations_ru.tsv'))
+
+# Local species search index (memory-mapped; built with `server.py build-species-index`)
+SPECIES_INDEX_PATH = os.environ.get('SPECIES_INDEX_PATH', str(ROOT_DIR / 'species_index.bin'))
+SPECIES_SEARCH_LIMIT = int(os.environ.get('SPECIES_SEARCH_LIMIT', 30))
+SPECIES_SEARCH_MIN_SCORE = float(os.environ.get('SPECIES_SEARCH_MIN_SCORE', 0.35))
+
+# Persistent species care store (SQLite, shared by all workers on the node)
+CARE_STORE_PATH = os.environ.get('CARE_STORE_PATH', str(ROOT_DIR / 'care_store.sqlite3'))
+CARE_STORE_MAX_AGE_DAYS = float(os.environ.get('CARE_STORE_MAX_AGE_DAYS', 90))
+
+# Identify/diagnose result cache (exact content hash + perceptual near-duplicates)
+IMAGE_CACHE_TTL_SECONDS = float(os.environ.get('IMAGE_CACHE_TTL_SECONDS', 24 * 3600))
+IMAGE_CACHE_MAX_ENTRIES = int(os.environ.get('IMAGE_CACHE_MAX_ENTRIES', 2048))
+IMAGE_CACHE_MAX_BYTES = int(os.environ.get('IMAGE_CACHE_MAX_BYTES', 16 * 1024 * 1024))
+IMAGE_CACHE_MAX_DISTANCE = int(os.environ.get('IMAGE_CACHE_MAX_DISTANCE', 3))  # dHash bits, 0 disables near-duplicates
+
+# Chat answer cache (questions without web search, matched on stemmed content words)
+CHAT_CACHE_ENABLED = os.environ.get('CHAT_CACHE_ENABLED', '1') not in ('0', 'false', 'False')
+CHAT_CACHE_TTL_SECONDS = float(os.environ.get('CHAT_CACHE_TTL_SECONDS', 12 * 3600))
+CHAT_CACHE_MAX_ENTRIES = int(os.environ.get('CHAT_CACHE_MAX_ENTRIES', 4096))
+CHAT_CACHE_MAX_BYTES = int(os.environ.get('CHAT_CACHE_MAX_BYTES', 16 * 1024 * 1024))
+CHAT_CACHE_MAX_QUESTION_CHARS = int(os.environ.get('CHAT_CACHE_MAX_QUESTION_CHARS', 300))
+
+# Chat sessions (SQLite shared by all workers on the node; history is compacted to stay within the token budget)
+CHAT_SESSION_STORE_PATH = os.environ.get('CHAT_SESSION_STORE_PATH', str(ROOT_DIR / 'chat_sessions.sqlite3'))
+CHAT_SESSION_MAX = int(os.environ.get('CHAT_SESSION_MAX', 10000))
+CHAT_SESSION_IDLE_SECONDS = float(os.environ.get('CHAT_SESSION_IDLE_SECONDS', 6 * 3600))
+CHAT_HISTORY_TOKEN_BUDGET = int(os.environ.get('CHAT_HISTORY_TOKEN_BUDGET', 3000))
+CHAT_HISTORY_COMPACT_RATIO = float(os.environ.get('CHAT_HISTORY_COMPACT_RATIO', 0.5))  # share of the budget kept after compaction
+CHAT_SUMMARY_ENABLED = os.environ.get('CHAT_SUMMARY_ENABLED', '1') not in ('0', 'false', 'False')
+CHAT_SUMMARY_MAX_TOKENS = int(os.environ.get('CHAT_SUMMARY_MAX_TOKENS', 300))
+
+# Push delivery
+PUSH_WORKERS = int(os.environ.get('PUSH_WORKERS', 16))
+PUSH_QUEUE_MAX = int(os.environ.get('PUSH_QUEUE_MAX', 10000))
+PUSH_MAX_RETRIES = int(os.environ.get('PUSH_MAX_RETRIES', 4))
+PUSH_RETRY_BASE_SECONDS = float(os.environ.get('PUSH_RETRY_BASE_SECONDS', 1.0))
+PUSH_TIMEOUT_SECONDS = float(os.environ.get('PUSH_TIMEOUT_SECONDS', 10))
+PUSH_TTL_SECONDS = int(os.environ.get('PUSH_TTL_SECONDS', 0))
+PUSH_CONNECTIONS_PER_ORIGIN = int(os.environ.get('PUSH_CONNECTIONS_PER_ORIGIN', 20))
+PUSH_PRUNE_BATCH = int(os.environ.get('PUSH_PRUNE_BATCH', 100))
+PUSH_PRUNE_INTERVAL_SECONDS = float(os.environ.get('PUSH_PRUNE_INTERVAL_SECONDS', 5))
+
+# Per-user reminder digests
+PUSH_DIGEST_ENABLED = os.environ.get('PUSH_DIGEST_ENABLED', '1') not in ('0', 'false', 'False')
+PUSH_DIGEST_WINDOW_SECONDS = float(os.environ.get('PUSH_DIGEST_WINDOW_SECONDS', 3600))
+
+# Reminder scheduler
+REMINDER_SCHEDULER_ENABLED = os.environ.get('REMINDER_SCHEDULER_ENABLED', '1') not in ('0', 'false', 'False')
+REMINDER_SCHEDULER_WINDOW_SECONDS = float(os.environ.get('REMINDER_SCHEDULER_WINDOW_SECONDS', 3600))
+REMINDER_SCHEDULER_POLL_SECONDS = float(os.environ.get('REMINDER_SCHEDULER_POLL_SECONDS', 30))
+REMINDER_SCHEDULER_MAX_LATENESS_SECONDS = float(os.environ.get('REMINDER_SCHEDULER_MAX_LATENESS_SECONDS', 24 * 3600))
+REMINDER_SCHEDULER_BATCH_SIZE = int(os.environ.get('REMINDER_SCHEDULER_BATCH_SIZE', 500))
+
+# User collection listings
+LIST_PAGE_MAX = int(os.environ.get('LIST_PAGE_MAX', 1000))
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', 500))
+
+# Run reminder completion in a multi-document transaction (needs a replica set)
+COMPLETE_REMINDER_USE_TRANSACTION = os.environ.get('COMPLETE_REMINDER_USE_TRANSACTION', '0') in ('1', 'true', 'True')
+# Upper bound on items per bulk plant import / bulk reminder completion
+BULK_MAX_ITEMS = int(os.environ.get('BULK_MAX_ITEMS', 500))
+
+# Image uploads
+MAX_UPLOAD_BYTES = int(os.environ.get('MAX_UPLOAD_BYTES', 15 * 1024 * 1024))
+
+# Image preprocessing (runs in a process pool, off the event loop)
+IMAGE_PREPROCESS_WORKERS = int(os.environ.get('IMAGE_PREPROCESS_WORKERS', min(4, os.cpu_count() or 1)))  # 0 = thread
+IMAGE_JPEG_QUALITY = int(os.environ.get('IMAGE_JPEG_QUALITY', 85))
+IMAGE_MAX_EDGES = {
+    'plantnet': int(os.environ.get('IMAGE_MAX_EDGE_PLANTNET', 1280)),
+    'llm': int(os.environ.get('IMAGE_MAX_EDGE_LLM', 1024)),
+}
+
+# OpenRouter client pool
+LLM_MAX_CONCURRENCY = int(os.environ.get('LLM_MAX_CONCURRENCY', 64))
+LLM_MAX_CONNECTIONS = int(os.environ.get('LLM_MAX_CONNECTIONS', 100))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get('LLM_MAX_KEEPALIVE_CONNECTIONS', 20))
+LLM_CONNECT_TIMEOUT_SECONDS = float(os.environ.get('LLM_CONNECT_TIMEOUT_SECONDS', 10))
+LLM_CHAT_TIMEOUT_SECONDS = float(os.environ.get('LLM_CHAT_TIMEOUT_SECONDS', 60))
+LLM_IMAGE_TIMEOUT_SECONDS = float(os.environ.get('LLM_IMAGE_TIMEOUT_SECONDS', 90))
+LLM_MAX_RETRIES = int(os.environ.get('LLM_MAX_RETRIES', 1))
+
+# LLM model routing (comma-separated OpenRouter model pools, in order of preference)
+LLM_CHAT_MODELS = [m.strip() for m in os.environ.get('LLM_CHAT_MODELS', 'qwen/qwen2.5-vl-72b-instruct:free').split(',') if m.strip()]
+LLM_VISION_MODELS = [m.strip() for m in os.environ.get('LLM_VISION_MODELS', 'qwen/qwen2.5-vl-72b-instruct:free').split(',') if m.strip()]
+LLM_ROUTER_EWMA_ALPHA = float(os.environ.get('LLM_ROUTER_EWMA_ALPHA', 0.2))
+LLM_CHAT_RACE_AFTER_SECONDS = float(os.environ.get('LLM_CHAT_RACE_AFTER_SECONDS', 8))  # 0 disables racing a second model
+LLM_VISION_RACE_AFTER_SECONDS = float(os.environ.get('LLM_VISION_RACE_AFTER_SECONDS', 20))
+LLM_MODEL_COOLDOWN_SECONDS = float(os.environ.get('LLM_MODEL_COOLDOWN_SECONDS', 30))  # after a 429 without Retry-After
+
+# Upstream base URLs (overridable to point at stubs, e.g. for backend_benchmark.py)
+PERENUAL_BASE_URL = os.environ.get('PERENUAL_BASE_URL', 'https://perenual.com/api')
+PLANTNET_BASE_URL = os.environ.get('PLANTNET_BASE_URL', 'https://my-api.plantnet.org/v2')
+OPENROUTER_BASE_URL = os.environ.get('OPENROUTER_BASE_URL', 'https://openrouter.ai/api/v1')
+
+# Outbound provider HTTP clients (Perenual, PlantNet)
+PERENUAL_CONNECT_TIMEOUT_SECONDS = float(os.environ.get('PERENUAL_CONNECT_TIMEOUT_SECONDS', 3))
+PERENUAL_READ_TIMEOUT_SECONDS = float(os.environ.get('PERENUAL_READ_TIMEOUT_SECONDS', 8))
+PERENUAL_TOTAL_TIMEOUT_SECONDS = float(os.environ.get('PERENUAL_TOTAL_TIMEOUT_SECONDS', 12))
+PERENUAL_HEDGE_ENABLED = os.environ.get('PERENUAL_HEDGE_ENABLED', '1') in ('1', 'true', 'True')
+PLANTNET_CONNECT_TIMEOUT_SECONDS = float(os.environ.get('PLANTNET_CONNECT_TIMEOUT_SECONDS', 3))
+PLANTNET_READ_TIMEOUT_SECONDS = float(os.environ.get('PLANTNET_READ_TIMEOUT_SECONDS', 15))
+PLANTNET_TOTAL_TIMEOUT_SECONDS = float(os.environ.get('PLANTNET_TOTAL_TIMEOUT_SECONDS', 20))
+PROVIDER_CONNECTIONS_PER_HOST = int(os.environ.get('PROVIDER_CONNECTIONS_PER_HOST', 20))
+PROVIDER_DNS_CACHE_SECONDS = int(os.environ.get('PROVIDER_DNS_CACHE_SECONDS', 300))
+PROVIDER_KEEPALIVE_SECONDS = float(os.environ.get('PROVIDER_KEEPALIVE_SECONDS', 30))
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get('CIRCUIT_FAILURE_THRESHOLD', 5))
+CIRCUIT_RESET_SECONDS = float(os.environ.get('CIRCUIT_RESET_SECONDS', 30))
+HEDGE_MIN_SAMPLES = int(os.environ.get('HEDGE_MIN_SAMPLES', 20))
+HEDGE_MIN_DELAY_SECONDS = float(os.environ.get('HEDGE_MIN_DELAY_SECONDS', 0.1))
+HEDGE_MAX_DELAY_SECONDS = float(os.environ.get('HEDGE_MAX_DELAY_SECONDS', 2.0))
+
+# Provider quotas per worker process (0 = unlimited). Free plans: Perenual 100/day, PlantNet 500/day.
+PERENUAL_QUOTA_PER_MINUTE = int(os.environ.get('PERENUAL_QUOTA_PER_MINUTE', 0))
+PERENUAL_QUOTA_PER_DAY = int(os.environ.get('PERENUAL_QUOTA_PER_DAY', 0))
+PLANTNET_QUOTA_PER_MINUTE = int(os.environ.get('PLANTNET_QUOTA_PER_MINUTE', 0))
+PLANTNET_QUOTA_PER_DAY = int(os.environ.get('PLANTNET_QUOTA_PER_DAY', 0))
+QUOTA_BACKGROUND_RESERVE = float(os.environ.get('QUOTA_BACKGROUND_RESERVE', 0.2))  # share of the daily quota kept for interactive calls
+QUOTA_INTERACTIVE_MAX_WAIT_SECONDS = float(os.environ.get('QUOTA_INTERACTIVE_MAX_WAIT_SECONDS', 2.0))
+QUOTA_BACKGROUND_MAX_WAIT_SECONDS = float(os.environ.get('QUOTA_BACKGROUND_MAX_WAIT_SECONDS', 120.0))
+
+# Identification pipeline deadlines: how long the LLM call waits for PlantNet's name, PlantNet's
+# deadline from the start of the request, and the LLM's from when it is sent
+IDENTIFY_ENRICH_DEADLINE_SECONDS = float(os.environ.get('IDENTIFY_ENRICH_DEADLINE_SECONDS', 2.0))
+IDENTIFY_PLANTNET_TIMEOUT_SECONDS = float(os.environ.get('IDENTIFY_PLANTNET_TIMEOUT_SECONDS', 10.0))
+IDENTIFY_LLM_TIMEOUT_SECONDS = float(os.environ.get('IDENTIFY_LLM_TIMEOUT_SECONDS', LLM_IMAGE_TIMEOUT_SECONDS))
+# Photos of one plant per multi-image identification (PlantNet accepts at most 5)
+IDENTIFY_MAX_IMAGES = int(os.environ.get('IDENTIFY_MAX_IMAGES', 5))
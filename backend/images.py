@@ -0,0 +1,103 @@
+"""Image preprocessing run in worker processes; keep imports light, every pool worker loads this module."""
+import hashlib
+import io
+import math
+from typing import Dict, List, NamedTuple, Tuple
+
+from PIL import Image, ImageOps
+
+
+# Image preprocessing
+def image_dhash(image: Image.Image) -> int:
+    """64-bit difference hash: survives recompression, resizing and small colour shifts."""
+    small = image.convert('L').resize((9, 8), Image.BILINEAR)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            value = (value << 1) | (1 if left > right else 0)
+    return value
+
+
+class PreparedImage(NamedTuple):
+    variants: Dict[str, bytes]  # consumer name -> JPEG bytes sized for it
+    digest: str  # SHA-256 of the normalized (LLM) variant
+    dhash: int
+    size: Tuple[int, int]  # upright size of the decoded upload
+
+
+def preprocess_image(data: bytes, max_edges: Dict[str, int], quality: int = 85) -> PreparedImage:
+    """Decode an upload once and produce one JPEG per consumer.
+
+    Applies EXIF orientation, lets the JPEG decoder downscale by a power of two
+    (draft mode) when the largest consumer needs less than the full
+    resolution, and passes the original bytes through untouched when they are
+    already an upright JPEG that fits. Runs in a worker process.
+    """
+    image = Image.open(io.BytesIO(data))
+    source_format = image.format
+    orientation = image.getexif().get(0x0112, 1)
+    width, height = image.size
+    if orientation in (5, 6, 7, 8):
+        width, height = height, width
+
+    largest_edge = max(max_edges.values())
+    if source_format == 'JPEG' and max(width, height) > largest_edge:
+        # draft() keeps both sides >= the requested box, so the final resize still has full detail
+        image.draft('RGB', (largest_edge, largest_edge))
+    image = ImageOps.exif_transpose(image)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    passthrough = source_format == 'JPEG' and orientation == 1
+    variants: Dict[str, bytes] = {}
+    encoded: Dict[int, bytes] = {}
+    for consumer, max_edge in max_edges.items():
+        if passthrough and max(width, height) <= max_edge:
+            variants[consumer] = data
+            continue
+        target_edge = min(max_edge, max(image.size))
+        if target_edge not in encoded:
+            resized = image
+            if max(image.size) > target_edge:
+                resized = image.copy()
+                resized.thumbnail((target_edge, target_edge), Image.LANCZOS)
+            output = io.BytesIO()
+            resized.save(output, format='JPEG', quality=quality)
+            encoded[target_edge] = output.getvalue()
+        variants[consumer] = encoded[target_edge]
+
+    digest_source = variants.get('llm') or next(iter(variants.values()))
+    return PreparedImage(
+        variants=variants,
+        digest=hashlib.sha256(digest_source).hexdigest(),
+        dhash=image_dhash(image),
+        size=(width, height),
+    )
+
+
+def build_collage(images: List[bytes], max_edge: int, quality: int = 85) -> bytes:
+    """Tile already-preprocessed JPEGs into one grid image no larger than ``max_edge``.
+
+    Each photo is fitted into a square cell, so one vision request sees every
+    angle of the plant. A single image is returned as is. Runs in a worker process.
+    """
+    if len(images) == 1:
+        return images[0]
+    cols = math.ceil(math.sqrt(len(images)))
+    rows = math.ceil(len(images) / cols)
+    cell = max_edge // cols
+    gutter = max(2, cell // 64)
+    canvas = Image.new('RGB', (cols * cell, rows * cell), 'white')
+    for index, data in enumerate(images):
+        tile = Image.open(io.BytesIO(data))
+        tile.draft('RGB', (cell, cell))
+        tile = tile.convert('RGB')
+        tile.thumbnail((cell - gutter, cell - gutter), Image.LANCZOS)
+        row, col = divmod(index, cols)
+        canvas.paste(tile, (col * cell + (cell - tile.width) // 2, row * cell + (cell - tile.height) // 2))
+    output = io.BytesIO()
+    canvas.save(output, format='JPEG', quality=quality)
+    return output.getvalue()
@@ -0,0 +1,125 @@
+"""MongoDB index declarations, bootstrap and query-plan checks."""
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import ASCENDING, IndexModel
+
+logger = logging.getLogger(__name__)
+
+
+# Index management
+REQUIRED_INDEXES: Dict[str, List[IndexModel]] = {
+    "user_plants": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("user_id", ASCENDING), ("date_added", ASCENDING), ("id", ASCENDING)],
+                   name="user_id_date_added_id"),
+    ],
+    "reminders": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("user_id", ASCENDING), ("completed", ASCENDING), ("due_date", ASCENDING), ("id", ASCENDING)],
+                   name="user_id_completed_due_date_id"),
+        IndexModel([("completed", ASCENDING), ("notified_at", ASCENDING), ("due_date", ASCENDING)],
+                   name="completed_notified_at_due_date"),
+        IndexModel([("created_at", ASCENDING)], name="created_at"),
+        IndexModel([("notify_claim", ASCENDING)], name="notify_claim", sparse=True),
+    ],
+    "push_subscriptions": [
+        IndexModel([("endpoint", ASCENDING)], name="endpoint_unique", unique=True),
+        IndexModel([("user_id", ASCENDING)], name="user_id"),
+    ],
+}
+
+# (name, collection, filter, sort) for every query on a hot path; each must be index-backed.
+_SAMPLE_TIME = datetime(2024, 1, 1)
+HOT_QUERIES: List[Tuple[str, str, Dict[str, Any], Optional[List[Tuple[str, int]]]]] = [
+    ("get_user_plants", "user_plants", {"user_id": "u"}, [("date_added", ASCENDING), ("id", ASCENDING)]),
+    ("plant_by_id", "user_plants", {"id": "p"}, None),
+    ("get_user_reminders", "reminders",
+     {"user_id": "u", "completed": False, "due_date": {"$lte": _SAMPLE_TIME}}, [("due_date", ASCENDING), ("id", ASCENDING)]),
+    ("complete_reminder", "reminders", {"id": "r", "user_id": "u"}, None),
+    ("scheduler_window", "reminders",
+     {"completed": False, "notified_at": None, "due_date": {"$gte": _SAMPLE_TIME, "$lt": _SAMPLE_TIME}},
+     [("due_date", ASCENDING)]),
+    ("scheduler_poll", "reminders",
+     {"created_at": {"$gte": _SAMPLE_TIME}, "completed": False, "notified_at": None, "due_date": {"$lt": _SAMPLE_TIME}},
+     [("due_date", ASCENDING)]),
+    ("scheduler_claimed", "reminders", {"notify_claim": "c"}, None),
+    ("subscriptions_by_users", "push_subscriptions", {"user_id": {"$in": ["u"]}}, None),
+    ("subscription_by_endpoint", "push_subscriptions", {"endpoint": "e"}, None),
+]
+
+
+class IndexManager:
+    """Creates the declared indexes idempotently and checks hot queries stay index-backed."""
+
+    def __init__(self, required: Dict[str, List[IndexModel]], hot_queries=HOT_QUERIES):
+        self.required = required
+        self.hot_queries = hot_queries
+
+    @staticmethod
+    def _spec(document: Dict[str, Any]) -> Dict[str, Any]:
+        key = document["key"].items() if isinstance(document["key"], dict) else document["key"]
+        return {
+            "key": [(field, int(direction) if isinstance(direction, (int, float)) else direction)
+                    for field, direction in key],
+            "unique": bool(document.get("unique", False)),
+            "sparse": bool(document.get("sparse", False)),
+        }
+
+    async def diff(self, database) -> Dict[str, Dict[str, List[str]]]:
+        """Compare declared and existing indexes: missing, conflicting (same name, other spec) and unexpected."""
+        report = {}
+        for collection, models in self.required.items():
+            existing = await database[collection].index_information()
+            declared = {model.document["name"]: model.document for model in models}
+            missing, conflicting = [], []
+            for name, document in declared.items():
+                if name not in existing:
+                    missing.append(name)
+                elif self._spec(existing[name]) != self._spec(document):
+                    conflicting.append(name)
+            unexpected = [name for name in existing if name != "_id_" and name not in declared]
+            report[collection] = {"missing": missing, "conflicting": conflicting, "unexpected": unexpected}
+        return report
+
+    async def ensure(self, database) -> Dict[str, Dict[str, List[str]]]:
+        """Create missing indexes and log any drift. Safe to run on every startup."""
+        report = await self.diff(database)
+        for collection, drift in report.items():
+            to_create = [m for m in self.required[collection] if m.document["name"] in drift["missing"]]
+            if to_create:
+                try:
+                    await database[collection].create_indexes(to_create)
+                    logger.info(f"Created indexes on {collection}: {', '.join(drift['missing'])}")
+                    drift["created"], drift["missing"] = drift["missing"], []
+                except Exception as e:
+                    logger.error(f"Could not create indexes on {collection}: {e}")
+            if drift["conflicting"]:
+                logger.warning(f"Index drift on {collection}: {drift['conflicting']} differ from the declared spec")
+            if drift["unexpected"]:
+                logger.warning(f"Undeclared indexes on {collection}: {drift['unexpected']}")
+        return report
+
+    @staticmethod
+    def _stages(plan: Dict[str, Any]):
+        yield plan.get("stage")
+        for child_key in ("inputStage", "queryPlan"):
+            if isinstance(plan.get(child_key), dict):
+                yield from IndexManager._stages(plan[child_key])
+        for child in plan.get("inputStages", []):
+            yield from IndexManager._stages(child)
+
+    async def check_query_plans(self, database) -> List[Dict[str, Any]]:
+        """Run explain() on every hot query; return the ones whose winning plan contains a COLLSCAN."""
+        failures = []
+        for name, collection, query, sort in self.hot_queries:
+            cursor = database[collection].find(query)
+            if sort:
+                cursor = cursor.sort(sort)
+            explained = await cursor.explain()
+            winning_plan = explained.get("queryPlanner", {}).get("winningPlan", {})
+            stages = [stage for stage in self._stages(winning_plan) if stage]
+            if "COLLSCAN" in stages:
+                failures.append({"query": name, "collection": collection, "stages": stages})
+        return failures
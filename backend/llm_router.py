@@ -0,0 +1,160 @@
+"""Latency-adaptive routing of LLM calls over a pool of models."""
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from openai import APIConnectionError, APIStatusError
+
+from config import CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS
+from providers import CircuitBreaker
+
+
+def llm_error_retryable(error: BaseException) -> bool:
+    """Rate limits, server errors, timeouts and connection failures are worth trying on another model."""
+    if isinstance(error, APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return isinstance(error, (APIConnectionError, asyncio.TimeoutError))
+
+
+class ModelHealth:
+    """EWMA latency and error rate of one model, plus its breaker and 429 cooldown."""
+
+    def __init__(self, model: str, alpha: float):
+        self.model = model
+        self.alpha = alpha
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.cooldown_until = 0.0
+        self.breaker = CircuitBreaker(CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS)
+        self.counters = {"requests": 0, "failures": 0, "wins": 0}
+
+    def observe_latency(self, seconds: float):
+        self.latency = seconds if self.latency is None else self.latency + self.alpha * (seconds - self.latency)
+
+    def record_success(self, seconds: Optional[float] = None):
+        if seconds is not None:
+            self.observe_latency(seconds)
+        self.error_rate *= 1 - self.alpha
+        self.breaker.record_success()
+        self.counters["requests"] += 1
+
+    def record_failure(self, cooldown: Optional[float] = None):
+        self.error_rate += self.alpha * (1 - self.error_rate)
+        self.breaker.record_failure()
+        self.counters["requests"] += 1
+        self.counters["failures"] += 1
+        if cooldown:
+            self.cooldown_until = max(self.cooldown_until, time.monotonic() + cooldown)
+
+    def available(self, now: float) -> bool:
+        return now >= self.cooldown_until and self.breaker.state != "open"
+
+    def expected_latency(self, default: float) -> float:
+        latency = default if self.latency is None else self.latency
+        return latency / max(0.05, 1 - self.error_rate)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "ewma_latency_seconds": None if self.latency is None else round(self.latency, 3),
+            "error_rate": round(self.error_rate, 3),
+            "circuit": self.breaker.state,
+            "cooldown_seconds": round(max(0.0, self.cooldown_until - time.monotonic()), 1),
+        }
+
+
+class ModelRouter:
+    """Choose a model from a pool for each LLM call.
+
+    Models are ranked by expected latency (EWMA latency inflated by the
+    EWMA error rate); models cooling down after a 429 or with an open
+    circuit go last. A model without samples ranks with the best one, so
+    the configured order decides until there is data. Interactive calls
+    that haven't answered after ``race_after`` seconds start the next model
+    too and take whichever answers first. Rate limits, 5xx, timeouts and
+    connection errors fall through to the next model; other errors are
+    raised as they are.
+    """
+
+    def __init__(self, task: str, models: List[str], alpha: float, race_after: float, cooldown: float):
+        if not models:
+            raise ValueError(f"No models configured for {task}")
+        self.task = task
+        self.models = models
+        self.race_after = race_after
+        self.cooldown = cooldown
+        self.health = {model: ModelHealth(model, alpha) for model in models}
+        self.counters = {"races": 0, "fallbacks": 0}
+
+    def ranked(self) -> List[str]:
+        now = time.monotonic()
+        sampled = [h.latency for h in self.health.values() if h.latency is not None]
+        default = min(sampled) if sampled else 0.0
+        return sorted(
+            self.models,
+            key=lambda model: (not self.health[model].available(now), self.health[model].expected_latency(default)),
+        )
+
+    def record_success(self, model: str, seconds: Optional[float] = None):
+        self.health[model].record_success(seconds)
+
+    def record_failure(self, model: str, error: BaseException):
+        cooldown = None
+        if isinstance(error, APIStatusError) and error.status_code == 429:
+            retry_after = error.response.headers.get('retry-after', '')
+            cooldown = float(retry_after) if retry_after.isdigit() else self.cooldown
+        self.health[model].record_failure(cooldown)
+
+    async def run(self, call, interactive: bool = True):
+        """Return ``await call(model)`` from the first model that answers."""
+        candidates = self.ranked()
+        pending: Dict[asyncio.Task, Tuple[str, float]] = {}
+        raced = False
+        last_error: Optional[BaseException] = None
+
+        def launch():
+            model = candidates.pop(0)
+            pending[asyncio.create_task(call(model))] = (model, time.monotonic())
+
+        launch()
+        try:
+            while pending:
+                race = interactive and not raced and candidates and self.race_after > 0
+                done, _ = await asyncio.wait(pending, timeout=self.race_after if race else None,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    raced = True
+                    self.counters["races"] += 1
+                    launch()
+                    continue
+                for task in done:
+                    model, started = pending.pop(task)
+                    error = task.exception()
+                    if error is None:
+                        self.health[model].record_success(time.monotonic() - started)
+                        if raced:
+                            self.health[model].counters["wins"] += 1
+                        return task.result()
+                    if not llm_error_retryable(error):
+                        raise error
+                    self.record_failure(model, error)
+                    last_error = error
+                if not pending and candidates:
+                    self.counters["fallbacks"] += 1
+                    launch()
+            raise last_error
+        finally:
+            for task, (model, started) in pending.items():
+                task.cancel()
+                # Censored sample: an abandoned call would have taken at least this long
+                health = self.health[model]
+                elapsed = time.monotonic() - started
+                if health.latency is None or elapsed > health.latency:
+                    health.observe_latency(elapsed)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "ranking": self.ranked(),
+            "models": {model: health.stats() for model, health in self.health.items()},
+        }
@@ -0,0 +1,78 @@
+"""Prometheus metrics shared by the services (values are per worker process)."""
+import asyncio
+import time
+
+import aiohttp
+import httpx
+from prometheus_client import Counter, Gauge, Histogram
+
+
+# Metrics (Prometheus text format at /metrics; values are per worker process)
+HTTP_REQUEST_SECONDS = Histogram(
+    'plauntie_http_request_duration_seconds', 'HTTP request latency, including streamed bodies',
+    ['method', 'route', 'status'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge('plauntie_http_requests_in_flight', 'HTTP requests being served', ['method'])
+UPSTREAM_REQUEST_SECONDS = Histogram(
+    'plauntie_upstream_request_duration_seconds', 'Outbound call latency per provider',
+    ['provider'],
+    buckets=(0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120),
+)
+UPSTREAM_ERRORS = Counter('plauntie_upstream_errors_total', 'Failed outbound calls per provider', ['provider', 'reason'])
+LLM_TOKENS = Counter('plauntie_llm_tokens_total', 'LLM tokens reported in completion usage', ['model', 'kind'])
+IMAGE_PREPROCESS_SECONDS = Histogram(
+    'plauntie_image_preprocess_duration_seconds', 'Upload preprocessing time, including pool queueing',
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+
+
+def record_llm_usage(model: str, usage) -> None:
+    if usage is None:
+        return
+    LLM_TOKENS.labels(model, 'prompt').inc(getattr(usage, 'prompt_tokens', 0) or 0)
+    LLM_TOKENS.labels(model, 'completion').inc(getattr(usage, 'completion_tokens', 0) or 0)
+
+
+def upstream_error_reason(error: BaseException) -> str:
+    if isinstance(error, (asyncio.TimeoutError, httpx.TimeoutException)):
+        return 'timeout'
+    if isinstance(error, (aiohttp.ClientError, httpx.TransportError)):
+        return 'connection'
+    return type(error).__name__
+
+
+class MetricsMiddleware:
+    """Record latency and in-flight count for every HTTP request.
+
+    The route label is the matched path template (``/api/plants/{plant_id}/care``)
+    so cardinality stays bounded; requests that match no route are labelled
+    ``unmatched``.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        method = scope["method"]
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        in_flight = HTTP_REQUESTS_IN_FLIGHT.labels(method)
+        in_flight.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            in_flight.dec()
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.labels(
+                method, getattr(route, "path", "unmatched"), str(status)
+            ).observe(time.perf_counter() - started)
@@ -0,0 +1,138 @@
+"""Pydantic request/response and document models."""
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Type
+
+from pydantic import BaseModel, Field, create_model
+
+from config import BULK_MAX_ITEMS
+
+
+
+# Models
+def partial_model(model: Type[BaseModel]) -> Type[BaseModel]:
+    """``model`` with every field optional: the schema of list items trimmed with ``fields=``."""
+    fields = {name: (Optional[field.annotation], None) for name, field in model.model_fields.items()}
+    return create_model(f"{model.__name__}Fields", **fields)
+
+class PlantSearchResult(BaseModel):
+    id: str
+    name: str
+    scientific_name: str
+    common_names: List[str] = []
+    image_url: Optional[str] = None
+    description: Optional[str] = None
+    care_level: Optional[str] = None
+
+class PlantCareInfo(BaseModel):
+    plant_id: str
+    name: str
+    scientific_name: str
+    watering: Optional[str] = None
+    sunlight: Optional[str] = None
+    temperature: Optional[str] = None
+    humidity: Optional[str] = None
+    fertilizer: Optional[str] = None
+    repotting: Optional[str] = None
+    common_problems: List[str] = []
+    care_tips: List[str] = []
+
+class PlantIdentification(BaseModel):
+    suggestions: List[Dict[str, Any]] = []
+    confidence: float = 0.0
+    identified_name: Optional[str] = None
+
+
+class EnhancedPlantIdentification(PlantIdentification):
+    plauntie_description: Optional[str] = None
+    partial: bool = False  # PlantNet or the LLM missed its deadline
+
+
+class DiagnosisResponse(BaseModel):
+    diagnosis_text: str
+
+
+class UserPlant(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    user_id: str
+    plant_id: str
+    nickname: str
+    plant_name: str
+    scientific_name: str
+    date_added: datetime = Field(default_factory=datetime.utcnow)
+    last_watered: Optional[datetime] = None
+    last_fertilized: Optional[datetime] = None
+    last_repotted: Optional[datetime] = None
+    watering_frequency_days: int = 7
+    fertilizing_frequency_days: int = 30
+    notes: Optional[str] = None
+    image_url: Optional[str] = None
+
+class Reminder(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    user_id: str
+    plant_id: str
+    plant_nickname: str
+    reminder_type: str  # watering, fertilizing, repotting
+    due_date: datetime
+    completed: bool = False
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    notified_at: Optional[datetime] = None  # set when the due push has been dispatched
+    frequency_days: Optional[int] = None  # lets completion schedule the next reminder without reading the plant
+
+class PlantDiagnosis(BaseModel):
+    plant_name: Optional[str] = None
+    health_status: str
+    problems: List[Dict[str, Any]] = []
+    recommendations: List[str] = []
+    confidence: float = 0.0
+
+
+class BulkPlantsRequest(BaseModel):
+    plants: List[Dict[str, Any]] = Field(..., max_length=BULK_MAX_ITEMS)
+
+class BulkPlantResult(BaseModel):
+    index: int
+    ok: bool
+    plant: Optional[UserPlant] = None
+    error: Optional[str] = None
+
+class BulkPlantsResponse(BaseModel):
+    results: List[BulkPlantResult]
+    succeeded: int
+    failed: int
+
+class BulkCompleteRequest(BaseModel):
+    reminder_ids: List[str] = Field(..., max_length=BULK_MAX_ITEMS)
+
+class BulkReminderResult(BaseModel):
+    reminder_id: str
+    ok: bool
+    next_reminder_id: Optional[str] = None
+    error: Optional[str] = None
+
+class BulkCompleteResponse(BaseModel):
+    results: List[BulkReminderResult]
+    succeeded: int
+    failed: int
+
+
+class ChatRequest(BaseModel):
+    message: str
+    enable_web_search: bool = False
+    use_cache: bool = True  # False always asks the LLM
+    session_id: Optional[str] = Field(None, max_length=128)  # from POST /chat/sessions; unknown ids get a 404
+
+
+class PushSubscriptionKeys(BaseModel):
+    p256dh: str
+    auth: str
+
+class PushSubscription(BaseModel):
+    endpoint: str
+    keys: PushSubscriptionKeys
+    user_id: str
+
+
+UserPlantFields = partial_model(UserPlant)
+ReminderFields = partial_model(Reminder)
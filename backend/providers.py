@@ -0,0 +1,381 @@
+"""Outbound provider HTTP clients with circuit breakers, hedging and quotas."""
+import asyncio
+import heapq
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import aiohttp
+
+from config import (
+    PROVIDER_CONNECTIONS_PER_HOST, PROVIDER_DNS_CACHE_SECONDS, PROVIDER_KEEPALIVE_SECONDS,
+    CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS, HEDGE_MIN_SAMPLES, HEDGE_MIN_DELAY_SECONDS,
+    HEDGE_MAX_DELAY_SECONDS, QUOTA_BACKGROUND_RESERVE, QUOTA_INTERACTIVE_MAX_WAIT_SECONDS,
+    QUOTA_BACKGROUND_MAX_WAIT_SECONDS,
+)
+from metrics import UPSTREAM_ERRORS, UPSTREAM_REQUEST_SECONDS, upstream_error_reason
+
+
+# Outbound provider clients
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider whose circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker.
+
+    After ``failure_threshold`` failures in a row the circuit opens and calls
+    fail fast for ``reset_seconds``. Then a single trial call is let through
+    (half-open): success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def release(self):
+        """Give back a half-open trial slot that ended up not calling the provider."""
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+class QuotaExceededError(Exception):
+    """Raised when a provider call can't get quota within its priority's max wait."""
+
+
+PRIORITY_INTERACTIVE = 0  # a user is waiting on the answer (search, identify)
+PRIORITY_BACKGROUND = 1   # prefetch, index builds, cache warming
+
+
+class QuotaScheduler:
+    """Token-bucket budget for one provider's per-minute and per-day quotas.
+
+    The per-minute bucket refills continuously; the daily budget resets at
+    UTC midnight. A limit of 0 disables that bucket. Callers that find no
+    token queue by priority class (interactive before background, FIFO
+    within a class) for up to their class's max wait, then get
+    QuotaExceededError. Background calls may not spend the last
+    ``background_reserve`` fraction of the daily budget, which is kept for
+    interactive traffic. A 429 from the provider empties the minute bucket
+    for ``Retry-After`` seconds.
+
+    Budgets are per process: divide the provider quota by the worker count.
+    """
+
+    def __init__(self, name: str, per_minute: int, per_day: int, background_reserve: float,
+                 max_wait: Dict[int, float]):
+        self.name = name
+        self.per_minute = per_minute
+        self.per_day = per_day
+        self.background_reserve = background_reserve
+        self.max_wait = max_wait
+        self.tokens = float(per_minute)
+        self.refilled_at = time.monotonic()
+        self.blocked_until = 0.0
+        self.day = datetime.utcnow().date()
+        self.day_used = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = 0
+        self._pump_task: Optional[asyncio.Task] = None
+        self.counters = {"granted": 0, "queued": 0, "rejected": 0, "throttled_by_provider": 0}
+
+    def _refill(self, now: float):
+        if self.per_minute:
+            self.tokens = min(self.per_minute, self.tokens + (now - self.refilled_at) * self.per_minute / 60)
+        self.refilled_at = now
+        today = datetime.utcnow().date()
+        if today != self.day:
+            self.day, self.day_used = today, 0
+
+    def _day_allows(self, priority: int) -> bool:
+        if not self.per_day:
+            return True
+        limit = self.per_day
+        if priority != PRIORITY_INTERACTIVE:
+            limit = int(self.per_day * (1 - self.background_reserve))
+        return self.day_used < limit
+
+    def _minute_ready(self, now: float) -> bool:
+        return now >= self.blocked_until and (not self.per_minute or self.tokens >= 1)
+
+    def _take(self):
+        if self.per_minute:
+            self.tokens -= 1
+        self.day_used += 1
+        self.counters["granted"] += 1
+
+    def try_acquire(self, priority: int = PRIORITY_BACKGROUND) -> bool:
+        """Take a token only if one is free right now and nobody is queued."""
+        now = time.monotonic()
+        self._refill(now)
+        if self._waiters or not self._day_allows(priority) or not self._minute_ready(now):
+            return False
+        self._take()
+        return True
+
+    async def acquire(self, priority: int = PRIORITY_INTERACTIVE):
+        now = time.monotonic()
+        self._refill(now)
+        if not self._day_allows(priority):
+            # Waiting won't help before the daily reset
+            self.counters["rejected"] += 1
+            raise QuotaExceededError(f"{self.name} daily quota exhausted")
+        if not self._waiters and self._minute_ready(now):
+            self._take()
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._seq += 1
+        heapq.heappush(self._waiters, (priority, self._seq, future))
+        self.counters["queued"] += 1
+        if self._pump_task is None or self._pump_task.done():
+            self._pump_task = asyncio.create_task(self._pump())
+        try:
+            await asyncio.wait_for(future, timeout=self.max_wait.get(priority, 0))
+        except asyncio.TimeoutError:
+            self.counters["rejected"] += 1
+            raise QuotaExceededError(f"{self.name} quota busy; no slot within the wait limit") from None
+
+    async def _pump(self):
+        """Hand out tokens to queued callers as the bucket refills."""
+        while self._waiters:
+            priority, _, future = self._waiters[0]
+            if future.done():  # timed out or cancelled
+                heapq.heappop(self._waiters)
+                continue
+            now = time.monotonic()
+            self._refill(now)
+            if not self._day_allows(priority):
+                heapq.heappop(self._waiters)
+                self.counters["rejected"] += 1
+                future.set_exception(QuotaExceededError(f"{self.name} daily quota exhausted"))
+                continue
+            if self._minute_ready(now):
+                heapq.heappop(self._waiters)
+                self._take()
+                future.set_result(None)
+                continue
+            delay = max(self.blocked_until - now, (1 - self.tokens) * 60 / self.per_minute if self.per_minute else 0)
+            await asyncio.sleep(max(delay, 0.001))
+
+    def throttled(self, retry_after: Optional[float]):
+        """The provider answered 429: stop sending until it says we may."""
+        self.counters["throttled_by_provider"] += 1
+        self.tokens = 0.0
+        self.blocked_until = max(self.blocked_until, time.monotonic() + (retry_after or 60.0))
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        self._refill(now)
+        queued: Dict[str, int] = {"interactive": 0, "background": 0}
+        for priority, _, future in self._waiters:
+            if not future.done():
+                queued["interactive" if priority == PRIORITY_INTERACTIVE else "background"] += 1
+        return {
+            **self.counters,
+            "per_minute_limit": self.per_minute or None,
+            "per_day_limit": self.per_day or None,
+            "remaining_minute": int(self.tokens) if self.per_minute else None,
+            "remaining_day": max(0, self.per_day - self.day_used) if self.per_day else None,
+            "used_today": self.day_used,
+            "blocked_for_seconds": round(max(0.0, self.blocked_until - now), 1),
+            "queue": queued,
+        }
+
+
+class ProviderResponse(NamedTuple):
+    status: int
+    data: Any  # parsed JSON body of a 200 response, else None
+    retry_after: Optional[float] = None  # from a 429's Retry-After header
+
+
+class ProviderClient:
+    """HTTP client for one upstream provider (Perenual, PlantNet).
+
+    Owns a keep-alive connection pool with a DNS cache and per-host limit,
+    applies the provider's connect/read/total timeouts and a circuit breaker,
+    and can hedge idempotent GETs: if the first attempt hasn't answered
+    after the provider's recent p95 latency, a second identical request is
+    sent and whichever finishes first wins. 5xx, 429, timeouts and
+    connection errors count as failures.
+
+    Every request first takes a token from the provider's QuotaScheduler;
+    a hedge attempt is only sent when a token is free right away.
+    """
+
+    def __init__(self, name: str, connect_timeout: float, read_timeout: float, total_timeout: float,
+                 hedge: bool = False, per_minute: int = 0, per_day: int = 0):
+        self.name = name
+        self.timeout = aiohttp.ClientTimeout(total=total_timeout, sock_connect=connect_timeout, sock_read=read_timeout)
+        self.hedge = hedge
+        self.breaker = CircuitBreaker(CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS)
+        self.quota = QuotaScheduler(
+            name, per_minute, per_day, QUOTA_BACKGROUND_RESERVE,
+            {PRIORITY_INTERACTIVE: QUOTA_INTERACTIVE_MAX_WAIT_SECONDS,
+             PRIORITY_BACKGROUND: QUOTA_BACKGROUND_MAX_WAIT_SECONDS},
+        )
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.latencies: deque = deque(maxlen=256)
+        self.counters = {"requests": 0, "failures": 0, "rejected": 0, "hedged": 0, "hedge_wins": 0}
+
+    def get_session(self) -> aiohttp.ClientSession:
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=0,
+                    limit_per_host=PROVIDER_CONNECTIONS_PER_HOST,
+                    ttl_dns_cache=PROVIDER_DNS_CACHE_SECONDS,
+                    keepalive_timeout=PROVIDER_KEEPALIVE_SECONDS,
+                ),
+                timeout=self.timeout,
+            )
+        return self.session
+
+    def hedge_delay(self) -> float:
+        """Recent p95 latency, clamped; a fixed delay until enough samples exist."""
+        if len(self.latencies) < HEDGE_MIN_SAMPLES:
+            return HEDGE_MAX_DELAY_SECONDS
+        ordered = sorted(self.latencies)
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        return min(HEDGE_MAX_DELAY_SECONDS, max(HEDGE_MIN_DELAY_SECONDS, p95))
+
+    async def _attempt(self, method: str, url: str, **kwargs) -> ProviderResponse:
+        started = time.monotonic()
+        async with self.get_session().request(method, url, **kwargs) as response:
+            data = await response.json(content_type=None) if response.status == 200 else None
+        UPSTREAM_REQUEST_SECONDS.labels(self.name).observe(time.monotonic() - started)
+        if response.status == 429:
+            retry_after = response.headers.get('Retry-After', '')
+            return ProviderResponse(429, None, float(retry_after) if retry_after.isdigit() else None)
+        if response.status < 500:
+            self.latencies.append(time.monotonic() - started)
+        return ProviderResponse(response.status, data)
+
+    async def _hedged(self, url: str, **kwargs) -> ProviderResponse:
+        first = asyncio.create_task(self._attempt("GET", url, **kwargs))
+        attempts = [first]
+        try:
+            done, _ = await asyncio.wait({first}, timeout=self.hedge_delay())
+            if done or not self.quota.try_acquire(PRIORITY_BACKGROUND):
+                return await first
+
+            self.counters["hedged"] += 1
+            second = asyncio.create_task(self._attempt("GET", url, **kwargs))
+            attempts.append(second)
+            pending = {first, second}
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                        continue
+                    response = task.result()
+                    if response.status >= 500 and pending:
+                        continue  # the other attempt may still succeed
+                    if task is second:
+                        self.counters["hedge_wins"] += 1
+                    return response
+            raise error
+        finally:
+            # Also runs when the caller is cancelled, so no attempt outlives the request
+            for task in attempts:
+                task.cancel()
+
+    async def request(self, method: str, url: str, priority: int = PRIORITY_INTERACTIVE,
+                      **kwargs) -> ProviderResponse:
+        """Send a request and read its JSON body.
+
+        Raises CircuitOpenError while the provider is down and
+        QuotaExceededError when no quota frees up within the priority's wait.
+        """
+        trial = self.breaker.state == "half-open"
+        if not self.breaker.allow():
+            self.counters["rejected"] += 1
+            UPSTREAM_ERRORS.labels(self.name, 'circuit_open').inc()
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        try:
+            await self.quota.acquire(priority)
+        except BaseException as e:
+            if trial:
+                self.breaker.release()
+            if isinstance(e, QuotaExceededError):
+                UPSTREAM_ERRORS.labels(self.name, 'quota').inc()
+            raise
+        self.counters["requests"] += 1
+        try:
+            if method == "GET" and self.hedge:
+                response = await self._hedged(url, **kwargs)
+            else:
+                response = await self._attempt(method, url, **kwargs)
+        except asyncio.CancelledError:
+            # The caller gave up: no verdict on the provider, but a half-open trial must be handed back
+            if trial:
+                self.breaker.release()
+            raise
+        except Exception as e:
+            # Transport errors, timeouts and unparseable bodies all count against the provider
+            self.counters["failures"] += 1
+            self.breaker.record_failure()
+            UPSTREAM_ERRORS.labels(self.name, upstream_error_reason(e)).inc()
+            raise
+        if response.status == 429:
+            self.quota.throttled(response.retry_after)
+        if response.status >= 500 or response.status == 429:
+            UPSTREAM_ERRORS.labels(self.name, f'status_{response.status}').inc()
+            self.counters["failures"] += 1
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return response
+
+    async def get(self, url: str, priority: int = PRIORITY_INTERACTIVE, **kwargs) -> ProviderResponse:
+        return await self.request("GET", url, priority, **kwargs)
+
+    async def post(self, url: str, priority: int = PRIORITY_INTERACTIVE, **kwargs) -> ProviderResponse:
+        return await self.request("POST", url, priority, **kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "circuit": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "hedge_delay_seconds": round(self.hedge_delay(), 3),
+            "quota": self.quota.stats(),
+        }
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
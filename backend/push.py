@@ -0,0 +1,212 @@
+"""Async web push delivery."""
+import asyncio
+import json
+import logging
+import random
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import urlparse
+
+import aiohttp
+from py_vapid import Vapid
+from pywebpush import WebPusher
+
+from config import (
+    VAPID_PRIVATE_KEY, PUSH_MAX_RETRIES, PUSH_RETRY_BASE_SECONDS, PUSH_TIMEOUT_SECONDS, PUSH_TTL_SECONDS,
+    PUSH_CONNECTIONS_PER_ORIGIN, PUSH_PRUNE_BATCH, PUSH_PRUNE_INTERVAL_SECONDS,
+)
+from metrics import UPSTREAM_ERRORS, UPSTREAM_REQUEST_SECONDS, upstream_error_reason
+
+logger = logging.getLogger(__name__)
+
+
+# Push Notification Service
+VAPID_CLAIMS = {
+    "sub": "mailto:admin@plauntie.com"
+}
+
+class PushJob(NamedTuple):
+    subscription_info: Dict[str, Any]
+    message_body: str
+    attempt: int = 0
+
+
+class PushDeliveryService:
+    """Async web push delivery: a bounded queue drained by a pool of workers.
+
+    All workers share one aiohttp session, so connections to each push
+    service origin are kept alive and reused. Payloads are encrypted in a
+    worker thread so a large fan-out doesn't stall the event loop. VAPID
+    headers are signed once per origin and reused until shortly before they
+    expire. 429 and 5xx
+    responses are retried with exponential backoff (honouring Retry-After);
+    endpoints answering 404/410 are deleted from ``push_subscriptions`` in
+    batches.
+    """
+
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+    GONE_STATUSES = {404, 410}
+
+    def __init__(self, workers: int, queue_size: int, get_database: Callable[[], Any]):
+        self.get_database = get_database
+        self.worker_count = workers
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.session: Optional[aiohttp.ClientSession] = None
+        self._workers: List[asyncio.Task] = []
+        self._pruner: Optional[asyncio.Task] = None
+        self._retry_tasks: set = set()
+        self._vapid: Optional[Vapid] = None
+        self._vapid_headers: Dict[str, Tuple[int, Dict[str, str]]] = {}  # origin -> (exp, headers)
+        self._dead_endpoints: set = set()
+        self._prune_wakeup = asyncio.Event()
+        self._recent = deque()  # monotonic timestamps of recent deliveries
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.pruned = 0
+
+    def start(self):
+        if self._workers:
+            return
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=0, limit_per_host=PUSH_CONNECTIONS_PER_ORIGIN, keepalive_timeout=60),
+            timeout=aiohttp.ClientTimeout(total=PUSH_TIMEOUT_SECONDS),
+        )
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+        self._pruner = asyncio.create_task(self._prune_loop())
+
+    async def stop(self):
+        for task in [*self._workers, *self._retry_tasks, *([self._pruner] if self._pruner else [])]:
+            task.cancel()
+        await asyncio.gather(*self._workers, *self._retry_tasks, return_exceptions=True)
+        if self._pruner:
+            await asyncio.gather(self._pruner, return_exceptions=True)
+        self._workers, self._pruner = [], None
+        await self._flush_dead_endpoints()
+        if self.session:
+            await self.session.close()
+            self.session = None
+
+    async def enqueue(self, subscription_info: Dict[str, Any], message_body: str):
+        """Queue one push; waits if the queue is full so producers feel backpressure."""
+        if not VAPID_PRIVATE_KEY:
+            logger.error("VAPID_PRIVATE_KEY not set. Cannot send push notification.")
+            return
+        self.start()
+        await self.queue.put(PushJob(subscription_info, message_body))
+
+    def pushes_per_second(self, window: float = 60.0) -> float:
+        cutoff = time.monotonic() - window
+        while self._recent and self._recent[0] < cutoff:
+            self._recent.popleft()
+        return len(self._recent) / window
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self.queue.qsize(),
+            "workers": len(self._workers),
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "pruned": self.pruned,
+            "pushes_per_second": round(self.pushes_per_second(), 3),
+        }
+
+    def _headers_for(self, endpoint: str) -> Dict[str, str]:
+        parsed = urlparse(endpoint)
+        origin = f"{parsed.scheme}://{parsed.netloc}"
+        now = int(time.time())
+        cached = self._vapid_headers.get(origin)
+        if cached is None or cached[0] - now < 3600:
+            if self._vapid is None:
+                self._vapid = Vapid.from_string(private_key=VAPID_PRIVATE_KEY)
+            exp = now + 12 * 3600
+            claims = {**VAPID_CLAIMS, "aud": origin, "exp": exp}
+            cached = (exp, self._vapid.sign(claims))
+            self._vapid_headers[origin] = cached
+        return dict(cached[1])
+
+    async def _worker(self):
+        while True:
+            job = await self.queue.get()
+            try:
+                await self._deliver(job)
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Error sending push notification: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def _deliver(self, job: PushJob):
+        endpoint = job.subscription_info["endpoint"]
+        # ECDH key agreement and AES-GCM encryption are per subscription; keep them off the loop
+        request = await asyncio.to_thread(
+            self._encrypt, job.subscription_info, json.dumps({"body": job.message_body}), self._headers_for(endpoint),
+        )
+        started = time.monotonic()
+        try:
+            async with self.session.post(request.pop("endpoint"), **request) as response:
+                status = response.status
+                retry_after = response.headers.get("Retry-After")
+                await response.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning(f"Push transport error for {endpoint[:60]}: {e}")
+            UPSTREAM_ERRORS.labels('webpush', upstream_error_reason(e)).inc()
+            status, retry_after = 503, None
+        else:
+            UPSTREAM_REQUEST_SECONDS.labels('webpush').observe(time.monotonic() - started)
+            if status >= 400:
+                UPSTREAM_ERRORS.labels('webpush', f'status_{status}').inc()
+
+        if status < 300:
+            self.sent += 1
+            self._recent.append(time.monotonic())
+        elif status in self.GONE_STATUSES:
+            logger.info("Subscription is expired or invalid, scheduling deletion.")
+            self._dead_endpoints.add(endpoint)
+            if len(self._dead_endpoints) >= PUSH_PRUNE_BATCH:
+                self._prune_wakeup.set()
+        elif status in self.RETRY_STATUSES and job.attempt < PUSH_MAX_RETRIES:
+            delay = PUSH_RETRY_BASE_SECONDS * (2 ** job.attempt) * (0.5 + random.random())
+            if retry_after and retry_after.isdigit():
+                delay = max(delay, float(retry_after))
+            self.retried += 1
+            task = asyncio.create_task(self._requeue(job._replace(attempt=job.attempt + 1), delay))
+            self._retry_tasks.add(task)
+            task.add_done_callback(self._retry_tasks.discard)
+        else:
+            self.failed += 1
+            logger.error(f"Push to {endpoint[:60]} failed with status {status} after {job.attempt + 1} attempt(s)")
+
+    @staticmethod
+    def _encrypt(subscription_info: Dict[str, Any], data: str, headers: Dict[str, str]) -> Dict[str, Any]:
+        """Encrypted body and headers of one push: ``{"endpoint", "data", "headers"}``."""
+        return WebPusher(subscription_info)._prepare_send_data(data=data, headers=headers, ttl=PUSH_TTL_SECONDS)
+
+    async def _requeue(self, job: PushJob, delay: float):
+        await asyncio.sleep(delay)
+        await self.queue.put(job)
+
+    async def _prune_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._prune_wakeup.wait(), timeout=PUSH_PRUNE_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._prune_wakeup.clear()
+            await self._flush_dead_endpoints()
+
+    async def _flush_dead_endpoints(self):
+        db = self.get_database()
+        if not self._dead_endpoints or db is None:
+            self._dead_endpoints.clear()
+            return
+        endpoints, self._dead_endpoints = list(self._dead_endpoints), set()
+        try:
+            result = await db.push_subscriptions.delete_many({"endpoint": {"$in": endpoints}})
+            self.pruned += result.deleted_count
+            logger.info(f"Deleted {result.deleted_count} dead push subscriptions")
+        except Exception as e:
+            logger.error(f"Error deleting dead push subscriptions: {e}")
+            self._dead_endpoints.update(endpoints)
@@ -0,0 +1,199 @@
+"""Reminder scheduler: fires pushes when reminders come due."""
+import asyncio
+import heapq
+import logging
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from config import PUSH_DIGEST_ENABLED, PUSH_DIGEST_WINDOW_SECONDS
+from models import Reminder
+
+logger = logging.getLogger(__name__)
+
+
+# Reminder scheduler
+class ReminderScheduler:
+    """Fires push notifications when reminders actually come due.
+
+    Only reminders due within the next ``window`` are held in memory, in a
+    min-heap of ``(due_date, id)`` plus a compact tuple per reminder. The
+    window is reloaded from Mongo with a ranged ``due_date`` query every half
+    window, and reminders created by other workers are picked up by polling
+    on ``created_at``; neither scans the whole collection. Reminders created
+    or completed in this process are applied immediately via ``schedule`` and
+    ``discard``. Before sending, due reminders are claimed by stamping
+    ``notified_at`` so several workers never push the same reminder twice.
+    """
+
+    def __init__(self, window: float, poll_interval: float, max_lateness: float, batch_size: int,
+                 get_database: Callable[[], Any], dispatch: Callable[[List[Reminder]], Awaitable[None]]):
+        self.get_database = get_database
+        self.dispatch = dispatch
+        self.window = timedelta(seconds=window)
+        self.poll_interval = poll_interval
+        self.max_lateness = timedelta(seconds=max_lateness)
+        self.batch_size = batch_size
+        self._heap: List[Tuple[datetime, str]] = []
+        self._pending: Dict[str, tuple] = {}  # id -> (due_date, user_id, plant_id, plant_nickname, reminder_type)
+        self._by_user: Dict[str, set] = {}  # user_id -> pending reminder ids, for digests
+        self.digest_window = timedelta(seconds=PUSH_DIGEST_WINDOW_SECONDS) if PUSH_DIGEST_ENABLED else None
+        self._window_end: Optional[datetime] = None
+        self._next_window_load: Optional[datetime] = None
+        self._last_poll: Optional[datetime] = None
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.dispatched = 0
+
+    def __len__(self):
+        return len(self._pending)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def schedule(self, reminder: Reminder):
+        """Track a reminder created in this process if it falls inside the loaded window."""
+        if self._window_end is None or reminder.completed or reminder.due_date >= self._window_end:
+            return
+        self._push(reminder.id, reminder.due_date, reminder.user_id, reminder.plant_id,
+                   reminder.plant_nickname, reminder.reminder_type)
+
+    def discard(self, reminder_id: str):
+        """Forget a completed reminder; its heap entry is skipped lazily."""
+        self._forget(reminder_id)
+
+    def _forget(self, reminder_id: str) -> Optional[tuple]:
+        entry = self._pending.pop(reminder_id, None)
+        if entry is not None:
+            user_ids = self._by_user.get(entry[1])
+            if user_ids is not None:
+                user_ids.discard(reminder_id)
+                if not user_ids:
+                    del self._by_user[entry[1]]
+        return entry
+
+    def _push(self, reminder_id: str, due_date: datetime, *fields):
+        current = self._pending.get(reminder_id)
+        if current is not None and current[0] == due_date:
+            return
+        self._pending[reminder_id] = (due_date, *fields)
+        self._by_user.setdefault(fields[0], set()).add(reminder_id)
+        heapq.heappush(self._heap, (due_date, reminder_id))
+        if self._heap[0][1] == reminder_id:
+            self._wakeup.set()
+
+    async def _load(self, query: Dict[str, Any]):
+        projection = {"_id": 0, "id": 1, "due_date": 1, "user_id": 1, "plant_id": 1,
+                      "plant_nickname": 1, "reminder_type": 1}
+        cursor = self.get_database().reminders.find(query, projection).sort("due_date", 1).batch_size(self.batch_size)
+        loaded = 0
+        async for doc in cursor:
+            self._push(doc["id"], doc["due_date"], doc["user_id"], doc["plant_id"],
+                       doc["plant_nickname"], doc["reminder_type"])
+            loaded += 1
+        return loaded
+
+    async def _load_window(self, now: datetime):
+        window_end = now + self.window
+        loaded = await self._load({
+            "completed": False,
+            "notified_at": None,
+            "due_date": {"$gte": now - self.max_lateness, "$lt": window_end},
+        })
+        self._window_end = window_end
+        self._next_window_load = now + self.window / 2
+        self._last_poll = now
+        logger.info(f"Reminder scheduler loaded {loaded} reminders due before {window_end.isoformat()}")
+
+    async def _poll_new(self, now: datetime):
+        since = self._last_poll - timedelta(seconds=self.poll_interval)  # allow for clock skew between workers
+        await self._load({
+            "created_at": {"$gte": since},
+            "completed": False,
+            "notified_at": None,
+            "due_date": {"$lt": self._window_end},
+        })
+        self._last_poll = now
+
+    def _pop_due(self, now: datetime) -> List[str]:
+        due = []
+        while self._heap and self._heap[0][0] <= now and len(due) < self.batch_size:
+            due_date, reminder_id = heapq.heappop(self._heap)
+            entry = self._pending.get(reminder_id)
+            if entry is not None and entry[0] == due_date:
+                due.append(reminder_id)
+        return due
+
+    def _digest_companions(self, reminder_ids: List[str], now: datetime) -> List[str]:
+        """Other pending reminders of the same users that come due within the digest window."""
+        horizon = now + self.digest_window
+        due = set(reminder_ids)
+        companions = []
+        for user_id in {self._pending[rid][1] for rid in reminder_ids if rid in self._pending}:
+            for rid in self._by_user.get(user_id, ()):
+                if rid not in due and self._pending[rid][0] <= horizon:
+                    companions.append(rid)
+        return companions
+
+    async def _dispatch(self, reminder_ids: List[str]):
+        if self.digest_window is not None:
+            reminder_ids = reminder_ids + self._digest_companions(reminder_ids, datetime.utcnow())
+        entries = {rid: entry for rid in reminder_ids if (entry := self._forget(rid)) is not None}
+        claim = str(uuid.uuid4())
+        db = self.get_database()
+        await db.reminders.update_many(
+            {"id": {"$in": list(entries)}, "completed": False, "notified_at": None},
+            {"$set": {"notified_at": datetime.utcnow(), "notify_claim": claim}},
+        )
+        claimed = await db.reminders.find(
+            {"notify_claim": claim}, {"_id": 0, "id": 1}
+        ).to_list(len(entries))
+
+        reminders = []
+        for doc in claimed:
+            due_date, user_id, plant_id, plant_nickname, reminder_type = entries[doc["id"]]
+            reminders.append(Reminder(
+                id=doc["id"], user_id=user_id, plant_id=plant_id, plant_nickname=plant_nickname,
+                reminder_type=reminder_type, due_date=due_date,
+            ))
+        await self.dispatch(reminders)
+        self.dispatched += len(reminders)
+
+    async def _run(self):
+        while True:
+            try:
+                now = datetime.utcnow()
+                if self._next_window_load is None or now >= self._next_window_load:
+                    await self._load_window(now)
+                elif (now - self._last_poll).total_seconds() >= self.poll_interval:
+                    await self._poll_new(now)
+
+                due = self._pop_due(now)
+                if due:
+                    await self._dispatch(due)
+                    continue
+
+                next_event = min(self._next_window_load, self._last_poll + timedelta(seconds=self.poll_interval))
+                if self._heap:
+                    next_event = min(next_event, self._heap[0][0])
+                delay = max(0.0, (next_event - datetime.utcnow()).total_seconds())
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Reminder scheduler error: {e}")
+                await asyncio.sleep(self.poll_interval)
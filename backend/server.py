@@ -1,25 +1,68 @@
-from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File, Form
-from dotenv import load_dotenv
+from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File, Form, Request, Query
+from fastapi.responses import StreamingResponse, JSONResponse, Response
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, InsertOne, ReturnDocument, UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError
 import os
 import logging
-from pathlib import Path
-from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, AsyncIterator, Tuple
 import uuid
 from datetime import datetime, timedelta
 import aiohttp
 import asyncio
 import json
 import base64
-from PIL import Image
-import io
-from openai import OpenAI
-
-
-ROOT_DIR = Path(__file__).parent
-load_dotenv(ROOT_DIR / '.env')
+import sys
+import time
+import httpx
+from openai import AsyncOpenAI
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+from config import (
+    CARE_STORE_MAX_AGE_DAYS, CARE_STORE_PATH, CHAT_CACHE_ENABLED, CHAT_CACHE_MAX_BYTES, CHAT_CACHE_MAX_ENTRIES,
+    CHAT_CACHE_MAX_QUESTION_CHARS, CHAT_CACHE_TTL_SECONDS, CHAT_HISTORY_COMPACT_RATIO,
+    CHAT_HISTORY_TOKEN_BUDGET, CHAT_SESSION_IDLE_SECONDS, CHAT_SESSION_MAX, CHAT_SESSION_STORE_PATH, CHAT_SUMMARY_ENABLED,
+    CHAT_SUMMARY_MAX_TOKENS, COMPLETE_REMINDER_USE_TRANSACTION, EXPORT_BATCH_SIZE,
+    IDENTIFY_ENRICH_DEADLINE_SECONDS, IDENTIFY_LLM_TIMEOUT_SECONDS, IDENTIFY_MAX_IMAGES,
+    IDENTIFY_PLANTNET_TIMEOUT_SECONDS, IMAGE_CACHE_MAX_BYTES, IMAGE_CACHE_MAX_DISTANCE, IMAGE_CACHE_MAX_ENTRIES,
+    IMAGE_CACHE_TTL_SECONDS, LIST_PAGE_MAX, LLM_CHAT_MODELS, LLM_CHAT_RACE_AFTER_SECONDS, LLM_CHAT_TIMEOUT_SECONDS,
+    LLM_CONNECT_TIMEOUT_SECONDS, LLM_IMAGE_TIMEOUT_SECONDS, LLM_MAX_CONCURRENCY, LLM_MAX_CONNECTIONS,
+    LLM_MAX_KEEPALIVE_CONNECTIONS, LLM_MAX_RETRIES, LLM_MODEL_COOLDOWN_SECONDS, LLM_ROUTER_EWMA_ALPHA,
+    LLM_VISION_MODELS, LLM_VISION_RACE_AFTER_SECONDS, MAX_UPLOAD_BYTES, OPENROUTER_API_KEY, OPENROUTER_BASE_URL,
+    PERENUAL_API_KEY, PERENUAL_BASE_URL, PERENUAL_CONNECT_TIMEOUT_SECONDS, PERENUAL_HEDGE_ENABLED,
+    PERENUAL_QUOTA_PER_DAY, PERENUAL_QUOTA_PER_MINUTE, PERENUAL_READ_TIMEOUT_SECONDS,
+    PERENUAL_TOTAL_TIMEOUT_SECONDS, PLANTNET_API_KEY, PLANTNET_BASE_URL, PLANTNET_CONNECT_TIMEOUT_SECONDS,
+    PLANTNET_QUOTA_PER_DAY, PLANTNET_QUOTA_PER_MINUTE, PLANTNET_READ_TIMEOUT_SECONDS,
+    PLANTNET_TOTAL_TIMEOUT_SECONDS, PLANT_TRANSLATIONS_PATH, PUSH_DIGEST_ENABLED, PUSH_QUEUE_MAX, PUSH_WORKERS,
+    REMINDER_SCHEDULER_BATCH_SIZE, REMINDER_SCHEDULER_ENABLED, REMINDER_SCHEDULER_MAX_LATENESS_SECONDS,
+    REMINDER_SCHEDULER_POLL_SECONDS, REMINDER_SCHEDULER_WINDOW_SECONDS, SEARCH_CACHE_MAX_BYTES,
+    SEARCH_CACHE_MAX_ENTRIES, SEARCH_CACHE_STALE_SECONDS, SEARCH_CACHE_TTL_SECONDS, SPECIES_INDEX_PATH,
+    SPECIES_SEARCH_LIMIT, VAPID_PUBLIC_KEY,
+)
+from models import (
+    BulkCompleteRequest, BulkCompleteResponse, BulkPlantResult, BulkPlantsRequest, BulkPlantsResponse,
+    BulkReminderResult, ChatRequest, DiagnosisResponse, EnhancedPlantIdentification, PlantCareInfo,
+    PlantIdentification, PlantSearchResult, PushSubscription, Reminder, ReminderFields, UserPlant,
+    UserPlantFields,
+)
+from metrics import (
+    MetricsMiddleware, UPSTREAM_ERRORS, UPSTREAM_REQUEST_SECONDS, record_llm_usage, upstream_error_reason,
+)
+from caches import ImageResultCache, ResultCache
+from care_store import SpeciesCareStore
+from uploads import (
+    UploadSizeLimitMiddleware, prepare_collage, prepare_upload, prepare_uploads, shutdown_preprocess_pool,
+)
+from translation import QueryTranslator
+from chat import CHAT_SUMMARY_PROMPT, ChatAnswerCache, ChatSessionStore, ChatTurn
+from species_index import SpeciesIndex, perenual_search_result, read_species_records
+from providers import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, ProviderClient, QuotaExceededError
+from llm_router import ModelRouter, llm_error_retryable
+from push import PushDeliveryService
+from scheduler import ReminderScheduler
+from indexes import REQUIRED_INDEXES, IndexManager
 
 # MongoDB connection
 # mongo_url = os.environ['MONGO_URL']
@@ -34,193 +77,162 @@ app = FastAPI(title="Plauntie - Plant Care Assistant API")
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
-# API Keys
-PERENUAL_API_KEY = os.environ.get('PERENUAL_API_KEY')
-PLANTNET_API_KEY = os.environ.get('PLANTNET_API_KEY')
-PLANTBOOK_CLIENT_ID = os.environ.get('PLANTBOOK_CLIENT_ID')
-PLANTBOOK_CLIENT_SECRET = os.environ.get('PLANTBOOK_CLIENT_SECRET')
-PLANTBOOK_API_TOKEN = os.environ.get('PLANTBOOK_API_TOKEN')
-KINDWISE_API_KEY = os.environ.get('KINDWISE_API_KEY')
-RAPIDAPI_KEY = os.environ.get('RAPIDAPI_KEY')
-from pywebpush import webpush, WebPushException
-
-OPENROUTER_API_KEY = os.environ.get('OPENROUTER_API_KEY')
-VAPID_PRIVATE_KEY = os.environ.get("VAPID_PRIVATE_KEY")
-VAPID_PUBLIC_KEY = os.environ.get("VAPID_PUBLIC_KEY")
-
-# Models
-class PlantSearchResult(BaseModel):
-    id: str
-    name: str
-    scientific_name: str
-    common_names: List[str] = []
-    image_url: Optional[str] = None
-    description: Optional[str] = None
-    care_level: Optional[str] = None
-
-class PlantCareInfo(BaseModel):
-    plant_id: str
-    name: str
-    scientific_name: str
-    watering: Optional[str] = None
-    sunlight: Optional[str] = None
-    temperature: Optional[str] = None
-    humidity: Optional[str] = None
-    fertilizer: Optional[str] = None
-    repotting: Optional[str] = None
-    common_problems: List[str] = []
-    care_tips: List[str] = []
-
-class PlantIdentification(BaseModel):
-    suggestions: List[Dict[str, Any]] = []
-    confidence: float = 0.0
-    identified_name: Optional[str] = None
-
-
-class EnhancedPlantIdentification(PlantIdentification):
-    plauntie_description: Optional[str] = None
-
-
-class DiagnosisResponse(BaseModel):
-    diagnosis_text: str
-
-
-class UserPlant(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    user_id: str
-    plant_id: str
-    nickname: str
-    plant_name: str
-    scientific_name: str
-    date_added: datetime = Field(default_factory=datetime.utcnow)
-    last_watered: Optional[datetime] = None
-    last_fertilized: Optional[datetime] = None
-    last_repotted: Optional[datetime] = None
-    watering_frequency_days: int = 7
-    fertilizing_frequency_days: int = 30
-    notes: Optional[str] = None
-    image_url: Optional[str] = None
-
-class Reminder(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    user_id: str
-    plant_id: str
-    plant_nickname: str
-    reminder_type: str  # watering, fertilizing, repotting
-    due_date: datetime
-    completed: bool = False
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-
-class PlantDiagnosis(BaseModel):
-    plant_name: Optional[str] = None
-    health_status: str
-    problems: List[Dict[str, Any]] = []
-    recommendations: List[str] = []
-    confidence: float = 0.0
-
-
-class ChatRequest(BaseModel):
-    message: str
-    enable_web_search: bool = False
-
-
-class PushSubscriptionKeys(BaseModel):
-    p256dh: str
-    auth: str
-
-class PushSubscription(BaseModel):
-    endpoint: str
-    keys: PushSubscriptionKeys
-    user_id: str
+class ServiceStatsCollector:
+    """Expose cache, provider and push queue state, read from the services at scrape time."""
+
+    def collect(self):
+        caches = {
+            "search": plant_service.search_cache.stats(),
+            "identify": identify_cache.stats(),
+            "diagnose": diagnose_cache.stats(),
+            "chat": chat_cache.stats(),
+        }
+        requests = CounterMetricFamily('plauntie_cache_requests', 'Cache lookups by result', labels=['cache', 'result'])
+        entries = GaugeMetricFamily('plauntie_cache_entries', 'Entries held per cache', labels=['cache'])
+        size = GaugeMetricFamily('plauntie_cache_bytes', 'Approximate bytes held per cache', labels=['cache'])
+        for name, stats in caches.items():
+            for result in ('hits', 'stale_hits', 'near_hits', 'misses', 'bypassed'):
+                if result in stats:
+                    requests.add_metric([name, result], stats[result])
+            entries.add_metric([name], stats['entries'])
+            size.add_metric([name], stats['bytes'])
+        yield requests
+        yield entries
+        yield size
+
+        circuit = GaugeMetricFamily('plauntie_provider_circuit_open', '1 while the circuit breaker rejects calls', labels=['provider'])
+        quota = GaugeMetricFamily('plauntie_provider_quota_remaining', 'Remaining provider quota', labels=['provider', 'window'])
+        queued = GaugeMetricFamily('plauntie_provider_quota_queued', 'Calls waiting for quota', labels=['provider'])
+        for provider in (plant_service.perenual, plant_service.plantnet):
+            circuit.add_metric([provider.name], 1 if provider.breaker.state == "open" else 0)
+            stats = provider.quota.stats()
+            for window in ('minute', 'day'):
+                if stats[f'remaining_{window}'] is not None:
+                    quota.add_metric([provider.name, window], stats[f'remaining_{window}'])
+            queued.add_metric([provider.name], sum(stats['queue'].values()))
+        yield circuit
+        yield quota
+        yield queued
+
+        latency = GaugeMetricFamily('plauntie_llm_model_latency_seconds', 'EWMA latency per LLM model',
+                                    labels=['task', 'model'])
+        errors = GaugeMetricFamily('plauntie_llm_model_error_rate', 'EWMA error rate per LLM model', labels=['task', 'model'])
+        for router in (llm_service.chat_router, llm_service.vision_router):
+            for model, health in router.health.items():
+                if health.latency is not None:
+                    latency.add_metric([router.task, model], health.latency)
+                errors.add_metric([router.task, model], health.error_rate)
+        yield latency
+        yield errors
+
+        sessions = chat_sessions.stats()
+        yield GaugeMetricFamily('plauntie_chat_sessions', 'Stored chat sessions', value=sessions['sessions'])
+        yield CounterMetricFamily('plauntie_chat_history_compactions', 'Chat histories compacted to fit the token budget',
+                                  value=sessions['compactions'])
+
+        push = push_service.stats()
+        yield GaugeMetricFamily('plauntie_push_queue_depth', 'Web pushes waiting for a worker', value=push['queue_depth'])
+        delivered = CounterMetricFamily('plauntie_push_deliveries', 'Web push delivery outcomes', labels=['outcome'])
+        for outcome in ('sent', 'failed', 'retried', 'pruned'):
+            delivered.add_metric([outcome], push[outcome])
+        yield delivered
 
 
 # Plant API Integration Services
 class PlantAPIService:
     def __init__(self):
-        self.session = None
-        # Russian to English plant name translations
-        self.plant_translations = {
-            'роза': 'rose',
-            'розы': 'rose',
-            'фиалка': 'violet',
-            'фиалки': 'violet',
-            'кактус': 'cactus',
-            'кактусы': 'cactus',
-            'фикус': 'ficus',
-            'фикусы': 'ficus',
-            'орхидея': 'orchid',
-            'орхидеи': 'orchid',
-            'тюльпан': 'tulip',
-            'тюльпаны': 'tulip',
-            'лилия': 'lily',
-            'лилии': 'lily',
-            'ромашка': 'daisy',
-            'ромашки': 'daisy',
-            'подсолнух': 'sunflower',
-            'подсолнухи': 'sunflower',
-            'пион': 'peony',
-            'пионы': 'peony',
-            'лаванда': 'lavender',
-            'мята': 'mint',
-            'базилик': 'basil',
-            'петрушка': 'parsley',
-            'укроп': 'dill',
-            'алоэ': 'aloe',
-            'каланхоэ': 'kalanchoe',
-            'герань': 'geranium',
-            'бегония': 'begonia',
-            'драцена': 'dracaena',
-            'пальма': 'palm',
-            'плющ': 'ivy',
-            'папоротник': 'fern',
-            'мох': 'moss',
-            'суккулент': 'succulent',
-            'суккуленты': 'succulent',
-            'денежное дерево': 'jade plant',
-            'фиалка узамбарская': 'african violet',
-            'комнатная роза': 'indoor rose',
-            'цветок': 'flower',
-            'цветы': 'flower',
-            'растение': 'plant',
-            'растения': 'plant',
-            'трава': 'grass',
-            'дерево': 'tree',
-            'куст': 'bush'
-        }
+        self.perenual = ProviderClient(
+            "perenual", PERENUAL_CONNECT_TIMEOUT_SECONDS, PERENUAL_READ_TIMEOUT_SECONDS,
+            PERENUAL_TOTAL_TIMEOUT_SECONDS, hedge=PERENUAL_HEDGE_ENABLED,
+            per_minute=PERENUAL_QUOTA_PER_MINUTE, per_day=PERENUAL_QUOTA_PER_DAY,
+        )
+        self.plantnet = ProviderClient(
+            "plantnet", PLANTNET_CONNECT_TIMEOUT_SECONDS, PLANTNET_READ_TIMEOUT_SECONDS,
+            PLANTNET_TOTAL_TIMEOUT_SECONDS,
+            per_minute=PLANTNET_QUOTA_PER_MINUTE, per_day=PLANTNET_QUOTA_PER_DAY,
+        )
+        self.search_cache = ResultCache(
+            ttl=SEARCH_CACHE_TTL_SECONDS,
+            stale_ttl=SEARCH_CACHE_STALE_SECONDS,
+            max_entries=SEARCH_CACHE_MAX_ENTRIES,
+            max_bytes=SEARCH_CACHE_MAX_BYTES,
+            sizeof=lambda results: sum(len(r.model_dump_json()) for r in results) + 64,
+        )
+        self.care_store = SpeciesCareStore(CARE_STORE_PATH, max_age_days=CARE_STORE_MAX_AGE_DAYS)
+        self.translator = QueryTranslator.from_file(PLANT_TRANSLATIONS_PATH)
+        self.species_index = SpeciesIndex.open_if_exists(SPECIES_INDEX_PATH)
     
     def translate_query(self, query: str) -> str:
         """Translate Russian plant names to English"""
-        query_lower = query.lower().strip()
-        
-        # Direct translation
-        if query_lower in self.plant_translations:
-            return self.plant_translations[query_lower]
-        
-        # Partial match
-        for russian, english in self.plant_translations.items():
-            if russian in query_lower or query_lower in russian:
-                return english
-        
-        return query  # Return original if no translation found
-    
-    async def get_session(self):
-        if self.session is None:
-            self.session = aiohttp.ClientSession()
-        return self.session
+        return self.translator.translate(query) or query  # Return original if no translation found
     
     async def close_session(self):
-        if self.session:
-            await self.session.close()
+        await self.perenual.close()
+        await self.plantnet.close()
+        self.care_store.close()
+        if self.species_index:
+            self.species_index.close()
+            self.species_index = None
+
+    async def warm_care_store(self, plant_ids: List[str], concurrency: int = 2, force: bool = False) -> Dict[str, int]:
+        """Prefetch species details into the local care store."""
+        plant_ids = list(dict.fromkeys(pid.strip() for pid in plant_ids if pid.strip()))
+        skip = set() if force else await self.care_store.fresh_ids(plant_ids)
+        todo = [pid for pid in plant_ids if pid not in skip]
+        stats = {"requested": len(plant_ids), "skipped": len(skip), "fetched": 0, "failed": 0}
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def warm_one(plant_id: str):
+            async with semaphore:
+                care_info = await self._fetch_perenual_care(plant_id, priority=PRIORITY_BACKGROUND)
+            if care_info:
+                await self.care_store.put(care_info)
+                stats["fetched"] += 1
+            else:
+                stats["failed"] += 1
+
+        await asyncio.gather(*(warm_one(pid) for pid in todo))
+        return stats
+
+    @staticmethod
+    def normalize_search_key(query: str) -> str:
+        """Cache key for a (translated) search query."""
+        return " ".join(query.lower().split())
+
+    def search_plants_local(self, query: str, translated_query: str) -> List[PlantSearchResult]:
+        """Search the local species index with both the original and translated query."""
+        best: Dict[str, Tuple[float, PlantSearchResult]] = {}
+        for q in dict.fromkeys((translated_query, query)):
+            for score, result in self.species_index.search_scored(q):
+                if result.id not in best or score > best[result.id][0]:
+                    best[result.id] = (score, result)
+        ranked = sorted(best.values(), key=lambda item: item[0], reverse=True)
+        return [result for _, result in ranked[:SPECIES_SEARCH_LIMIT]]
+
+    async def search_plants(self, query: str) -> List[PlantSearchResult]:
+        """Search plants locally, falling back to Perenual when the index has no match"""
+        if self.species_index and not query.startswith("id:"):
+            translated_query = self.translate_query(query)
+            results = self.search_plants_local(query, translated_query)
+            if results:
+                return results
+        return await self.search_plants_perenual(query)
 
     async def search_plants_perenual(self, query: str) -> List[PlantSearchResult]:
         """Search plants using Perenual API"""
-        session = await self.get_session()
-        
         # Translate Russian to English if needed
         translated_query = self.translate_query(query)
         logging.info(f"Original query: '{query}' -> Translated: '{translated_query}'")
-        
-        url = f"https://perenual.com/api/species-list"
+
+        cache_key = self.normalize_search_key(translated_query)
+        results = await self.search_cache.get_or_load(
+            cache_key, lambda: self._fetch_perenual_search(translated_query)
+        )
+        return list(results) if results is not None else []
+
+    async def _fetch_perenual_search(self, translated_query: str) -> Optional[List[PlantSearchResult]]:
+        """Query Perenual's species list. Returns None on upstream failure so errors are never cached."""
+        url = f"{PERENUAL_BASE_URL}/species-list"
         params = {
             'key': PERENUAL_API_KEY,
             'q': translated_query,
@@ -228,111 +240,131 @@ class PlantAPIService:
         }
         
         try:
-            async with session.get(url, params=params) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    results = []
-                    
-                    for plant in data.get('data', []):
-                        result = PlantSearchResult(
-                            id=str(plant.get('id', '')),
-                            name=plant.get('common_name', ''),
-                            scientific_name=plant.get('scientific_name', [''])[0] if plant.get('scientific_name') else '',
-                            common_names=plant.get('other_name', []),
-                            image_url=plant.get('default_image', {}).get('medium_url') if plant.get('default_image') else None,
-                            description=plant.get('description', ''),
-                            care_level=plant.get('care_level', '')
-                        )
-                        results.append(result)
-                    
-                    logging.info(f"Found {len(results)} plants for query '{translated_query}'")
-                    return results
-                else:
-                    logging.error(f"Perenual API returned status {response.status}")
+            response = await self.perenual.get(url, params=params)
+            if response.status == 200:
+                results = []
+                
+                for plant in response.data.get('data', []):
+                    results.append(perenual_search_result(plant))
+                
+                logging.info(f"Found {len(results)} plants for query '{translated_query}'")
+                return results
+            else:
+                logging.error(f"Perenual API returned status {response.status}")
         except Exception as e:
             logging.error(f"Error searching Perenual: {e}")
         
-        return []
+        return None
+
+    async def fetch_species_pages(self, pages: int) -> List[Dict[str, Any]]:
+        """Raw species-list records from the first ``pages`` Perenual pages (for building the local index)."""
+        records: List[Dict[str, Any]] = []
+        for page in range(1, pages + 1):
+            params = {'key': PERENUAL_API_KEY, 'page': page}
+            try:
+                response = await self.perenual.get(f"{PERENUAL_BASE_URL}/species-list", PRIORITY_BACKGROUND, params=params)
+            except QuotaExceededError as e:
+                logging.error(f"Stopping species fetch at page {page}: {e}")
+                break
+            if response.status != 200:
+                logging.error(f"Perenual API returned status {response.status} for page {page}; stopping")
+                break
+            data = response.data
+            records.extend(data.get('data', []))
+            if page >= data.get('last_page', pages):
+                break
+        return records
 
     async def get_plant_care_info_perenual(self, plant_id: str) -> Optional[PlantCareInfo]:
-        """Get detailed care information from Perenual API"""
-        session = await self.get_session()
-        url = f"https://perenual.com/api/species/details/{plant_id}"
+        """Get detailed care information, from the local store if possible, else from Perenual API"""
+        care_info = await self.care_store.get(plant_id)
+        if care_info:
+            return care_info
+
+        care_info = await self._fetch_perenual_care(plant_id)
+        if care_info:
+            await self.care_store.put(care_info)
+            return care_info
+
+        # Upstream failed: an expired record is still better than nothing
+        return await self.care_store.get(plant_id, allow_stale=True)
+
+    async def _fetch_perenual_care(self, plant_id: str, priority: int = PRIORITY_INTERACTIVE) -> Optional[PlantCareInfo]:
+        """Fetch /species/details/{id} from Perenual API"""
+        url = f"{PERENUAL_BASE_URL}/species/details/{plant_id}"
         params = {'key': PERENUAL_API_KEY}
         
         try:
-            async with session.get(url, params=params) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    
-                    # Check if data is valid
-                    if not data or 'error' in data:
-                        logging.error(f"Invalid data from Perenual API: {data}")
-                        return None
-                    
-                    care_info = PlantCareInfo(
-                        plant_id=plant_id,
-                        name=data.get('common_name', 'Unknown'),
-                        scientific_name=data.get('scientific_name', ['Unknown'])[0] if data.get('scientific_name') else 'Unknown',
-                        watering=data.get('watering', 'Информация недоступна'),
-                        sunlight=data.get('sunlight', ['Информация недоступна'])[0] if data.get('sunlight') else 'Информация недоступна',
-                        temperature=f"{data.get('hardiness', {}).get('min', 'N/A')} - {data.get('hardiness', {}).get('max', 'N/A')}°C" if data.get('hardiness') else 'Информация недоступна',
-                        humidity=data.get('humidity', 'Информация недоступна'),
-                        fertilizer=data.get('fertilizer', 'Информация недоступна'),
-                        repotting=data.get('repotting', 'Информация недоступна'),
-                        common_problems=data.get('problem', []),
-                        care_tips=data.get('care_guides', [])
-                    )
-                    
-                    return care_info
-                else:
-                    logging.error(f"Perenual API returned status {response.status}")
+            response = await self.perenual.get(url, priority, params=params)
+            if response.status == 200:
+                data = response.data
+                
+                # Check if data is valid
+                if not data or 'error' in data:
+                    logging.error(f"Invalid data from Perenual API: {data}")
+                    return None
+                
+                care_info = PlantCareInfo(
+                    plant_id=plant_id,
+                    name=data.get('common_name', 'Unknown'),
+                    scientific_name=data.get('scientific_name', ['Unknown'])[0] if data.get('scientific_name') else 'Unknown',
+                    watering=data.get('watering', 'Информация недоступна'),
+                    sunlight=data.get('sunlight', ['Информация недоступна'])[0] if data.get('sunlight') else 'Информация недоступна',
+                    temperature=f"{data.get('hardiness', {}).get('min', 'N/A')} - {data.get('hardiness', {}).get('max', 'N/A')}°C" if data.get('hardiness') else 'Информация недоступна',
+                    humidity=data.get('humidity', 'Информация недоступна'),
+                    fertilizer=data.get('fertilizer', 'Информация недоступна'),
+                    repotting=data.get('repotting', 'Информация недоступна'),
+                    common_problems=data.get('problem', []),
+                    care_tips=data.get('care_guides', [])
+                )
+                
+                return care_info
+            else:
+                logging.error(f"Perenual API returned status {response.status}")
         except Exception as e:
             logging.error(f"Error getting care info from Perenual: {e}")
         
         return None
 
-    async def identify_plant_plantnet(self, image_data: bytes) -> PlantIdentification:
-        """Identify plant using PlantNet API"""
-        session = await self.get_session()
-        url = "https://my-api.plantnet.org/v2/identify/weurope"
-        
-        # Prepare the image data
-        image_b64 = base64.b64encode(image_data).decode()
+    async def identify_plant_plantnet(self, images: List[Tuple[bytes, str]]) -> PlantIdentification:
+        """Identify plant using PlantNet API from one or more (image, organ) photos of the same plant"""
+        url = f"{PLANTNET_BASE_URL}/identify/weurope"
         
         data = aiohttp.FormData()
-        data.add_field('images', image_data, filename='plant.jpg', content_type='image/jpeg')
+        for index, (image_data, organ) in enumerate(images):
+            data.add_field('images', image_data, filename=f'plant-{index}.jpg', content_type='image/jpeg')
+            data.add_field('organs', organ)
         data.add_field('modifiers', '["crops","isolated"]')
         data.add_field('plant-details', '["common_names"]')
         data.add_field('api-key', PLANTNET_API_KEY)
         
         try:
-            async with session.post(url, data=data) as response:
-                if response.status == 200:
-                    result = await response.json()
+            response = await self.plantnet.post(url, data=data)
+            if response.status == 200:
+                result = response.data
+                
+                suggestions = []
+                max_score = 0
+                identified_name = None
+                
+                for species in result.get('results', []):
+                    score = species.get('score', 0)
+                    if score > max_score:
+                        max_score = score
+                        identified_name = species.get('species', {}).get('scientificNameWithoutAuthor', '')
                     
-                    suggestions = []
-                    max_score = 0
-                    identified_name = None
-                    
-                    for species in result.get('results', []):
-                        score = species.get('score', 0)
-                        if score > max_score:
-                            max_score = score
-                            identified_name = species.get('species', {}).get('scientificNameWithoutAuthor', '')
-                        
-                        suggestions.append({
-                            'name': species.get('species', {}).get('scientificNameWithoutAuthor', ''),
-                            'common_names': [name.get('value', '') for name in species.get('species', {}).get('commonNames', [])],
-                            'confidence': score,
-                            'family': species.get('species', {}).get('family', {}).get('scientificNameWithoutAuthor', '')
-                        })
-                    
-                    return PlantIdentification(
-                        suggestions=suggestions,
-                        confidence=max_score,
-                        identified_name=identified_name
-                    )
+                    suggestions.append({
+                        'name': species.get('species', {}).get('scientificNameWithoutAuthor', ''),
+                        'common_names': [name.get('value', '') for name in species.get('species', {}).get('commonNames', [])],
+                        'confidence': score,
+                        'family': species.get('species', {}).get('family', {}).get('scientificNameWithoutAuthor', '')
+                    })
+                
+                return PlantIdentification(
+                    suggestions=suggestions,
+                    confidence=max_score,
+                    identified_name=identified_name
+                )
         except Exception as e:
             logging.error(f"Error identifying plant with PlantNet: {e}")
         
@@ -340,18 +372,40 @@ class PlantAPIService:
 
 
 # LLM Integration Service
+LLM_UNAVAILABLE_MESSAGE = "Извините, мой хороший, я сейчас не могу подключиться к своей базе знаний. Пожалуйста, убедитесь, что API-ключ настроен."
+LLM_CHAT_ERROR_MESSAGE = "Ой, дорогуша, что-то пошло не так. Я не смогла получить ответ. Попробуй спросить еще раз чуть позже."
+LLM_IMAGE_ERROR_MESSAGE = "Ах, не могу разглядеть картинку, милый. Что-то с моим зрением сегодня. Попробуй еще раз, пожалуйста."
+LLM_ERROR_MESSAGES = {LLM_UNAVAILABLE_MESSAGE, LLM_CHAT_ERROR_MESSAGE, LLM_IMAGE_ERROR_MESSAGE}
+
 class LLMService:
     def __init__(self):
+        self.chat_router = ModelRouter(
+            "chat", LLM_CHAT_MODELS, LLM_ROUTER_EWMA_ALPHA, LLM_CHAT_RACE_AFTER_SECONDS, LLM_MODEL_COOLDOWN_SECONDS,
+        )
+        self.vision_router = ModelRouter(
+            "vision", LLM_VISION_MODELS, LLM_ROUTER_EWMA_ALPHA, LLM_VISION_RACE_AFTER_SECONDS, LLM_MODEL_COOLDOWN_SECONDS,
+        )
         if not OPENROUTER_API_KEY:
             logger.error("OPENROUTER_API_KEY is not set.")
             self.client = None
             return
 
-        self.client = OpenAI(
-            base_url="https://openrouter.ai/api/v1",
+        # One shared connection pool for every LLM call; concurrency is bounded
+        # by the semaphore rather than by executor threads.
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+            ),
+            timeout=httpx.Timeout(LLM_CHAT_TIMEOUT_SECONDS, connect=LLM_CONNECT_TIMEOUT_SECONDS),
+        )
+        self.client = AsyncOpenAI(
+            base_url=OPENROUTER_BASE_URL,
             api_key=OPENROUTER_API_KEY,
+            http_client=self.http_client,
+            max_retries=LLM_MAX_RETRIES,
         )
-        self.model_name = "qwen/qwen2.5-vl-72b-instruct:free"
+        self.semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
         self.system_prompt = """
         Ты — Plauntie, мудрая, добрая и невероятно знающая тетушка, которая обожает растения и садоводство.
         У тебя теплый, заботливый и немного чудаковатый характер. Ты всегда говоришь мягким и ободряющим тоном.
@@ -363,34 +417,118 @@ class LLMService:
         Твои ответы должны быть лаконичными, но полными тепла и индивидуальности. Всегда говори по-русски.
         """
 
-    async def get_chat_response(self, user_message: str, enable_web_search: bool = False) -> str:
-        if not self.client:
-            return "Извините, мой хороший, я сейчас не могу подключиться к своей базе знаний. Пожалуйста, убедитесь, что API-ключ настроен."
+    async def create_completion(self, timeout: float, **kwargs):
+        """Run one chat completion. ``timeout`` covers waiting for a slot and the call itself."""
+        async def run():
+            async with self.semaphore:
+                started = time.monotonic()
+                completion = await self.client.chat.completions.create(timeout=timeout, **kwargs)
+                UPSTREAM_REQUEST_SECONDS.labels('openrouter').observe(time.monotonic() - started)
+                return completion
 
-        messages = [
+        try:
+            completion = await asyncio.wait_for(run(), timeout=timeout)
+        except Exception as e:
+            UPSTREAM_ERRORS.labels('openrouter', upstream_error_reason(e)).inc()
+            raise
+        record_llm_usage(kwargs['model'], completion.usage)
+        return completion
+
+    async def close(self):
+        if self.client:
+            await self.client.close()
+
+    def chat_messages(self, user_message: str, history: List[Dict[str, str]] = ()) -> List[Dict[str, Any]]:
+        """System prompt, then session history, then the new message; the prefix is byte-stable across turns."""
+        return [
             {"role": "system", "content": self.system_prompt},
+            *history,
             {"role": "user", "content": user_message},
         ]
 
-        model_to_use = self.model_name
+    @staticmethod
+    def chat_model(model: str, enable_web_search: bool = False) -> str:
+        model_to_use = model
         if enable_web_search:
             model_to_use += ":online"
+        return model_to_use
+
+    def stats(self) -> Dict[str, Any]:
+        return {"chat": self.chat_router.stats(), "vision": self.vision_router.stats()}
+
+    async def get_chat_response(self, user_message: str, enable_web_search: bool = False,
+                                history: List[Dict[str, str]] = ()) -> str:
+        if not self.client:
+            return LLM_UNAVAILABLE_MESSAGE
 
+        messages = self.chat_messages(user_message, history)
         try:
-            completion = await asyncio.to_thread(
-                self.client.chat.completions.create,
-                model=model_to_use,
+            completion = await self.chat_router.run(lambda model: self.create_completion(
+                timeout=LLM_CHAT_TIMEOUT_SECONDS,
+                model=self.chat_model(model, enable_web_search),
                 messages=messages,
-            )
+            ))
             response = completion.choices[0].message.content
             return response.strip()
         except Exception as e:
             logger.error(f"Error getting chat response from LLM: {e}")
-            return "Ой, дорогуша, что-то пошло не так. Я не смогла получить ответ. Попробуй спросить еще раз чуть позже."
+            return LLM_CHAT_ERROR_MESSAGE
+
+    async def stream_chat_response(self, user_message: str, enable_web_search: bool = False,
+                                   history: List[Dict[str, str]] = ()) -> AsyncIterator[str]:
+        """Yield the answer as text deltas as they arrive from OpenRouter.
+
+        Closing the generator (e.g. when the client disconnects) closes the
+        upstream stream and frees the concurrency slot. The stream is opened
+        on the best-ranked chat model and falls back to the next one while
+        no text has been sent yet; it is never raced.
+        """
+        if not self.client:
+            yield LLM_UNAVAILABLE_MESSAGE
+            return
+
+        messages = self.chat_messages(user_message, history)
+        candidates = self.chat_router.ranked()
+        async with self.semaphore:
+            started = time.monotonic()
+            try:
+                for index, base_model in enumerate(candidates):
+                    model = self.chat_model(base_model, enable_web_search)
+                    try:
+                        stream = await self.client.chat.completions.create(
+                            model=model,
+                            messages=messages,
+                            stream=True,
+                            stream_options={"include_usage": True},
+                            # Read timeout applies between chunks, not to the whole answer
+                            timeout=httpx.Timeout(LLM_CHAT_TIMEOUT_SECONDS, connect=LLM_CONNECT_TIMEOUT_SECONDS),
+                        )
+                    except Exception as e:
+                        if not llm_error_retryable(e):
+                            raise
+                        self.chat_router.record_failure(base_model, e)
+                        if index + 1 == len(candidates):
+                            raise
+                        UPSTREAM_ERRORS.labels('openrouter', upstream_error_reason(e)).inc()
+                        self.chat_router.counters["fallbacks"] += 1
+                        continue
+                    self.chat_router.record_success(base_model)
+                    break
+                async with stream:
+                    async for chunk in stream:
+                        if chunk.usage:
+                            record_llm_usage(model, chunk.usage)
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            yield chunk.choices[0].delta.content
+            except Exception as e:
+                UPSTREAM_ERRORS.labels('openrouter', upstream_error_reason(e)).inc()
+                raise
+            finally:
+                UPSTREAM_REQUEST_SECONDS.labels('openrouter').observe(time.monotonic() - started)
 
     async def get_image_analysis(self, image_data: bytes, prompt: str) -> str:
         if not self.client:
-            return "Извините, мой хороший, я сейчас не могу подключиться к своей базе знаний. Пожалуйста, убедитесь, что API-ключ настроен."
+            return LLM_UNAVAILABLE_MESSAGE
 
         base64_image = base64.b64encode(image_data).decode('utf-8')
 
@@ -411,70 +549,187 @@ class LLMService:
         ]
 
         try:
-            completion = await asyncio.to_thread(
-                self.client.chat.completions.create,
-                model=self.model_name, # No online mode for this one, as it's for direct image analysis
+            completion = await self.vision_router.run(lambda model: self.create_completion(
+                timeout=LLM_IMAGE_TIMEOUT_SECONDS,
+                model=model, # No online mode for this one, as it's for direct image analysis
                 messages=messages,
                 max_tokens=1024,
-            )
+            ))
             response = completion.choices[0].message.content
             return response.strip()
         except Exception as e:
             logger.error(f"Error getting image analysis from LLM: {e}")
-            return "Ах, не могу разглядеть картинку, милый. Что-то с моим зрением сегодня. Попробуй еще раз, пожалуйста."
+            return LLM_IMAGE_ERROR_MESSAGE
+
+    async def summarize_history(self, summary: Optional[str], turns: List['ChatTurn']) -> Optional[str]:
+        """Fold ``turns`` into the running conversation ``summary``; None if the LLM is unavailable."""
+        if not self.client:
+            return None
+
+        parts = [f"Предыдущее краткое содержание: {summary}"] if summary else []
+        for turn in turns:
+            parts.append(f"Пользователь: {turn.user}\nPlauntie: {turn.assistant}")
+        messages = [
+            {"role": "system", "content": CHAT_SUMMARY_PROMPT},
+            {"role": "user", "content": "\n\n".join(parts)},
+        ]
+        try:
+            completion = await self.chat_router.run(lambda model: self.create_completion(
+                timeout=LLM_CHAT_TIMEOUT_SECONDS,
+                model=model,
+                messages=messages,
+                max_tokens=CHAT_SUMMARY_MAX_TOKENS,
+            ), interactive=False)
+            return completion.choices[0].message.content.strip() or None
+        except Exception as e:
+            logger.warning(f"Error summarizing chat history: {e}")
+            return None
 
 llm_service = LLMService()
 
 
-# Push Notification Service
-VAPID_CLAIMS = {
-    "sub": "mailto:admin@plauntie.com"
+chat_sessions = ChatSessionStore(
+    path=CHAT_SESSION_STORE_PATH,
+    max_sessions=CHAT_SESSION_MAX,
+    idle_ttl=CHAT_SESSION_IDLE_SECONDS,
+    token_budget=CHAT_HISTORY_TOKEN_BUDGET,
+    compact_ratio=CHAT_HISTORY_COMPACT_RATIO,
+    summarize=llm_service.summarize_history if CHAT_SUMMARY_ENABLED else None,
+)
+
+
+push_service = PushDeliveryService(workers=PUSH_WORKERS, queue_size=PUSH_QUEUE_MAX, get_database=lambda: db)
+
+
+REMINDER_ACTIONS = {
+    'watering': 'полить',
+    'fertilizing': 'удобрить',
+    'repotting': 'пересадить',
 }
 
-def send_push_notification(subscription_info: dict, message_body: str):
-    if not VAPID_PRIVATE_KEY:
-        logger.error("VAPID_PRIVATE_KEY not set. Cannot send push notification.")
-        return
 
-    try:
-        webpush(
-            subscription_info=subscription_info,
-            data=json.dumps({"body": message_body}),
-            vapid_private_key=VAPID_PRIVATE_KEY,
-            vapid_claims=VAPID_CLAIMS.copy()
-        )
-        logger.info("Push notification sent successfully.")
-    except WebPushException as ex:
-        logger.error(f"Error sending push notification: {ex}")
-        if ex.response and ex.response.status_code == 410:
-            logger.info("Subscription is expired or invalid, should be deleted.")
+def reminder_message(reminder: Reminder) -> str:
+    action = REMINDER_ACTIONS.get(reminder.reminder_type, REMINDER_ACTIONS['watering'])
+    return f"🌿 Напоминание от Plauntie! Пора {action} вашего друга '{reminder.plant_nickname}'."
 
 
-async def trigger_push_for_reminder(reminder: Reminder):
-    if not db:
+def reminder_digest_message(reminders: List[Reminder]) -> str:
+    """One notification for several reminders, e.g. "полить — 3, удобрить — 'Фикус'"."""
+    if len(reminders) == 1:
+        return reminder_message(reminders[0])
+    by_action: Dict[str, List[str]] = {}
+    for reminder in reminders:
+        action = REMINDER_ACTIONS.get(reminder.reminder_type, REMINDER_ACTIONS['watering'])
+        by_action.setdefault(action, []).append(reminder.plant_nickname)
+    parts = []
+    for action, nicknames in by_action.items():
+        if len(nicknames) <= 2:
+            parts.append(f"{action} — " + ", ".join(f"'{name}'" for name in nicknames))
+        else:
+            parts.append(f"{action} — {len(nicknames)}")
+    return f"🌿 Напоминание от Plauntie! Ваши друзья ждут заботы: {'; '.join(parts)}."
+
+
+async def trigger_push_for_reminders(reminders: List[Reminder], digest: bool = PUSH_DIGEST_ENABLED):
+    """Push a batch of reminders, fetching subscriptions once for all users in it.
+
+    With ``digest`` each user gets a single notification covering all of
+    their reminders in the batch; otherwise one per reminder.
+    """
+    if db is None or not reminders:
         return
 
-    logger.info(f"Triggering push for reminder {reminder.id} for user {reminder.user_id}")
-    subscriptions = await db.push_subscriptions.find({'user_id': reminder.user_id}).to_list(100)
+    by_user: Dict[str, List[Reminder]] = {}
+    for reminder in reminders:
+        by_user.setdefault(reminder.user_id, []).append(reminder)
 
-    for sub in subscriptions:
-        message = f"🌿 Напоминание от Plauntie! Пора полить вашего друга '{reminder.plant_nickname}'."
-        if reminder.reminder_type == 'fertilizing':
-            message = f"🌿 Напоминание от Plauntie! Пора удобрить вашего друга '{reminder.plant_nickname}'."
-        elif reminder.reminder_type == 'repotting':
-            message = f"🌿 Напоминание от Plauntie! Пора пересадить вашего друга '{reminder.plant_nickname}'."
+    subscriptions_by_user: Dict[str, List[Dict[str, Any]]] = {}
+    cursor = db.push_subscriptions.find(
+        {'user_id': {'$in': list(by_user)}}, {'_id': 0, 'user_id': 1, 'endpoint': 1, 'keys': 1}
+    )
+    async for sub in cursor:
+        subscriptions_by_user.setdefault(sub['user_id'], []).append(sub)
+
+    for user_id, user_reminders in by_user.items():
+        subscriptions = subscriptions_by_user.get(user_id, [])
+        if not subscriptions:
+            continue
+        logger.info(f"Triggering push for {len(user_reminders)} reminder(s) for user {user_id}")
+        messages = [reminder_digest_message(user_reminders)] if digest else [reminder_message(r) for r in user_reminders]
+        for message in messages:
+            for sub in subscriptions:
+                await push_service.enqueue(
+                    subscription_info={
+                        "endpoint": sub['endpoint'],
+                        "keys": sub['keys']
+                    },
+                    message_body=message
+                )
 
-        send_push_notification(
-            subscription_info={
-                "endpoint": sub['endpoint'],
-                "keys": sub['keys']
-            },
-            message_body=message
-        )
+
+reminder_scheduler = ReminderScheduler(
+    window=REMINDER_SCHEDULER_WINDOW_SECONDS,
+    poll_interval=REMINDER_SCHEDULER_POLL_SECONDS,
+    max_lateness=REMINDER_SCHEDULER_MAX_LATENESS_SECONDS,
+    batch_size=REMINDER_SCHEDULER_BATCH_SIZE,
+    get_database=lambda: db,
+    dispatch=trigger_push_for_reminders,
+)
+
+
+index_manager = IndexManager(REQUIRED_INDEXES)
 
 
 plant_service = PlantAPIService()
 
+identify_cache = ImageResultCache(
+    ttl=IMAGE_CACHE_TTL_SECONDS,
+    max_entries=IMAGE_CACHE_MAX_ENTRIES,
+    max_bytes=IMAGE_CACHE_MAX_BYTES,
+    max_distance=IMAGE_CACHE_MAX_DISTANCE,
+    should_cache=lambda result: (
+        result is not None and not result.partial and result.plauntie_description not in LLM_ERROR_MESSAGES
+    ),
+)
+diagnose_cache = ImageResultCache(
+    ttl=IMAGE_CACHE_TTL_SECONDS,
+    max_entries=IMAGE_CACHE_MAX_ENTRIES,
+    max_bytes=IMAGE_CACHE_MAX_BYTES,
+    max_distance=IMAGE_CACHE_MAX_DISTANCE,
+    should_cache=lambda result: result is not None and result.diagnosis_text not in LLM_ERROR_MESSAGES,
+)
+chat_cache = ChatAnswerCache(
+    ttl=CHAT_CACHE_TTL_SECONDS,
+    max_entries=CHAT_CACHE_MAX_ENTRIES,
+    max_bytes=CHAT_CACHE_MAX_BYTES,
+    max_question_chars=CHAT_CACHE_MAX_QUESTION_CHARS,
+    should_cache=lambda answer: bool(answer) and answer not in LLM_ERROR_MESSAGES,
+)
+
+
+def chat_cacheable(request: ChatRequest, history: List[Dict[str, str]]) -> bool:
+    """Only plain questions asked without prior context are cached.
+
+    Web-search answers depend on fresh results, and an answer given mid
+    conversation depends on what was said before.
+    """
+    return CHAT_CACHE_ENABLED and request.use_cache and not request.enable_web_search and not history
+
+
+async def chat_history(request: ChatRequest) -> List[Dict[str, str]]:
+    """History of the request's session; HTTP 404 for an unknown or expired ``session_id``."""
+    if not request.session_id:
+        return []
+    session = await chat_sessions.get(request.session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Chat session not found")
+    return session.history()
+
+
+async def remember_chat_turn(request: ChatRequest, answer: str):
+    if request.session_id and answer and answer not in LLM_ERROR_MESSAGES:
+        await chat_sessions.append(request.session_id, request.message, answer)
+
 # API Routes
 @api_router.get("/")
 async def root():
@@ -487,11 +742,106 @@ async def handle_chat(request: ChatRequest):
     if not request.message or not request.message.strip():
         raise HTTPException(status_code=400, detail="Message cannot be empty.")
 
-    response = await llm_service.get_chat_response(
-        user_message=request.message,
-        enable_web_search=request.enable_web_search
+    history = await chat_history(request)
+
+    async def compute():
+        return await llm_service.get_chat_response(
+            user_message=request.message,
+            enable_web_search=request.enable_web_search,
+            history=history,
+        )
+
+    if chat_cacheable(request, history):
+        response = await chat_cache.get_or_compute(request.message, compute)
+    else:
+        response = await compute()
+    await remember_chat_turn(request, response)
+    return {"response": response, "session_id": request.session_id}
+
+
+def sse_event(data: Dict[str, Any], event: Optional[str] = None) -> str:
+    payload = f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+    return f"event: {event}\n{payload}" if event else payload
+
+
+@api_router.post("/chat/stream")
+async def handle_chat_stream(chat_request: ChatRequest, request: Request):
+    """Stream the LLM answer as Server-Sent Events.
+
+    Each text delta is sent as ``data: {"delta": ...}``, followed by a final
+    ``event: done``. Failures are reported as ``event: error``. A cached
+    answer arrives as a single delta.
+    """
+    if not chat_request.message or not chat_request.message.strip():
+        raise HTTPException(status_code=400, detail="Message cannot be empty.")
+
+    history = await chat_history(chat_request)
+    use_cache = chat_cacheable(chat_request, history)
+    cached = chat_cache.lookup(chat_request.message) if use_cache else None
+
+    async def events():
+        if cached is not None:
+            await remember_chat_turn(chat_request, cached)
+            yield sse_event({"delta": cached})
+            yield sse_event({}, event="done")
+            return
+
+        deltas = llm_service.stream_chat_response(
+            user_message=chat_request.message,
+            enable_web_search=chat_request.enable_web_search,
+            history=history,
+        )
+        parts = []
+        try:
+            async for delta in deltas:
+                if await request.is_disconnected():
+                    logger.info("Chat stream client disconnected, cancelling upstream.")
+                    return
+                parts.append(delta)
+                yield sse_event({"delta": delta})
+            answer = "".join(parts).strip()
+            if use_cache:
+                chat_cache.store(chat_request.message, answer)
+            await remember_chat_turn(chat_request, answer)
+            yield sse_event({}, event="done")
+        except Exception as e:
+            logger.error(f"Error streaming chat response from LLM: {e}")
+            yield sse_event({"message": LLM_CHAT_ERROR_MESSAGE}, event="error")
+        finally:
+            await deltas.aclose()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
-    return {"response": response}
+
+
+@api_router.post("/chat/sessions")
+async def create_chat_session():
+    """Start a conversation; pass the returned ``session_id`` with each chat message."""
+    session = await chat_sessions.create()
+    return {"session_id": session.id}
+
+
+@api_router.get("/chat/sessions/{session_id}")
+async def get_chat_session(session_id: str):
+    session = await chat_sessions.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Chat session not found")
+    return {
+        "session_id": session.id,
+        "summary": session.summary,
+        "turns": [{"user": turn.user, "assistant": turn.assistant} for turn in session.turns],
+        "history_tokens": session.tokens,
+    }
+
+
+@api_router.delete("/chat/sessions/{session_id}")
+async def delete_chat_session(session_id: str):
+    if not await chat_sessions.delete(session_id):
+        raise HTTPException(status_code=404, detail="Chat session not found")
+    return {"message": "Chat session deleted"}
 
 
 @api_router.post("/subscribe")
@@ -512,6 +862,32 @@ async def subscribe_for_pushes(subscription: PushSubscription):
         raise HTTPException(status_code=500, detail="Could not save subscription.")
 
 
+@api_router.get("/push/stats")
+async def get_push_stats():
+    """Push delivery counters, queue depth and recent throughput."""
+    return push_service.stats()
+
+
+@api_router.get("/providers/quota")
+async def get_provider_quota():
+    """Remaining per-minute and per-day quota and queue depth per provider."""
+    return {
+        "perenual": plant_service.perenual.quota.stats(),
+        "plantnet": plant_service.plantnet.quota.stats(),
+    }
+
+
+@api_router.get("/providers/stats")
+async def get_provider_stats():
+    """Upstream request counters, circuit breaker state and current hedge delay per provider,
+    plus LLM model routing health."""
+    return {
+        "perenual": plant_service.perenual.stats(),
+        "plantnet": plant_service.plantnet.stats(),
+        "openrouter": llm_service.stats(),
+    }
+
+
 @api_router.get("/vapid-public-key")
 async def get_vapid_public_key():
     if not VAPID_PUBLIC_KEY:
@@ -525,7 +901,7 @@ async def search_plants(q: str):
     if not q or len(q) < 2:
         raise HTTPException(status_code=400, detail="Query must be at least 2 characters long")
     
-    results = await plant_service.search_plants_perenual(q)
+    results = await plant_service.search_plants(q)
     return results
 
 @api_router.get("/plants/{plant_id}/care", response_model=PlantCareInfo)
@@ -561,71 +937,148 @@ async def get_plant_care_info(plant_id: str):
     
     return care_info
 
-@api_router.post("/plants/identify", response_model=EnhancedPlantIdentification)
-async def identify_plant(file: UploadFile = File(...)):
-    """Identify a plant from an uploaded image using both PlantNet and LLM."""
-    if not file.content_type.startswith('image/'):
-        raise HTTPException(status_code=400, detail="File must be an image")
-    
-    image_data = await file.read()
-    
-    try:
-        image = Image.open(io.BytesIO(image_data))
-        if image.format != 'JPEG':
-            output = io.BytesIO()
-            image.convert('RGB').save(output, format='JPEG', quality=85)
-            image_data = output.getvalue()
-    except Exception as e:
-        raise HTTPException(status_code=400, detail="Invalid image file")
-    
-    plantnet_identification = await plant_service.identify_plant_plantnet(image_data)
+IDENTIFY_PROMPT_GENERIC = "Тетушка, помоги, пожалуйста, определить, что это за растение на фото, и расскажи немного о нем и об уходе."
 
-    llm_prompt = ""
-    if plantnet_identification.identified_name:
-        llm_prompt = f"Тетушка, взгляни на это фото. Мне кажется, это {plantnet_identification.identified_name}. Можешь подтвердить и рассказать об этом растении что-нибудь интересное? Как за ним лучше ухаживать?"
-    else:
-        llm_prompt = "Тетушка, помоги, пожалуйста, определить, что это за растение на фото, и расскажи немного о нем и об уходе."
 
-    plauntie_description = await llm_service.get_image_analysis(image_data, llm_prompt)
+def identify_prompt_for(identified_name: str) -> str:
+    return f"Тетушка, взгляни на это фото. Мне кажется, это {identified_name}. Можешь подтвердить и рассказать об этом растении что-нибудь интересное? Как за ним лучше ухаживать?"
+
+
+def task_result(task: asyncio.Task, default=None):
+    if task.done() and not task.cancelled() and task.exception() is None:
+        return task.result()
+    return default
+
 
+async def run_identification_pipeline(plantnet_images: List[Tuple[bytes, str]], llm_image: bytes,
+                                      photo_note: str = "") -> EnhancedPlantIdentification:
+    """Identify with PlantNet and describe with the vision LLM under per-stage deadlines.
+
+    The LLM request is held until PlantNet answers or
+    IDENTIFY_ENRICH_DEADLINE_SECONDS pass, then sent once: with the plant's
+    name in the prompt if PlantNet named it, with the generic prompt
+    otherwise. A slow PlantNet keeps running alongside the LLM until its own
+    deadline. Whichever side misses its deadline is dropped and the response
+    is marked ``partial``. ``photo_note`` is put in front of the LLM prompt
+    (e.g. to explain a collage).
+    """
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+
+    def with_note(prompt: str) -> str:
+        return f"{photo_note} {prompt}" if photo_note else prompt
+
+    plantnet_task = asyncio.create_task(plant_service.identify_plant_plantnet(plantnet_images))
+    llm_task: Optional[asyncio.Task] = None
+    try:
+        await asyncio.wait({plantnet_task}, timeout=IDENTIFY_ENRICH_DEADLINE_SECONDS)
+        early = task_result(plantnet_task)
+        prompt = identify_prompt_for(early.identified_name) if early and early.identified_name else IDENTIFY_PROMPT_GENERIC
+        llm_task = asyncio.create_task(llm_service.get_image_analysis(llm_image, with_note(prompt)))
+
+        await asyncio.wait({llm_task}, timeout=IDENTIFY_LLM_TIMEOUT_SECONDS)
+        await asyncio.wait({plantnet_task}, timeout=max(0, started + IDENTIFY_PLANTNET_TIMEOUT_SECONDS - loop.time()))
+    finally:
+        for task in (plantnet_task, llm_task):
+            if task is not None and not task.done():
+                task.cancel()
+
+    plantnet_identification = task_result(plantnet_task)
+    plauntie_description = task_result(llm_task) if llm_task is not None else None
+    if plantnet_identification is None:
+        logger.warning("PlantNet missed the identification deadline, returning LLM-only result.")
+    if plauntie_description is None:
+        logger.warning("LLM missed the identification deadline, returning PlantNet-only result.")
+
+    partial = plantnet_identification is None or plauntie_description is None
+    plantnet_identification = plantnet_identification or PlantIdentification()
     return EnhancedPlantIdentification(
         suggestions=plantnet_identification.suggestions,
         confidence=plantnet_identification.confidence,
         identified_name=plantnet_identification.identified_name,
-        plauntie_description=plauntie_description
+        plauntie_description=plauntie_description,
+        partial=partial,
     )
 
 
+@api_router.post("/plants/identify", response_model=EnhancedPlantIdentification)
+async def identify_plant(file: UploadFile = File(...)):
+    """Identify a plant from an uploaded image using both PlantNet and LLM."""
+    if not file.content_type.startswith('image/'):
+        raise HTTPException(status_code=400, detail="File must be an image")
+
+    prepared = await prepare_upload(file)
+
+    async def compute():
+        return await run_identification_pipeline([(prepared.variants['plantnet'], 'auto')], prepared.variants['llm'])
+
+    return await identify_cache.get_or_compute(prepared, compute)
+
+
+PLANTNET_ORGANS = ('auto', 'leaf', 'flower', 'fruit', 'bark', 'habit', 'other')
+ORGAN_NAMES_RU = {'leaf': 'лист', 'flower': 'цветок', 'fruit': 'плод', 'bark': 'кора', 'habit': 'растение целиком'}
+
+
+def collage_note(organs: List[str]) -> str:
+    note = f"На коллаже {len(organs)} фото одного и того же растения"
+    named = [ORGAN_NAMES_RU[organ] for organ in organs if organ in ORGAN_NAMES_RU]
+    if named:
+        note += f" ({', '.join(dict.fromkeys(named))})"
+    return note + "."
+
+
+@api_router.post("/plants/identify/multi", response_model=EnhancedPlantIdentification)
+async def identify_plant_multi(
+    files: List[UploadFile] = File(...),
+    organs: List[str] = Form([]),
+):
+    """Identify a plant from several photos of it (leaf, flower, fruit, bark...).
+
+    ``organs`` tags each file in order (missing tags default to ``auto``).
+    All photos go to PlantNet in one request; the LLM sees them as one collage.
+    """
+    if not 1 <= len(files) <= IDENTIFY_MAX_IMAGES:
+        raise HTTPException(status_code=400, detail=f"Send between 1 and {IDENTIFY_MAX_IMAGES} images")
+    organs = list(organs)
+    if len(organs) > len(files):
+        raise HTTPException(status_code=400, detail="More organs than images")
+    organs += ['auto'] * (len(files) - len(organs))
+    invalid = [organ for organ in organs if organ not in PLANTNET_ORGANS]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Unknown organ {invalid[0]!r}; use one of {', '.join(PLANTNET_ORGANS)}")
+    if any(not (file.content_type or '').startswith('image/') for file in files):
+        raise HTTPException(status_code=400, detail="Files must be images")
+
+    prepared = await prepare_uploads(files)
+
+    async def compute():
+        collage = await prepare_collage([image.variants['llm'] for image in prepared])
+        plantnet_images = [(image.variants['plantnet'], organ) for image, organ in zip(prepared, organs)]
+        note = collage_note(organs) if len(prepared) > 1 else ""
+        return await run_identification_pipeline(plantnet_images, collage, photo_note=note)
+
+    return await identify_cache.get_or_compute_group(prepared, organs, compute)
+
+
 @api_router.post("/plants/diagnose", response_model=DiagnosisResponse)
 async def diagnose_plant(file: UploadFile = File(...)):
     """Diagnose a plant's health from an image using the LLM."""
     if not file.content_type.startswith('image/'):
         raise HTTPException(status_code=400, detail="File must be an image.")
 
-    image_data = await file.read()
-
-    try:
-        image = Image.open(io.BytesIO(image_data))
-        if image.format != 'JPEG':
-            output = io.BytesIO()
-            image.convert('RGB').save(output, format='JPEG', quality=85)
-            image_data = output.getvalue()
-    except Exception as e:
-        raise HTTPException(status_code=400, detail="Invalid image file")
+    prepared = await prepare_upload(file)
 
     prompt = "Тетушка, посмотри на мой цветочек. Мне кажется, он заболел. Что с ним не так и как его вылечить? Дай подробный и заботливый ответ."
 
-    diagnosis_text = await llm_service.get_image_analysis(image_data, prompt)
+    async def compute():
+        diagnosis_text = await llm_service.get_image_analysis(prepared.variants['llm'], prompt)
+        return DiagnosisResponse(diagnosis_text=diagnosis_text)
 
-    return DiagnosisResponse(diagnosis_text=diagnosis_text)
+    return await diagnose_cache.get_or_compute(prepared, compute)
 
 
-@api_router.post("/user/{user_id}/plants", response_model=UserPlant)
-async def add_user_plant(user_id: str, plant_data: dict):
-    """Add a plant to user's collection"""
-    if not db:
-        raise HTTPException(status_code=503, detail="Database not available")
-    user_plant = UserPlant(
+def user_plant_from_data(user_id: str, plant_data: Dict[str, Any]) -> UserPlant:
+    return UserPlant(
         user_id=user_id,
         plant_id=plant_data.get('plant_id', ''),
         nickname=plant_data.get('nickname', ''),
@@ -636,143 +1089,509 @@ async def add_user_plant(user_id: str, plant_data: dict):
         notes=plant_data.get('notes', ''),
         image_url=plant_data.get('image_url', '')
     )
+
+@api_router.post("/user/{user_id}/plants", response_model=UserPlant)
+async def add_user_plant(user_id: str, plant_data: dict):
+    """Add a plant to user's collection"""
+    if db is None:
+        raise HTTPException(status_code=503, detail="Database not available")
+    user_plant = user_plant_from_data(user_id, plant_data)
     
-    await db.user_plants.insert_one(user_plant.dict())
+    await db.user_plants.insert_one(user_plant.model_dump())
     
     # Create initial reminders
     await create_reminders_for_plant(user_plant)
     
     return user_plant
 
-@api_router.get("/user/{user_id}/plants", response_model=List[UserPlant])
-async def get_user_plants(user_id: str):
-    """Get all plants in user's collection"""
-    if not db:
+@api_router.post("/user/{user_id}/plants/bulk", response_model=BulkPlantsResponse)
+async def add_user_plants_bulk(user_id: str, request: BulkPlantsRequest):
+    """Add many plants at once (collection import).
+
+    All plants go out in one ``insert_many`` and all of their initial
+    reminders in a second one, both unordered. Items that fail validation or
+    insertion are reported per item and don't stop the rest; a plant whose
+    reminders failed is returned with ``ok=False`` and the stored plant.
+    """
+    if db is None:
         raise HTTPException(status_code=503, detail="Database not available")
-    plants = await db.user_plants.find({"user_id": user_id}).to_list(1000)
-    return [UserPlant(**plant) for plant in plants]
 
-@api_router.get("/user/{user_id}/reminders", response_model=List[Reminder])
-async def get_user_reminders(user_id: str):
-    """Get pending reminders for user"""
-    if not db:
+    results: List[BulkPlantResult] = []
+    valid: List[Tuple[int, UserPlant]] = []
+    for index, plant_data in enumerate(request.plants):
+        try:
+            valid.append((index, user_plant_from_data(user_id, plant_data)))
+        except ValueError as e:
+            results.append(BulkPlantResult(index=index, ok=False, error=str(e)))
+
+    failed_writes: Dict[int, str] = {}
+    if valid:
+        try:
+            await db.user_plants.insert_many([plant.model_dump() for _, plant in valid], ordered=False)
+        except BulkWriteError as e:
+            failed_writes = {error['index']: error.get('errmsg', 'Insert failed')
+                             for error in e.details.get('writeErrors', [])}
+
+    inserted: List[Tuple[int, UserPlant]] = []
+    for position, (index, plant) in enumerate(valid):
+        if position in failed_writes:
+            results.append(BulkPlantResult(index=index, ok=False, error=failed_writes[position]))
+        else:
+            inserted.append((index, plant))
+
+    now = datetime.utcnow()
+    reminders = [(index, reminder) for index, plant in inserted for reminder in initial_reminders(plant, now)]
+    failed_reminders: Dict[int, str] = {}
+    if reminders:
+        write_errors = []
+        try:
+            await db.reminders.insert_many([reminder.model_dump() for _, reminder in reminders], ordered=False)
+        except BulkWriteError as e:
+            write_errors = e.details.get('writeErrors', [])
+        for error in write_errors:
+            failed_reminders.setdefault(reminders[error['index']][0], error.get('errmsg', 'Insert failed'))
+        unwritten = {error['index'] for error in write_errors}
+        for position, (_, reminder) in enumerate(reminders):
+            if position not in unwritten:
+                reminder_scheduler.schedule(reminder)
+
+    for index, plant in inserted:
+        if index in failed_reminders:
+            # The plant is stored; return it so a retry doesn't add it twice
+            results.append(BulkPlantResult(index=index, ok=False, plant=plant,
+                                           error=f"Plant added but its reminders were not: {failed_reminders[index]}"))
+        else:
+            results.append(BulkPlantResult(index=index, ok=True, plant=plant))
+
+    results.sort(key=lambda result: result.index)
+    succeeded = sum(result.ok for result in results)
+    return BulkPlantsResponse(results=results, succeeded=succeeded, failed=len(results) - succeeded)
+
+# Keyset pagination helpers for user listings
+PLANT_SORT_KEYS = ("date_added", "id")
+REMINDER_SORT_KEYS = ("due_date", "id")
+LIST_PAGE_RESPONSES = {200: {"headers": {"X-Next-Cursor": {
+    "description": "Cursor for the next page; absent on the last page", "schema": {"type": "string"},
+}}}}
+
+
+def json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def encode_cursor(document: Dict[str, Any], sort_keys: Tuple[str, ...]) -> str:
+    """Opaque cursor pointing just after ``document`` in ``sort_keys`` order."""
+    values = [document.get(key) for key in sort_keys]
+    raw = json.dumps(values, default=json_default).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_keys: Tuple[str, ...]) -> List[Any]:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(sort_keys):
+            raise ValueError("wrong cursor length")
+        # Date sort keys travel as ISO strings
+        return [datetime.fromisoformat(v) if key in ("date_added", "due_date") and v else v
+                for key, v in zip(sort_keys, values)]
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def keyset_filter(base: Dict[str, Any], sort_keys: Tuple[str, ...], values: List[Any]) -> Dict[str, Any]:
+    """``base`` restricted to documents strictly after ``values`` in ``sort_keys`` order."""
+    branches = []
+    for i, key in enumerate(sort_keys):
+        branch = {k: v for k, v in zip(sort_keys[:i], values[:i])}
+        branch[key] = {"$gt": values[i]}
+        branches.append(branch)
+    return {**base, "$or": branches}
+
+
+def list_projection(fields: Optional[str], model, sort_keys: Tuple[str, ...]) -> Dict[str, Any]:
+    """Mongo projection for a comma-separated ``fields`` list (always keeps the sort keys).
+
+    Without ``fields`` every field of ``model`` is returned, and nothing
+    else: documents also carry internal fields (``notify_claim``,
+    ``completion_id``) that must not reach clients.
+    """
+    if not fields:
+        return {"_id": 0, **{field: 1 for field in model.model_fields}}
+    requested = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = requested - set(model.model_fields)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    return {"_id": 0, **{field: 1 for field in requested | set(sort_keys)}}
+
+
+async def list_page(collection, query: Dict[str, Any], sort_keys: Tuple[str, ...], projection: Dict[str, Any],
+                    limit: int, cursor: Optional[str]) -> JSONResponse:
+    """One keyset page as a JSON list; ``X-Next-Cursor`` is set when more documents follow.
+
+    Documents are serialized straight from Mongo without a model round trip,
+    so ``projection`` (from ``list_projection``) is what keeps the output to
+    the documented fields; the route's ``response_model`` only describes it.
+    """
+    if cursor:
+        query = keyset_filter(query, sort_keys, decode_cursor(cursor, sort_keys))
+    documents = await collection.find(query, projection).sort(
+        [(key, ASCENDING) for key in sort_keys]
+    ).limit(limit + 1).to_list(limit + 1)
+
+    headers = {}
+    if len(documents) > limit:
+        documents = documents[:limit]
+        headers["X-Next-Cursor"] = encode_cursor(documents[-1], sort_keys)
+    body = json.dumps(documents, default=json_default, ensure_ascii=False)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def export_stream(collection, query: Dict[str, Any], sort_keys: Tuple[str, ...],
+                  projection: Dict[str, Any]) -> StreamingResponse:
+    """Stream every matching document as one JSON array, holding only one cursor batch in memory."""
+    async def body():
+        yield "["
+        first = True
+        cursor = collection.find(query, projection).sort(
+            [(key, ASCENDING) for key in sort_keys]
+        ).batch_size(EXPORT_BATCH_SIZE)
+        async for document in cursor:
+            yield ("" if first else ",") + json.dumps(document, default=json_default, ensure_ascii=False)
+            first = False
+        yield "]"
+
+    return StreamingResponse(body(), media_type="application/json")
+
+
+@api_router.get("/user/{user_id}/plants", response_model=List[UserPlantFields], responses=LIST_PAGE_RESPONSES)
+async def get_user_plants(
+    user_id: str,
+    limit: int = Query(LIST_PAGE_MAX, ge=1, le=LIST_PAGE_MAX),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. id,nickname,plant_name"),
+):
+    """Get plants in user's collection, oldest first.
+
+    Pages are keyset-paginated: pass the ``X-Next-Cursor`` response header
+    back as ``cursor`` to get the next page.
+    """
+    if db is None:
+        raise HTTPException(status_code=503, detail="Database not available")
+    projection = list_projection(fields, UserPlant, PLANT_SORT_KEYS)
+    return await list_page(db.user_plants, {"user_id": user_id}, PLANT_SORT_KEYS, projection, limit, cursor)
+
+@api_router.get("/user/{user_id}/plants/export", response_model=List[UserPlantFields])
+async def export_user_plants(user_id: str, fields: Optional[str] = None):
+    """Stream the user's whole plant collection as a JSON array"""
+    if db is None:
+        raise HTTPException(status_code=503, detail="Database not available")
+    projection = list_projection(fields, UserPlant, PLANT_SORT_KEYS)
+    return export_stream(db.user_plants, {"user_id": user_id}, PLANT_SORT_KEYS, projection)
+
+@api_router.get("/user/{user_id}/reminders", response_model=List[ReminderFields], responses=LIST_PAGE_RESPONSES)
+async def get_user_reminders(
+    user_id: str,
+    limit: int = Query(LIST_PAGE_MAX, ge=1, le=LIST_PAGE_MAX),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
+):
+    """Get pending reminders for user, soonest first (keyset-paginated like the plant list)"""
+    if db is None:
         raise HTTPException(status_code=503, detail="Database not available")
-    reminders = await db.reminders.find({
+    query = {
         "user_id": user_id,
         "completed": False,
         "due_date": {"$lte": datetime.utcnow() + timedelta(days=7)}
-    }).to_list(1000)
-    
-    return [Reminder(**reminder) for reminder in reminders]
+    }
+    projection = list_projection(fields, Reminder, REMINDER_SORT_KEYS)
+    return await list_page(db.reminders, query, REMINDER_SORT_KEYS, projection, limit, cursor)
+
+@api_router.get("/user/{user_id}/reminders/export", response_model=List[ReminderFields])
+async def export_user_reminders(user_id: str, fields: Optional[str] = None):
+    """Stream all of the user's reminders, including completed ones, as a JSON array"""
+    if db is None:
+        raise HTTPException(status_code=503, detail="Database not available")
+    projection = list_projection(fields, Reminder, REMINDER_SORT_KEYS)
+    return export_stream(db.reminders, {"user_id": user_id}, REMINDER_SORT_KEYS, projection)
+
+CARE_DATE_FIELDS = {
+    'watering': 'last_watered',
+    'fertilizing': 'last_fertilized',
+    'repotting': 'last_repotted',
+}
+RECURRING_REMINDER_TYPES = ('watering', 'fertilizing')
+
 
 @api_router.post("/user/{user_id}/reminders/{reminder_id}/complete")
 async def complete_reminder(user_id: str, reminder_id: str):
     """Mark a reminder as completed"""
-    if not db:
+    if db is None:
         raise HTTPException(status_code=503, detail="Database not available")
-    result = await db.reminders.update_one(
-        {"id": reminder_id, "user_id": user_id},
-        {"$set": {"completed": True}}
-    )
-    
-    if result.modified_count == 0:
-        raise HTTPException(status_code=404, detail="Reminder not found")
-    
-    # Update the corresponding plant care dates
-    reminder = await db.reminders.find_one({"id": reminder_id})
-    if reminder:
-        update_field = {}
-        now = datetime.utcnow()
-        
-        if reminder['reminder_type'] == 'watering':
-            update_field['last_watered'] = now
-        elif reminder['reminder_type'] == 'fertilizing':
-            update_field['last_fertilized'] = now
-        elif reminder['reminder_type'] == 'repotting':
-            update_field['last_repotted'] = now
-        
-        if update_field:
-            await db.user_plants.update_one(
-                {"id": reminder['plant_id']},
-                {"$set": update_field}
-            )
-        
-        # Create next reminder
-        plant = await db.user_plants.find_one({"id": reminder['plant_id']})
-        if plant:
-            user_plant = UserPlant(**plant)
-            await create_next_reminder(user_plant, reminder['reminder_type'])
-    
+
+    if COMPLETE_REMINDER_USE_TRANSACTION:
+        async with await db.client.start_session() as session:
+            async with session.start_transaction():
+                next_reminder = await apply_reminder_completion(user_id, reminder_id, session)
+    else:
+        next_reminder = await apply_reminder_completion(user_id, reminder_id)
+
+    reminder_scheduler.discard(reminder_id)
+    if next_reminder:
+        reminder_scheduler.schedule(next_reminder)
     return {"message": "Reminder completed successfully"}
 
-async def create_reminders_for_plant(user_plant: UserPlant):
-    """Create initial reminders for a new plant"""
-    if not db:
-        return
-    now = datetime.utcnow()
-    
-    # Watering reminder
-    watering_reminder = Reminder(
-        user_id=user_plant.user_id,
-        plant_id=user_plant.id,
-        plant_nickname=user_plant.nickname,
-        reminder_type="watering",
-        due_date=now + timedelta(days=user_plant.watering_frequency_days)
-    )
-    
-    # Fertilizing reminder
-    fertilizing_reminder = Reminder(
-        user_id=user_plant.user_id,
-        plant_id=user_plant.id,
-        plant_nickname=user_plant.nickname,
-        reminder_type="fertilizing",
-        due_date=now + timedelta(days=user_plant.fertilizing_frequency_days)
+
+@api_router.post("/user/{user_id}/reminders/bulk-complete", response_model=BulkCompleteResponse)
+async def bulk_complete_reminders(user_id: str, request: BulkCompleteRequest):
+    """Complete many reminders at once, e.g. for "water everything".
+
+    Uses a fixed number of database round trips whatever the batch size;
+    ids that are unknown, already completed or repeated in the request are
+    reported per item.
+    """
+    if db is None:
+        raise HTTPException(status_code=503, detail="Database not available")
+
+    reminder_ids = list(dict.fromkeys(request.reminder_ids))
+    if COMPLETE_REMINDER_USE_TRANSACTION:
+        async with await db.client.start_session() as session:
+            async with session.start_transaction():
+                successors = await apply_bulk_completion(user_id, reminder_ids, session)
+    else:
+        successors = await apply_bulk_completion(user_id, reminder_ids)
+
+    results = []
+    seen = set()
+    for reminder_id in request.reminder_ids:
+        if reminder_id in seen:
+            results.append(BulkReminderResult(reminder_id=reminder_id, ok=False, error="Duplicate reminder id"))
+            continue
+        seen.add(reminder_id)
+        if reminder_id not in successors:
+            results.append(BulkReminderResult(reminder_id=reminder_id, ok=False, error="Reminder not found"))
+            continue
+        next_reminder = successors[reminder_id]
+        reminder_scheduler.discard(reminder_id)
+        if next_reminder:
+            reminder_scheduler.schedule(next_reminder)
+        results.append(BulkReminderResult(
+            reminder_id=reminder_id, ok=True, next_reminder_id=next_reminder.id if next_reminder else None
+        ))
+    succeeded = sum(result.ok for result in results)
+    return BulkCompleteResponse(results=results, succeeded=succeeded, failed=len(results) - succeeded)
+
+
+def successor_reminder(reminder: Dict[str, Any], now: datetime,
+                       user_plant: Optional[UserPlant] = None) -> Optional[Reminder]:
+    """Next reminder after ``reminder`` is completed, or None for one-off types.
+
+    Reminders without a stored ``frequency_days`` need the plant to know
+    their interval.
+    """
+    reminder_type = reminder['reminder_type']
+    if reminder_type not in RECURRING_REMINDER_TYPES:
+        return None
+    frequency_days = reminder.get('frequency_days')
+    if frequency_days is None:
+        return build_next_reminder(user_plant, reminder_type, now) if user_plant else None
+    return Reminder(
+        user_id=reminder['user_id'],
+        plant_id=reminder['plant_id'],
+        plant_nickname=reminder['plant_nickname'],
+        reminder_type=reminder_type,
+        due_date=now + timedelta(days=frequency_days),
+        frequency_days=frequency_days,
     )
-    
-    await db.reminders.insert_many([
-        watering_reminder.dict(),
-        fertilizing_reminder.dict()
-    ])
 
-    # Send pushes for the new reminders
-    await trigger_push_for_reminder(watering_reminder)
-    await trigger_push_for_reminder(fertilizing_reminder)
 
-async def create_next_reminder(user_plant: UserPlant, reminder_type: str):
-    """Create the next reminder for a plant"""
-    if not db:
+async def run_writes(writes: List[Any], session=None):
+    """Await independent writes concurrently, or in order when they share a session."""
+    if session is None:
+        await asyncio.gather(*writes)
         return
+    # Operations in one session must not overlap
+    for write in writes:
+        await write
+
+
+async def apply_reminder_completion(user_id: str, reminder_id: str, session=None) -> Optional[Reminder]:
+    """Complete a reminder, stamp the plant's care date and insert the next reminder.
+
+    Costs two round trips: ``find_one_and_update`` on the reminder, then the
+    plant update and the next-reminder insert together (concurrently, or one
+    after the other inside a transaction). Reminders created before
+    ``frequency_days`` was stored need the plant document first, which is
+    read back from the same ``find_one_and_update`` that stamps it.
+    """
+    reminder = await db.reminders.find_one_and_update(
+        {"id": reminder_id, "user_id": user_id, "completed": False},
+        {"$set": {"completed": True}},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER,
+        session=session,
+    )
+    if not reminder:
+        raise HTTPException(status_code=404, detail="Reminder not found")
+
     now = datetime.utcnow()
-    
+    update_field = CARE_DATE_FIELDS.get(reminder['reminder_type'])
+
+    if reminder.get('frequency_days') is None:
+        if not update_field:
+            return None
+        plant = await db.user_plants.find_one_and_update(
+            {"id": reminder['plant_id']},
+            {"$set": {update_field: now}},
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER,
+            session=session,
+        )
+        next_reminder = successor_reminder(reminder, now, UserPlant(**plant) if plant else None)
+        if next_reminder:
+            await db.reminders.insert_one(next_reminder.model_dump(), session=session)
+        return next_reminder
+
+    next_reminder = successor_reminder(reminder, now)
+    writes = []
+    if update_field:
+        writes.append(db.user_plants.update_one(
+            {"id": reminder['plant_id']}, {"$set": {update_field: now}}, session=session
+        ))
+    if next_reminder:
+        writes.append(db.reminders.insert_one(next_reminder.model_dump(), session=session))
+    await run_writes(writes, session)
+    return next_reminder
+
+
+async def apply_bulk_completion(user_id: str, reminder_ids: List[str],
+                                session=None) -> Dict[str, Optional[Reminder]]:
+    """Complete the user's pending reminders among ``reminder_ids``.
+
+    Returns the successor (or None) of every reminder this call completed.
+    Reminders are claimed with a per-call ``completion_id`` so that a
+    concurrent completion of the same reminder can't create a second
+    successor. The plant care dates and the successor inserts then go out
+    as one ``bulk_write`` per collection; the same ``bulk_write`` on
+    reminders clears the claim token.
+    """
+    ids = list(dict.fromkeys(reminder_ids))
+    if not ids:
+        return {}
+    token = str(uuid.uuid4())
+    await db.reminders.update_many(
+        {"id": {"$in": ids}, "user_id": user_id, "completed": False},
+        {"$set": {"completed": True, "completion_id": token}},
+        session=session,
+    )
+    claimed = await db.reminders.find(
+        {"id": {"$in": ids}, "completion_id": token}, {"_id": 0, "completion_id": 0}, session=session
+    ).to_list(None)
+    if not claimed:
+        return {}
+
+    now = datetime.utcnow()
+    legacy_plant_ids = {
+        r['plant_id'] for r in claimed
+        if r.get('frequency_days') is None and r['reminder_type'] in RECURRING_REMINDER_TYPES
+    }
+    plants: Dict[str, UserPlant] = {}
+    if legacy_plant_ids:
+        documents = await db.user_plants.find(
+            {"id": {"$in": list(legacy_plant_ids)}}, {"_id": 0}, session=session
+        ).to_list(None)
+        plants = {document['id']: UserPlant(**document) for document in documents}
+
+    care_dates: Dict[str, Dict[str, datetime]] = {}
+    successors: Dict[str, Optional[Reminder]] = {}
+    for reminder in claimed:
+        update_field = CARE_DATE_FIELDS.get(reminder['reminder_type'])
+        if update_field:
+            care_dates.setdefault(reminder['plant_id'], {})[update_field] = now
+        successors[reminder['id']] = successor_reminder(reminder, now, plants.get(reminder['plant_id']))
+
+    reminder_ops = [InsertOne(s.model_dump()) for s in successors.values() if s]
+    reminder_ops.append(UpdateMany(
+        {"id": {"$in": list(successors)}, "completion_id": token}, {"$unset": {"completion_id": ""}}
+    ))
+    writes = [db.reminders.bulk_write(reminder_ops, ordered=False, session=session)]
+    if care_dates:
+        writes.append(db.user_plants.bulk_write(
+            [UpdateOne({"id": plant_id}, {"$set": fields}) for plant_id, fields in care_dates.items()],
+            ordered=False, session=session,
+        ))
+    await run_writes(writes, session)
+    return successors
+
+
+def reminder_frequency_days(user_plant: UserPlant, reminder_type: str) -> Optional[int]:
     if reminder_type == "watering":
-        due_date = now + timedelta(days=user_plant.watering_frequency_days)
-    elif reminder_type == "fertilizing":
-        due_date = now + timedelta(days=user_plant.fertilizing_frequency_days)
-    else:
-        return
-    
-    reminder = Reminder(
+        return user_plant.watering_frequency_days
+    if reminder_type == "fertilizing":
+        return user_plant.fertilizing_frequency_days
+    return None
+
+
+def build_next_reminder(user_plant: UserPlant, reminder_type: str, now: Optional[datetime] = None) -> Optional[Reminder]:
+    frequency_days = reminder_frequency_days(user_plant, reminder_type)
+    if frequency_days is None:
+        return None
+    return Reminder(
         user_id=user_plant.user_id,
         plant_id=user_plant.id,
         plant_nickname=user_plant.nickname,
         reminder_type=reminder_type,
-        due_date=due_date
+        due_date=(now or datetime.utcnow()) + timedelta(days=frequency_days),
+        frequency_days=frequency_days,
     )
-    
-    await db.reminders.insert_one(reminder.dict())
-    await trigger_push_for_reminder(reminder)
+
+
+def initial_reminders(user_plant: UserPlant, now: Optional[datetime] = None) -> List[Reminder]:
+    now = now or datetime.utcnow()
+    return [build_next_reminder(user_plant, reminder_type, now) for reminder_type in RECURRING_REMINDER_TYPES]
+
+
+async def create_reminders_for_plant(user_plant: UserPlant):
+    """Create initial reminders for a new plant"""
+    if db is None:
+        return
+    reminders = initial_reminders(user_plant)
+    await db.reminders.insert_many([reminder.model_dump() for reminder in reminders])
+
+    # Pushes are sent by the scheduler once the reminders come due
+    for reminder in reminders:
+        reminder_scheduler.schedule(reminder)
 
 # Include the router in the main app
 app.include_router(api_router)
 
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    max_bytes=MAX_UPLOAD_BYTES,
+    # each file is still capped at MAX_UPLOAD_BYTES by read_upload; 64 KiB covers the form fields
+    path_limits={"/api/plants/identify/multi": IDENTIFY_MAX_IMAGES * MAX_UPLOAD_BYTES + 64 * 1024},
+)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
+app.add_middleware(MetricsMiddleware)
+
+REGISTRY.register(ServiceStatsCollector())
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint"""
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -780,15 +1599,97 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# @app.on_event("startup")
-# async def startup_db_client():
-#     # Create indexes for better performance
-#     if db:
-#         await db.user_plants.create_index("user_id")
-#         await db.reminders.create_index([("user_id", 1), ("due_date", 1)])
+@app.on_event("startup")
+async def startup_db_client():
+    # Create indexes for better performance
+    if db is not None:
+        try:
+            await index_manager.ensure(db)
+        except Exception as e:
+            logger.error(f"Index bootstrap failed: {e}")
+
+@app.on_event("startup")
+async def start_background_tasks():
+    if db is not None and REMINDER_SCHEDULER_ENABLED:
+        reminder_scheduler.start()
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await reminder_scheduler.stop()
+    await push_service.stop()
     await plant_service.close_session()
+    await chat_sessions.close()
+    await llm_service.close()
+    shutdown_preprocess_pool()
     if client:
-        client.close()
\ No newline at end of file
+        client.close()
+
+def main():
+    """Maintenance commands, e.g. `python backend/server.py warm-care-store 1 2 3`."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Plauntie backend maintenance commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    warm = subparsers.add_parser("warm-care-store", help="Prefetch Perenual species details into the local care store")
+    warm.add_argument("plant_ids", nargs="*", help="Perenual species ids")
+    warm.add_argument("--file", help="File with one species id per line ('-' for stdin)")
+    warm.add_argument("--concurrency", type=int, default=2, help="Parallel Perenual requests")
+    warm.add_argument("--force", action="store_true", help="Refetch ids that are already stored")
+
+    species = subparsers.add_parser("build-species-index", help="Build the local species search index")
+    species.add_argument("inputs", nargs="*", help="JSON/JSONL dumps of Perenual species-list pages or records")
+    species.add_argument("--perenual-pages", type=int, default=0, help="Also fetch this many species-list pages from Perenual")
+    species.add_argument("--output", default=SPECIES_INDEX_PATH, help="Index file to write")
+
+    indexes = subparsers.add_parser("check-indexes", help="Report index drift and fail if a hot query does a COLLSCAN")
+    indexes.add_argument("--create", action="store_true", help="Create missing indexes before checking")
+
+    args = parser.parse_args()
+
+    if args.command == "warm-care-store":
+        plant_ids = list(args.plant_ids)
+        if args.file:
+            source = sys.stdin if args.file == "-" else open(args.file, encoding="utf-8")
+            with source:
+                plant_ids.extend(line.split("#")[0].strip() for line in source)
+
+        async def run():
+            try:
+                return await plant_service.warm_care_store(plant_ids, concurrency=args.concurrency, force=args.force)
+            finally:
+                await plant_service.close_session()
+
+        print(json.dumps(asyncio.run(run())))
+
+    elif args.command == "build-species-index":
+        records = [record for path in args.inputs for record in read_species_records(path)]
+        if args.perenual_pages:
+            async def fetch_pages():
+                try:
+                    return await plant_service.fetch_species_pages(args.perenual_pages)
+                finally:
+                    await plant_service.close_session()
+
+            records.extend(asyncio.run(fetch_pages()))
+        print(json.dumps(SpeciesIndex.build(records, args.output)))
+
+    elif args.command == "check-indexes":
+
+        async def run_checks():
+            mongo_client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+            try:
+                database = mongo_client[os.environ['DB_NAME']]
+                drift = await (index_manager.ensure(database) if args.create else index_manager.diff(database))
+                return drift, await index_manager.check_query_plans(database)
+            finally:
+                mongo_client.close()
+
+        drift, collscans = asyncio.run(run_checks())
+        print(json.dumps({"indexes": drift, "collscans": collscans}, indent=2))
+        has_drift = any(d["missing"] or d["conflicting"] for d in drift.values())
+        sys.exit(1 if has_drift or collscans else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""Local memory-mapped species search index."""
+import bisect
+import heapq
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from config import SPECIES_SEARCH_LIMIT, SPECIES_SEARCH_MIN_SCORE
+from models import PlantSearchResult
+from translation import QUERY_TOKEN_RE
+
+
+# Local species search index
+def perenual_search_result(plant: Dict[str, Any]) -> PlantSearchResult:
+    """PlantSearchResult from a Perenual species-list record."""
+    return PlantSearchResult(
+        id=str(plant.get('id', '')),
+        name=plant.get('common_name') or '',
+        scientific_name=plant.get('scientific_name', [''])[0] if plant.get('scientific_name') else '',
+        common_names=plant.get('other_name') or [],
+        image_url=plant.get('default_image', {}).get('medium_url') if plant.get('default_image') else None,
+        description=plant.get('description', ''),
+        care_level=plant.get('care_level', '')
+    )
+
+
+def normalize_species_name(name: str) -> str:
+    return " ".join(QUERY_TOKEN_RE.findall(name.lower().replace('ё', 'е')))
+
+
+def name_trigrams(name: str) -> set:
+    padded = f"  {name} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def trigram_key(gram: str) -> int:
+    return zlib.crc32(gram.encode('utf-8'))
+
+
+class SpeciesIndex:
+    """Read-only trigram index over species names, memory-mapped from disk.
+
+    File layout (little-endian uint32 unless noted), written by
+    :meth:`build`::
+
+        header     magic, n_docs, n_names, n_grams, n_postings, name_bytes, doc_bytes
+        doc_offs   n_docs + 1   offsets into the doc blob
+        name_doc   n_names      document of each name
+        name_offs  n_names + 1  offsets into the name blob
+        gram_keys  n_grams      sorted CRC32 of each trigram
+        gram_offs  n_grams + 1  offsets into postings
+        postings   n_postings   name ids per trigram
+        name blob  normalized names, UTF-8
+        doc blob   PlantSearchResult JSON per document
+
+    Every name of a species (common name, scientific names and ``other_name``
+    synonyms in any language) is indexed. Candidates are the names sharing
+    the most trigrams with the query. They are ranked by Dice similarity over
+    trigram sets, which tolerates typos, with a bonus for exact and word-prefix
+    matches. Only the pages that are touched get read, so opening the file is
+    instant and the OS page cache is shared between workers.
+    """
+
+    MAGIC = b'PLSPIX01'
+    _HEADER = struct.Struct('<8s6I')
+    MAX_CANDIDATES = 200
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, n_docs, n_names, n_grams, n_postings, name_bytes, doc_bytes = self._HEADER.unpack_from(self._mmap)
+        if magic != self.MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a species index")
+        view = memoryview(self._mmap)
+        offset = self._HEADER.size
+
+        def uint32s(count: int) -> memoryview:
+            nonlocal offset
+            section = view[offset:offset + 4 * count].cast('I')
+            offset += 4 * count
+            return section
+
+        self._doc_offs = uint32s(n_docs + 1)
+        self._name_doc = uint32s(n_names)
+        self._name_offs = uint32s(n_names + 1)
+        self._gram_keys = uint32s(n_grams)
+        self._gram_offs = uint32s(n_grams + 1)
+        self._postings = uint32s(n_postings)
+        self._names = view[offset:offset + name_bytes]
+        self._docs = view[offset + name_bytes:offset + name_bytes + doc_bytes]
+        self._views = [self._doc_offs, self._name_doc, self._name_offs, self._gram_keys,
+                       self._gram_offs, self._postings, self._names, self._docs, view]
+        self.n_docs = n_docs
+        self.n_names = n_names
+
+    @classmethod
+    def open_if_exists(cls, path: str) -> Optional['SpeciesIndex']:
+        if not os.path.exists(path):
+            logging.info(f"No species index at {path}; plant search will use Perenual only")
+            return None
+        try:
+            index = cls(path)
+        except (OSError, ValueError, struct.error) as e:
+            logging.error(f"Error opening species index {path}: {e}")
+            return None
+        logging.info(f"Species index loaded: {index.n_docs} species, {index.n_names} names")
+        return index
+
+    def __len__(self) -> int:
+        return self.n_docs
+
+    def _name(self, name_id: int) -> str:
+        return bytes(self._names[self._name_offs[name_id]:self._name_offs[name_id + 1]]).decode('utf-8')
+
+    def _doc(self, doc_id: int) -> PlantSearchResult:
+        return PlantSearchResult.model_validate_json(
+            bytes(self._docs[self._doc_offs[doc_id]:self._doc_offs[doc_id + 1]])
+        )
+
+    def _postings_for(self, gram: str) -> List[int]:
+        key = trigram_key(gram)
+        i = bisect.bisect_left(self._gram_keys, key)
+        if i == len(self._gram_keys) or self._gram_keys[i] != key:
+            return []
+        return self._postings[self._gram_offs[i]:self._gram_offs[i + 1]].tolist()
+
+    def search_scored(self, query: str, limit: int = SPECIES_SEARCH_LIMIT,
+                      min_score: float = SPECIES_SEARCH_MIN_SCORE) -> List[Tuple[float, PlantSearchResult]]:
+        """Best-matching species for ``query`` as (score, result), best first."""
+        query = normalize_species_name(query)
+        if len(query) < 2:
+            return []
+        grams = name_trigrams(query)
+        hits: Dict[int, int] = {}
+        for gram in grams:
+            for name_id in self._postings_for(gram):
+                hits[name_id] = hits.get(name_id, 0) + 1
+        candidates = heapq.nlargest(self.MAX_CANDIDATES, hits.items(), key=lambda item: item[1])
+
+        best: Dict[int, float] = {}
+        for name_id, _ in candidates:
+            name = self._name(name_id)
+            score = 2 * len(grams & name_trigrams(name)) / (len(grams) + len(name_trigrams(name)))
+            if name == query:
+                score += 1.0
+            elif name.startswith(query) or f" {query}" in name:
+                score += 0.3
+            doc_id = self._name_doc[name_id]
+            if score >= min_score and score > best.get(doc_id, 0.0):
+                best[doc_id] = score
+        ranked = heapq.nlargest(limit, best.items(), key=lambda item: item[1])
+        return [(score, self._doc(doc_id)) for doc_id, score in ranked]
+
+    def search(self, query: str, limit: int = SPECIES_SEARCH_LIMIT) -> List[PlantSearchResult]:
+        return [result for _, result in self.search_scored(query, limit)]
+
+    def close(self):
+        for view in getattr(self, '_views', []):
+            view.release()
+        self._views = []
+        self._mmap.close()
+        self._file.close()
+
+    @classmethod
+    def build(cls, records: Iterable[Dict[str, Any]], path: str) -> Dict[str, int]:
+        """Write an index for Perenual species-list records to ``path`` (atomically)."""
+        doc_blobs: List[bytes] = []
+        names: List[Tuple[str, int]] = []
+        seen_ids = set()
+        for plant in records:
+            result = perenual_search_result(plant)
+            if not result.id or result.id in seen_ids:
+                continue
+            seen_ids.add(result.id)
+            doc_id = len(doc_blobs)
+            doc_blobs.append(result.model_dump_json(exclude_defaults=True).encode('utf-8'))
+            variants = [result.name, *(plant.get('scientific_name') or []), *result.common_names]
+            for name in dict.fromkeys(filter(None, map(normalize_species_name, variants))):
+                names.append((name, doc_id))
+
+        postings_by_key: Dict[int, List[int]] = {}
+        for name_id, (name, _) in enumerate(names):
+            for gram in name_trigrams(name):
+                postings_by_key.setdefault(trigram_key(gram), []).append(name_id)
+        keys = sorted(postings_by_key)
+
+        def uint32s(values: Iterable[int]) -> bytes:
+            values = array('I', values)
+            if sys.byteorder == 'big':
+                values.byteswap()
+            return values.tobytes()
+
+        def offsets(blobs: List[bytes]) -> List[int]:
+            result = [0]
+            for blob in blobs:
+                result.append(result[-1] + len(blob))
+            return result
+
+        name_blobs = [name.encode('utf-8') for name, _ in names]
+        gram_offs = [0]
+        for key in keys:
+            gram_offs.append(gram_offs[-1] + len(postings_by_key[key]))
+        name_blob = b''.join(name_blobs)
+        doc_blob = b''.join(doc_blobs)
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(cls._HEADER.pack(cls.MAGIC, len(doc_blobs), len(names), len(keys),
+                                     gram_offs[-1], len(name_blob), len(doc_blob)))
+            f.write(uint32s(offsets(doc_blobs)))
+            f.write(uint32s(doc_id for _, doc_id in names))
+            f.write(uint32s(offsets(name_blobs)))
+            f.write(uint32s(keys))
+            f.write(uint32s(gram_offs))
+            for key in keys:
+                f.write(uint32s(postings_by_key[key]))
+            f.write(name_blob)
+            f.write(doc_blob)
+        os.replace(tmp_path, path)
+        return {"species": len(doc_blobs), "names": len(names), "trigrams": len(keys),
+                "bytes": os.path.getsize(path)}
+
+
+def read_species_records(path: str) -> Iterator[Dict[str, Any]]:
+    """Species records from a JSON/JSONL dump of Perenual species-list pages or records."""
+    with open(path, encoding='utf-8') as f:
+        if path.endswith('.jsonl'):
+            items = (json.loads(line) for line in f if line.strip())
+        else:
+            data = json.load(f)
+            items = data if isinstance(data, list) else [data]
+        for item in items:
+            if isinstance(item, dict) and isinstance(item.get('data'), list):
+                yield from item['data']
+            elif isinstance(item, dict):
+                yield item
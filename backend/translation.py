@@ -0,0 +1,147 @@
+"""RU->EN plant name translation for search queries."""
+import logging
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import snowballstemmer
+
+
+# Query translation
+CYRILLIC_RE = re.compile(r'[а-яё]')
+# Snowball leaves a stem vowel on some nouns ("орхидея" -> "орхиде" but "орхидеи" -> "орхид")
+STEM_TRAILING_VOWELS = 'аеиоуыэюяйь'
+# Dictionary words that may be adjectives, and query words that can only be adjectives: "мятый" stems
+# like "мята", so an adjective form only matches a dictionary word that is itself adjective-shaped
+ADJECTIVE_ENDINGS = ('ый', 'ий', 'ой', 'ая', 'яя', 'ое', 'ее', 'ые', 'ие')
+ADJECTIVE_ONLY_ENDINGS = ('ый', 'ая', 'яя', 'ые', 'ого', 'ому', 'ых', 'ыми', 'ую', 'юю')
+QUERY_TOKEN_RE = re.compile(r"[\w'-]+")
+
+
+class RussianStemmer:
+    """Snowball Russian stemmer with a memo; words without Cyrillic pass through unchanged."""
+
+    def __init__(self, max_cached: int = 100_000):
+        self._stemmer = snowballstemmer.stemmer('russian')
+        self._cache: Dict[str, str] = {}
+        self.max_cached = max_cached
+
+    @staticmethod
+    def words(text: str) -> List[str]:
+        """Lowercased words of ``text`` with ё folded to е."""
+        return QUERY_TOKEN_RE.findall(text.lower().replace('ё', 'е'))
+
+    def stem(self, word: str) -> str:
+        stem = self._cache.get(word)
+        if stem is None:
+            stem = word
+            if CYRILLIC_RE.search(word):
+                stem = self._stemmer.stemWord(word)
+            if len(self._cache) < self.max_cached:
+                self._cache[word] = stem
+        return stem
+
+
+class QueryTranslator:
+    """Longest-match RU→EN phrase translator over stemmed words.
+
+    Dictionary phrases are stemmed with the Snowball Russian stemmer and
+    stored in a word-level trie, so "розы", "розу" and "роза" all reach the
+    same entry. Stems that keep a stem vowel also match without it
+    ("орхиде" and "орхид"), and a query word with an adjective ending only
+    matches an adjective-shaped dictionary word ("мятый" does not reach
+    "мята"). A query is scanned left to right; at each word the longest
+    dictionary phrase starting there wins ("фиалка узамбарская" over
+    "фиалка"). Lookup cost depends on the query length and the longest
+    phrase, not on the dictionary size.
+    """
+
+    _VALUE = ""  # trie key holding a node's translation; never a real stem
+    _ADJECTIVE = "+"  # set on nodes reached through an adjective-shaped word
+
+    def __init__(self, entries: Iterable[Tuple[str, str]] = ()):
+        self._stemmer = RussianStemmer()
+        self._root: Dict[str, Any] = {}
+        self.size = 0
+        for phrase, translation in entries:
+            self.add(phrase, translation)
+
+    @classmethod
+    def from_file(cls, path: str) -> 'QueryTranslator':
+        """Load ``<russian>\\t<english>`` lines; ``#`` starts a comment line."""
+        entries = []
+        try:
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line or line.startswith('#'):
+                        continue
+                    phrase, sep, translation = line.partition('\t')
+                    if sep and translation.strip():
+                        entries.append((phrase, translation.strip()))
+        except OSError as e:
+            logging.warning(f"Plant translations unavailable ({e}); search queries won't be translated")
+        translator = cls(entries)
+        logging.info(f"Loaded {translator.size} plant name translations from {path}")
+        return translator
+
+    def add(self, phrase: str, translation: str):
+        """Add a phrase; a later entry with the same stems replaces the earlier one."""
+        words = RussianStemmer.words(phrase)
+        if not words:
+            return
+        node = self._root
+        for word in words:
+            stem = self._stemmer.stem(word)
+            parent, node = node, node.setdefault(stem, {})
+            trimmed = stem.rstrip(STEM_TRAILING_VOWELS)
+            if len(trimmed) >= 3:
+                parent.setdefault(trimmed, node)
+            if word.endswith(ADJECTIVE_ENDINGS):
+                node[self._ADJECTIVE] = True
+        if self._VALUE not in node:
+            self.size += 1
+        node[self._VALUE] = translation
+
+    def _child(self, node: Dict[str, Any], word: str, stem: str) -> Optional[Dict[str, Any]]:
+        child = node.get(stem)
+        if child is None:
+            trimmed = stem.rstrip(STEM_TRAILING_VOWELS)
+            child = node.get(trimmed) if len(trimmed) >= 3 else None
+        if child is not None and self._ADJECTIVE not in child and word.endswith(ADJECTIVE_ONLY_ENDINGS):
+            return None
+        return child
+
+    def translate(self, query: str) -> Optional[str]:
+        """English rendering of ``query``, or None when nothing in it is known.
+
+        Matched phrases are replaced by their translation and non-Cyrillic
+        words are kept; unknown Russian words are dropped since the
+        upstream search is English-only.
+        """
+        words = RussianStemmer.words(query)
+        stems = [self._stemmer.stem(word) for word in words]
+        parts: List[str] = []
+        matched = False
+        i = 0
+        while i < len(words):
+            node = self._root
+            best_end, best = i, None
+            j = i
+            while j < len(words):
+                node = self._child(node, words[j], stems[j])
+                if node is None:
+                    break
+                j += 1
+                if self._VALUE in node:
+                    best_end, best = j, node[self._VALUE]
+            if best is not None:
+                parts.append(best)
+                matched = True
+                i = best_end
+                continue
+            if not CYRILLIC_RE.search(words[i]):
+                parts.append(words[i])
+            i += 1
+        if not matched:
+            return None
+        return " ".join(dict.fromkeys(parts))
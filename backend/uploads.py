@@ -0,0 +1,127 @@
+"""Bounded image uploads and the shared image preprocessing pool."""
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException, UploadFile
+from fastapi.responses import JSONResponse
+
+from config import MAX_UPLOAD_BYTES, IMAGE_PREPROCESS_WORKERS, IMAGE_JPEG_QUALITY, IMAGE_MAX_EDGES
+from images import PreparedImage, build_collage, preprocess_image
+from metrics import IMAGE_PREPROCESS_SECONDS
+
+
+# Image preprocessing pool
+_preprocess_pool: Optional[ProcessPoolExecutor] = None
+
+
+async def prepare_image(data: bytes) -> PreparedImage:
+    """Preprocess an upload in the shared process pool (or a thread if IMAGE_PREPROCESS_WORKERS=0)."""
+    with IMAGE_PREPROCESS_SECONDS.time():
+        return await _run_preprocess(data)
+
+
+async def _run_preprocess(data: bytes) -> PreparedImage:
+    return await run_in_image_pool(preprocess_image, data, IMAGE_MAX_EDGES, IMAGE_JPEG_QUALITY)
+
+
+async def run_in_image_pool(func, *args):
+    global _preprocess_pool
+    if IMAGE_PREPROCESS_WORKERS <= 0:
+        return await asyncio.to_thread(func, *args)
+    if _preprocess_pool is None:
+        # spawn: never fork a process that already runs an event loop and client pools
+        _preprocess_pool = ProcessPoolExecutor(
+            max_workers=IMAGE_PREPROCESS_WORKERS,
+            mp_context=multiprocessing.get_context('spawn'),
+        )
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_preprocess_pool, func, *args)
+
+
+async def prepare_collage(images: List[bytes]) -> bytes:
+    return await run_in_image_pool(build_collage, images, IMAGE_MAX_EDGES['llm'], IMAGE_JPEG_QUALITY)
+
+
+def shutdown_preprocess_pool():
+    global _preprocess_pool
+    if _preprocess_pool is not None:
+        _preprocess_pool.shutdown(wait=False, cancel_futures=True)
+        _preprocess_pool = None
+
+
+# Image uploads
+class UploadSizeLimitMiddleware:
+    """Reject multipart uploads larger than ``max_bytes`` before the body is fully read.
+
+    A declared Content-Length over the limit is refused without reading the
+    body at all. Otherwise the received bytes are counted and the request is
+    aborted with 413 as soon as the limit is crossed. ``path_limits``
+    overrides the limit for routes that take several files.
+    """
+
+    def __init__(self, app, max_bytes: int, path_limits: Optional[Dict[str, int]] = None):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.path_limits = path_limits or {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = dict(scope.get("headers") or [])
+        if not headers.get(b"content-type", b"").startswith(b"multipart/form-data"):
+            return await self.app(scope, receive, send)
+
+        max_bytes = self.path_limits.get(scope.get("path"), self.max_bytes)
+        content_length = headers.get(b"content-length")
+        if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+            response = JSONResponse({"detail": "Uploaded file is too large"}, status_code=413)
+            return await response(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_bytes:
+                    raise HTTPException(status_code=413, detail="Uploaded file is too large")
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+async def read_upload(file: UploadFile) -> bytes:
+    """The upload's bytes; HTTP 413 over MAX_UPLOAD_BYTES.
+
+    Read straight from the request's own spool file (Starlette keeps a part
+    in memory up to 1 MiB, then on disk), never copied into a second one.
+    """
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="Uploaded file is too large")
+    await file.seek(0)
+    data = await file.read(MAX_UPLOAD_BYTES + 1)
+    if len(data) > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="Uploaded file is too large")
+    return data
+
+
+async def prepare_upload(file: UploadFile) -> PreparedImage:
+    """Read, bound and preprocess an image upload; HTTP 400 if it is not a decodable image."""
+    data = await read_upload(file)
+    try:
+        return await prepare_image(data)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid image file")
+
+
+async def prepare_uploads(files: List[UploadFile]) -> List[PreparedImage]:
+    """Preprocess several uploads concurrently; the first failure cancels the rest."""
+    tasks = [asyncio.create_task(prepare_upload(file)) for file in files]
+    try:
+        return await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,618 @@
+#!/usr/bin/env python3
+"""
+Plauntie Backend Load Benchmark
+Runs the FastAPI app against local stand-ins for Perenual, PlantNet,
+OpenRouter and a web push service, drives a mixed workload and reports
+per-route latency percentiles and throughput as JSON.
+
+    python backend_benchmark.py --duration 30 --concurrency 32 --output bench.json
+    python backend_benchmark.py --latency openrouter=1500 --error-rate perenual=0.05 --compare bench.json
+
+Reminder completion needs MongoDB: pass --mongo-url, or install
+mongomock-motor to run it in memory. Without either it is left out.
+"""
+
+import argparse
+import asyncio
+import base64
+import io
+import json
+import multiprocessing
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+import httpx
+from aiohttp import web
+from PIL import Image, ImageDraw
+
+BACKEND_DIR = Path(__file__).parent / "backend"
+
+PROVIDERS = ("perenual", "plantnet", "openrouter", "webpush")
+DEFAULT_LATENCY_MS = {"perenual": 120, "plantnet": 450, "openrouter": 900, "webpush": 40}
+DEFAULT_WEIGHTS = {
+    "search": 35,
+    "care": 20,
+    "identify": 8,
+    "identify_multi": 3,
+    "chat": 8,
+    "chat_stream": 9,
+    "complete_reminder": 15,
+    "list_reminders": 5,
+}
+SEARCH_QUERIES = ["роза", "фиалка", "кактус", "фикус", "орхидея", "монстера", "алоэ", "лаванда",
+                  "monstera", "ficus lyrata", "snake plant", "pothos", "calathea", "peace lily"]
+CHAT_QUESTIONS = ["Как часто поливать фикус?", "Почему желтеют листья у монстеры?",
+                  "Можно ли держать орхидею на северном окне?", "Чем подкормить кактус весной?"]
+
+
+# Upstream stubs
+class UpstreamStubs:
+    """One aiohttp app standing in for every upstream, with injected latency and errors."""
+
+    def __init__(self, latency_ms, error_rate, jitter, stream_chunks):
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.jitter = jitter
+        self.stream_chunks = stream_chunks
+        self.calls = {provider: 0 for provider in PROVIDERS}
+        self.errors = {provider: 0 for provider in PROVIDERS}
+
+    def delay(self, provider, share=1.0):
+        base = self.latency_ms.get(provider, 0) / 1000 * share
+        return max(0.0, base * (1 + self.jitter * (2 * random.random() - 1)))
+
+    async def begin(self, provider):
+        """Count the call and sleep the injected latency; True if this call should fail."""
+        self.calls[provider] += 1
+        if random.random() < self.error_rate.get(provider, 0):
+            await asyncio.sleep(self.delay(provider, 0.5))
+            self.errors[provider] += 1
+            return True
+        return False
+
+    async def species_list(self, request):
+        if await self.begin("perenual"):
+            return web.Response(status=503)
+        await asyncio.sleep(self.delay("perenual"))
+        query = request.query.get("q", "plant")
+        data = [{
+            "id": abs(hash((query, i))) % 10000,
+            "common_name": f"{query.title()} {i}",
+            "scientific_name": [f"{query.capitalize()} species{i}"],
+            "other_name": [f"{query} variety {i}"],
+            "default_image": {"medium_url": f"https://example.com/{i}.jpg"},
+        } for i in range(10)]
+        return web.json_response({"data": data, "last_page": 1})
+
+    async def species_details(self, request):
+        if await self.begin("perenual"):
+            return web.Response(status=503)
+        await asyncio.sleep(self.delay("perenual"))
+        plant_id = request.match_info["plant_id"]
+        return web.json_response({
+            "id": int(plant_id) if plant_id.isdigit() else 0,
+            "common_name": f"Plant {plant_id}",
+            "scientific_name": [f"Plantae species{plant_id}"],
+            "watering": "Average",
+            "sunlight": ["part shade"],
+            "hardiness": {"min": "10", "max": "12"},
+            "care_guides": ["Water when the top of the soil is dry"],
+        })
+
+    async def identify(self, request):
+        await request.read()
+        if await self.begin("plantnet"):
+            return web.Response(status=503)
+        await asyncio.sleep(self.delay("plantnet"))
+        return web.json_response({"results": [{
+            "score": round(0.9 - 0.2 * i, 2),
+            "species": {
+                "scientificNameWithoutAuthor": name,
+                "commonNames": [{"value": common}],
+                "family": {"scientificNameWithoutAuthor": "Araceae"},
+            },
+        } for i, (name, common) in enumerate([("Monstera deliciosa", "Swiss cheese plant"),
+                                               ("Philodendron bipinnatifidum", "Lacy tree philodendron")])]})
+
+    async def chat_completions(self, request):
+        body = await request.json()
+        if await self.begin("openrouter"):
+            return web.json_response({"error": {"message": "upstream overloaded"}}, status=503)
+        text = "Ох, голубчик, поливай своего зелёного друга, когда верхний слой почвы подсохнет. " * 3
+        usage = {"prompt_tokens": 180, "completion_tokens": len(text.split()), "total_tokens": 180 + len(text.split())}
+        created = int(time.time())
+        if not body.get("stream"):
+            await asyncio.sleep(self.delay("openrouter"))
+            return web.json_response({
+                "id": f"gen-{uuid.uuid4().hex[:12]}", "object": "chat.completion", "created": created,
+                "model": body.get("model", "stub"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        await asyncio.sleep(self.delay("openrouter", 0.3))  # time to first token
+        words = text.split(" ")
+        per_chunk = max(1, len(words) // self.stream_chunks)
+        chunk_delay = self.delay("openrouter", 0.7) / self.stream_chunks
+        for i in range(0, len(words), per_chunk):
+            chunk = {
+                "id": "gen-stream", "object": "chat.completion.chunk", "created": created,
+                "model": body.get("model", "stub"),
+                "choices": [{"index": 0, "delta": {"content": " ".join(words[i:i + per_chunk]) + " "}, "finish_reason": None}],
+            }
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            await asyncio.sleep(chunk_delay)
+        final = {"id": "gen-stream", "object": "chat.completion.chunk", "created": created,
+                 "model": body.get("model", "stub"), "choices": [], "usage": usage}
+        await response.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode())
+        await response.write_eof()
+        return response
+
+    async def push(self, request):
+        await request.read()
+        if await self.begin("webpush"):
+            return web.Response(status=503)
+        await asyncio.sleep(self.delay("webpush"))
+        return web.Response(status=201)
+
+    async def stats(self, request):
+        return web.json_response({"calls": self.calls, "errors": self.errors})
+
+    def app(self):
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_get("/perenual/api/species-list", self.species_list)
+        app.router.add_get("/perenual/api/species/details/{plant_id}", self.species_details)
+        app.router.add_post("/plantnet/v2/identify/{project}", self.identify)
+        app.router.add_post("/openrouter/api/v1/chat/completions", self.chat_completions)
+        app.router.add_post("/push/{subscription}", self.push)
+        app.router.add_get("/_stats", self.stats)
+        return app
+
+
+def run_stubs(port, latency_ms, error_rate, jitter, stream_chunks):
+    stubs = UpstreamStubs(latency_ms, error_rate, jitter, stream_chunks)
+    web.run_app(stubs.app(), host="127.0.0.1", port=port, print=None, access_log=None)
+
+
+def run_server(port, mongo_url, db_name):
+    import logging
+    import uvicorn
+
+    sys.path.insert(0, str(BACKEND_DIR))
+    import server
+
+    if mongo_url:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        server.db = AsyncIOMotorClient(mongo_url)[db_name]
+    else:
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            pass
+        else:
+            patch_mongomock_find_and_modify()
+            server.db = AsyncMongoMockClient()[db_name]
+    logging.getLogger().setLevel(logging.WARNING)
+    uvicorn.run(server.app, host="127.0.0.1", port=port, log_level="warning", access_log=False)
+
+
+def patch_mongomock_find_and_modify():
+    """mongomock can't return the updated document when the projection drops ``_id``.
+
+    It re-reads the document with the original filter, which no longer
+    matches after the update. Run it unprojected and apply the (exclusion)
+    projection afterwards.
+    """
+    from mongomock.collection import Collection
+
+    original = Collection._find_and_modify
+
+    def find_and_modify(self, query, projection=None, *args, **kwargs):
+        document = original(self, query, None, *args, **kwargs)
+        if document is not None and projection:
+            document = {key: value for key, value in document.items() if projection.get(key, 1)}
+        return document
+
+    Collection._find_and_modify = find_and_modify
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def generate_vapid_key():
+    from py_vapid import Vapid
+
+    vapid = Vapid()
+    vapid.generate_keys()
+    raw = vapid.private_key.private_numbers().private_value.to_bytes(32, "big")
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def push_subscription_keys():
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+
+    public = ec.generate_private_key(ec.SECP256R1()).public_key().public_bytes(
+        serialization.Encoding.X962, serialization.PublicFormat.UncompressedPoint
+    )
+    encode = lambda b: base64.urlsafe_b64encode(b).decode().rstrip("=")
+    return {"p256dh": encode(public), "auth": encode(os.urandom(16))}
+
+
+def make_images(count, size, seed):
+    """Distinct photo-sized JPEGs (shapes over noise) so every upload is decoded and resized for real."""
+    rng = random.Random(seed)
+    images = []
+    for i in range(count):
+        img = Image.effect_noise(size, 40 + rng.random() * 40).convert("RGB")
+        draw = ImageDraw.Draw(img)
+        for _ in range(30):
+            x, y = rng.randrange(size[0]), rng.randrange(size[1])
+            r = rng.randrange(40, size[0] // 3)
+            color = (rng.randrange(40), rng.randrange(80, 220), rng.randrange(60))
+            draw.ellipse((x - r, y - r // 2, x + r, y + r // 2), fill=color)
+        buffer = io.BytesIO()
+        img.save(buffer, format="JPEG", quality=90)
+        images.append((f"bench_{i}.jpg", buffer.getvalue()))
+    return images
+
+
+def load_images(directory):
+    paths = sorted(p for p in Path(directory).iterdir() if p.suffix.lower() in (".jpg", ".jpeg"))
+    return [(p.name, p.read_bytes()) for p in paths]
+
+
+def percentile(ordered, q):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+def summarize(samples, elapsed):
+    """Per-route count/errors/RPS and latency percentiles in milliseconds."""
+    report = {}
+    by_route = {}
+    for route, latency, ok, ttfb in samples:
+        by_route.setdefault(route, []).append((latency, ok, ttfb))
+    for route, rows in sorted(by_route.items()):
+        latencies = sorted(r[0] * 1000 for r in rows)
+        entry = {
+            "count": len(rows),
+            "errors": sum(1 for r in rows if not r[1]),
+            "rps": round(len(rows) / elapsed, 2),
+            "p50_ms": round(percentile(latencies, 50), 2),
+            "p95_ms": round(percentile(latencies, 95), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+            "mean_ms": round(sum(latencies) / len(latencies), 2),
+            "max_ms": round(latencies[-1], 2),
+        }
+        ttfbs = sorted(r[2] * 1000 for r in rows if r[2] is not None)
+        if ttfbs:
+            entry["ttfb_p50_ms"] = round(percentile(ttfbs, 50), 2)
+            entry["ttfb_p95_ms"] = round(percentile(ttfbs, 95), 2)
+        report[route] = entry
+    return report
+
+
+class Workload:
+    """Mixed user traffic against one running server."""
+
+    def __init__(self, client, images, weights, user_id, species_ids, chat_cache=True):
+        self.client = client
+        self.chat_cache = chat_cache
+        self.images = images
+        self.user_id = user_id
+        self.species_ids = species_ids
+        self.reminder_ids = []
+        self._refill_lock = asyncio.Lock()
+        self.weights = {name: w for name, w in weights.items() if w > 0}
+
+    async def seed(self, plants, due_now):
+        """Create plants (and so reminders) through the bulk endpoint, plus a push subscription."""
+        for start in range(0, plants, 500):
+            batch = [{
+                "plant_id": str(random.choice(self.species_ids)),
+                "nickname": f"Bench plant {i}",
+                "plant_name": "Monstera",
+                "scientific_name": "Monstera deliciosa",
+                "watering_frequency_days": 0 if due_now else 1,
+                "fertilizing_frequency_days": 2,
+            } for i in range(start, min(plants, start + 500))]
+            response = await self.client.post(f"/api/user/{self.user_id}/plants/bulk", json={"plants": batch})
+            response.raise_for_status()
+        await self.refill_reminders()
+
+    async def subscribe(self, push_base_url):
+        subscription = {
+            "endpoint": f"{push_base_url}/{uuid.uuid4().hex}",
+            "keys": push_subscription_keys(),
+            "user_id": self.user_id,
+        }
+        response = await self.client.post("/api/subscribe", json=subscription)
+        response.raise_for_status()
+
+    async def refill_reminders(self):
+        response = await self.client.get(f"/api/user/{self.user_id}/reminders", params={"fields": "id"})
+        if response.status_code == 200:
+            self.reminder_ids = [r["id"] for r in response.json()]
+            random.shuffle(self.reminder_ids)
+
+    async def search(self):
+        response = await self.client.get("/api/plants/search", params={"q": random.choice(SEARCH_QUERIES)})
+        return response.status_code == 200, None
+
+    async def care(self):
+        response = await self.client.get(f"/api/plants/{random.choice(self.species_ids)}/care")
+        return response.status_code == 200, None
+
+    async def identify(self):
+        name, data = random.choice(self.images)
+        response = await self.client.post("/api/plants/identify", files={"file": (name, data, "image/jpeg")})
+        return response.status_code == 200, None
+
+    async def identify_multi(self):
+        photos = random.sample(self.images, min(3, len(self.images)))
+        files = [("files", (name, data, "image/jpeg")) for name, data in photos]
+        data = {"organs": random.sample(["leaf", "flower", "fruit", "bark"], len(files))}
+        response = await self.client.post("/api/plants/identify/multi", files=files, data=data)
+        return response.status_code == 200, None
+
+    async def chat(self):
+        payload = {"message": random.choice(CHAT_QUESTIONS), "use_cache": self.chat_cache}
+        response = await self.client.post("/api/chat", json=payload)
+        return response.status_code == 200, None
+
+    async def chat_stream(self):
+        started = time.perf_counter()
+        ttfb = None
+        done = False
+        payload = {"message": random.choice(CHAT_QUESTIONS), "use_cache": self.chat_cache}
+        async with self.client.stream("POST", "/api/chat/stream", json=payload) as response:
+            async for line in response.aiter_lines():
+                if ttfb is None and line.startswith("data: "):
+                    ttfb = time.perf_counter() - started
+                if line == "event: done":
+                    done = True
+            ok = response.status_code == 200 and done
+        return ok, ttfb
+
+    async def complete_reminder(self):
+        if not self.reminder_ids:
+            async with self._refill_lock:
+                if not self.reminder_ids:
+                    await self.refill_reminders()
+        if not self.reminder_ids:
+            return False, None
+        reminder_id = self.reminder_ids.pop()
+        response = await self.client.post(f"/api/user/{self.user_id}/reminders/{reminder_id}/complete")
+        return response.status_code == 200, None
+
+    async def list_reminders(self):
+        response = await self.client.get(f"/api/user/{self.user_id}/reminders", params={"limit": 100})
+        return response.status_code == 200, None
+
+    async def run(self, concurrency, duration, warmup):
+        names = list(self.weights)
+        weights = [self.weights[n] for n in names]
+        samples = []
+        started = time.perf_counter()
+        record_from = started + warmup
+        stop_at = record_from + duration
+
+        async def worker():
+            while time.perf_counter() < stop_at:
+                name = random.choices(names, weights)[0]
+                began = time.perf_counter()
+                try:
+                    ok, ttfb = await getattr(self, name)()
+                except httpx.HTTPError:
+                    ok, ttfb = False, None
+                if began >= record_from:
+                    samples.append((name, time.perf_counter() - began, ok, ttfb))
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return samples, time.perf_counter() - record_from
+
+
+async def wait_until_ready(url, timeout=60.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(url)).status_code < 500:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout:.0f}s")
+
+
+def parse_provider_map(value):
+    result = {}
+    for item in filter(None, (value or "").split(",")):
+        provider, _, number = item.partition("=")
+        if provider not in PROVIDERS:
+            raise SystemExit(f"unknown provider '{provider}' (expected one of {', '.join(PROVIDERS)})")
+        result[provider] = float(number)
+    return result
+
+
+def parse_mix(value):
+    result = {}
+    for item in filter(None, (value or "").split(",")):
+        name, _, weight = item.partition("=")
+        if name not in DEFAULT_WEIGHTS:
+            raise SystemExit(f"unknown workload '{name}' (expected one of {', '.join(DEFAULT_WEIGHTS)})")
+        result[name] = float(weight)
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=Path(__file__).parent, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(report, baseline_path):
+    """Print p50/p95/p99 and RPS changes per route against an earlier report."""
+    baseline = json.loads(Path(baseline_path).read_text())
+    print(f"\nvs {baseline_path} ({baseline['meta'].get('commit')}):", file=sys.stderr)
+    for route, now in report["routes"].items():
+        before = baseline["routes"].get(route)
+        if not before:
+            continue
+        cells = []
+        for key in ("p50_ms", "p95_ms", "p99_ms", "rps"):
+            change = (now[key] - before[key]) / before[key] * 100 if before[key] else 0.0
+            cells.append(f"{key} {before[key]} -> {now[key]} ({change:+.1f}%)")
+        print(f"  {route:18} " + " | ".join(cells), file=sys.stderr)
+
+
+async def benchmark(args, server_url, stub_url):
+    images = load_images(args.images) if args.images else make_images(args.image_count, (1600, 1200), args.seed)
+    weights = dict(DEFAULT_WEIGHTS)
+    weights.update(parse_mix(args.mix))
+    limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency * 2)
+    async with httpx.AsyncClient(base_url=server_url, timeout=args.request_timeout, limits=limits) as client:
+        workload = Workload(client, images, weights, f"bench-{uuid.uuid4().hex[:8]}", list(range(1, args.species_ids + 1)),
+                            chat_cache=not args.no_chat_cache)
+        database = (await client.get(f"/api/user/{workload.user_id}/reminders")).status_code != 503
+        if database:
+            await workload.subscribe(f"{stub_url}/push")
+            await workload.seed(args.seed_plants, due_now=args.push)
+        else:
+            for name in ("complete_reminder", "list_reminders"):
+                workload.weights.pop(name, None)
+            print("No database available: reminder workloads skipped", file=sys.stderr)
+
+        samples, elapsed = await workload.run(args.concurrency, args.duration, args.warmup)
+        server_stats = {
+            "providers": (await client.get("/api/providers/stats")).json(),
+            "push": (await client.get("/api/push/stats")).json(),
+        }
+    async with httpx.AsyncClient() as stub_client:
+        upstream = (await stub_client.get(f"{stub_url}/_stats")).json()
+
+    routes = summarize(samples, elapsed)
+    total_latencies = sorted(s[1] * 1000 for s in samples)
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "python": sys.version.split()[0],
+            "concurrency": args.concurrency,
+            "duration_seconds": round(elapsed, 2),
+            "warmup_seconds": args.warmup,
+            "latency_ms": args.latency_ms,
+            "error_rate": args.error_rates,
+            "mix": workload.weights,
+            "images": len(images),
+            "database": database,
+        },
+        "routes": routes,
+        "total": {
+            "count": len(samples),
+            "errors": sum(1 for s in samples if not s[2]),
+            "rps": round(len(samples) / elapsed, 2),
+            "p50_ms": round(percentile(total_latencies, 50) or 0, 2),
+            "p95_ms": round(percentile(total_latencies, 95) or 0, 2),
+            "p99_ms": round(percentile(total_latencies, 99) or 0, 2),
+        },
+        "upstream": upstream,
+        "server": server_stats,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the Plauntie backend against local upstream stubs")
+    parser.add_argument("--duration", type=float, default=30, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="Unmeasured seconds before measuring")
+    parser.add_argument("--concurrency", type=int, default=32, help="Concurrent simulated clients")
+    parser.add_argument("--latency", default="", help="Injected upstream latency in ms, e.g. perenual=80,openrouter=1200")
+    parser.add_argument("--jitter", type=float, default=0.3, help="Latency jitter as a fraction of the mean")
+    parser.add_argument("--error-rate", default="", help="Injected upstream 503 rate, e.g. plantnet=0.05")
+    parser.add_argument("--stream-chunks", type=int, default=20, help="Chunks per streamed chat answer")
+    parser.add_argument("--no-chat-cache", action="store_true", help="Send use_cache=false so every chat hits the LLM stub")
+    parser.add_argument("--mix", default="", help="Workload weights, e.g. search=50,identify=0")
+    parser.add_argument("--images", help="Directory of JPEGs to upload instead of generated ones")
+    parser.add_argument("--image-count", type=int, default=24, help="Generated JPEGs to rotate through")
+    parser.add_argument("--species-ids", type=int, default=3000, help="Range of species ids for care lookups")
+    parser.add_argument("--seed-plants", type=int, default=2000, help="Plants to create before the run")
+    parser.add_argument("--push", action="store_true", help="Make seeded reminders due now so pushes are sent")
+    parser.add_argument("--mongo-url", help="MongoDB for reminder workloads (default: mongomock-motor if installed)")
+    parser.add_argument("--db-name", default="plauntie_bench")
+    parser.add_argument("--request-timeout", type=float, default=60)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Write the JSON report here (default: stdout)")
+    parser.add_argument("--compare", help="Earlier JSON report to diff against")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    args.latency_ms = {**DEFAULT_LATENCY_MS, **parse_provider_map(args.latency)}
+    args.error_rates = parse_provider_map(args.error_rate)
+
+    stub_port, server_port = free_port(), free_port()
+    stub_url = f"http://127.0.0.1:{stub_port}"
+    server_url = f"http://127.0.0.1:{server_port}"
+    workdir = tempfile.mkdtemp(prefix="plauntie-bench-")
+    os.environ.update({
+        "PERENUAL_BASE_URL": f"{stub_url}/perenual/api",
+        "PLANTNET_BASE_URL": f"{stub_url}/plantnet/v2",
+        "OPENROUTER_BASE_URL": f"{stub_url}/openrouter/api/v1",
+        "PERENUAL_API_KEY": "bench",
+        "PLANTNET_API_KEY": "bench",
+        "OPENROUTER_API_KEY": "bench",
+        "VAPID_PRIVATE_KEY": generate_vapid_key(),
+        "CARE_STORE_PATH": os.path.join(workdir, "care_store.sqlite3"),
+        "SPECIES_INDEX_PATH": os.environ.get("SPECIES_INDEX_PATH", os.path.join(workdir, "species_index.bin")),
+    })
+
+    # Not daemonic: the server needs to spawn its image preprocessing pool.
+    context = multiprocessing.get_context("spawn")
+    stubs = context.Process(target=run_stubs,
+                            args=(stub_port, args.latency_ms, args.error_rates, args.jitter, args.stream_chunks))
+    server_process = context.Process(target=run_server,
+                                     args=(server_port, args.mongo_url, args.db_name))
+    stubs.start()
+    server_process.start()
+    try:
+        asyncio.run(wait_until_ready(f"{stub_url}/_stats"))
+        asyncio.run(wait_until_ready(f"{server_url}/api/"))
+        report = asyncio.run(benchmark(args, server_url, stub_url))
+    finally:
+        for process in (server_process, stubs):
+            process.terminate()
+            process.join(10)
+            if process.is_alive():
+                process.kill()
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    else:
+        print(output)
+    for route, entry in report["routes"].items():
+        print(f"{route:18} n={entry['count']:<6} err={entry['errors']:<4} rps={entry['rps']:<8} "
+              f"p50={entry['p50_ms']}ms p95={entry['p95_ms']}ms p99={entry['p99_ms']}ms", file=sys.stderr)
+    if args.compare:
+        compare(report, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -113,6 +113,32 @@ class PlantCareAPITester:
         except Exception as e:
             return self.log_test("Chat Endpoint", False, f"Error: {str(e)}")
 
+    def test_chat_stream(self):
+        """Test the streaming (SSE) chat endpoint"""
+        try:
+            payload = {"message": "Как поливать фикус?", "enable_web_search": False}
+            response = requests.post(f"{self.api_url}/chat/stream", json=payload, stream=True, timeout=60)
+
+            deltas = []
+            finished = False
+            if response.status_code == 200:
+                for line in response.iter_lines(decode_unicode=True):
+                    if line == "event: done":
+                        finished = True
+                    elif line.startswith("data: ") and not finished:
+                        deltas.append(json.loads(line[6:]).get('delta', ''))
+
+            success = response.status_code == 200 and finished and len(deltas) > 0
+
+            if success:
+                details = f"Chunks: {len(deltas)} | Plauntie streamed: '{''.join(deltas)[:50]}...'"
+            else:
+                details = f"Status: {response.status_code} | Chunks: {len(deltas)} | Done: {finished}"
+
+            return self.log_test("Chat Stream Endpoint", success, details)
+        except Exception as e:
+            return self.log_test("Chat Stream Endpoint", False, f"Error: {str(e)}")
+
     def test_plant_identification(self):
         """Test plant identification with a sample image"""
         try:
@@ -310,6 +336,7 @@ class PlantCareAPITester:
         
         # Test new AI features
         self.test_chat()
+        self.test_chat_stream()
         self.test_plant_identification()
         self.test_plant_diagnosis()
 
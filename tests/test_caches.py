@@ -0,0 +1,108 @@
+import asyncio
+import io
+
+from PIL import Image, ImageDraw
+
+from caches import ImageResultCache, ResultCache
+from images import preprocess_image
+from models import PlantIdentification
+
+
+def test_result_cache_evicts_least_recently_used():
+    cache = ResultCache(ttl=60, max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert len(cache) == 2
+
+
+def test_result_cache_serves_stale_only_when_allowed():
+    cache = ResultCache(ttl=0, stale_ttl=60)
+    cache.set("a", 1)
+    assert cache.get("a") is None
+    assert cache.get("a", allow_stale=True) == 1
+
+
+def test_get_or_load_shares_concurrent_misses():
+    cache = ResultCache(ttl=60)
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "value"
+
+    async def main():
+        return await asyncio.gather(*(cache.get_or_load("k", loader) for _ in range(5)))
+
+    assert asyncio.run(main()) == ["value"] * 5
+    assert len(calls) == 1
+    assert cache.stats()["misses"] == 5
+
+
+def test_get_or_load_does_not_cache_none():
+    cache = ResultCache(ttl=60)
+
+    async def loader():
+        return None
+
+    assert asyncio.run(cache.get_or_load("k", loader)) is None
+    assert len(cache) == 0
+
+
+def _jpeg(quality: int) -> bytes:
+    image = Image.new('RGB', (256, 256), 'white')
+    draw = ImageDraw.Draw(image)
+    draw.ellipse((40, 30, 200, 220), fill=(30, 120, 40))
+    draw.rectangle((100, 150, 140, 256), fill=(90, 60, 20))
+    output = io.BytesIO()
+    image.save(output, format='JPEG', quality=quality)
+    return output.getvalue()
+
+
+def test_image_cache_matches_recompressed_copy():
+    cache = ImageResultCache(ttl=60, max_entries=10, max_bytes=1 << 20)
+    edges = {'llm': 128}
+    original = preprocess_image(_jpeg(95), edges)
+    recompressed = preprocess_image(_jpeg(60), edges)
+    assert original.digest != recompressed.digest
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        return PlantIdentification(identified_name="Ficus")
+
+    async def main():
+        first = await cache.get_or_compute(original, compute)
+        second = await cache.get_or_compute(recompressed, compute)
+        return first, second
+
+    first, second = asyncio.run(main())
+    assert first == second
+    assert len(calls) == 1
+    assert cache.stats()["near_hits"] == 1
+
+
+def test_cancelled_leader_does_not_fail_followers():
+    cache = ResultCache(ttl=60)
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.02)
+        return "value"
+
+    async def main():
+        leader = asyncio.create_task(cache.get_or_load("k", loader))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(cache.get_or_load("k", loader))
+        await asyncio.sleep(0)
+        leader.cancel()
+        return await follower
+
+    assert asyncio.run(main()) == "value"
+    assert len(calls) == 1
+    assert cache.get("k") == "value"
@@ -0,0 +1,43 @@
+import asyncio
+import time
+
+from care_store import SpeciesCareStore
+from models import PlantCareInfo
+
+
+def _care(plant_id: str) -> PlantCareInfo:
+    return PlantCareInfo(plant_id=plant_id, name="Ficus", scientific_name="Ficus elastica", watering="weekly")
+
+
+def test_put_then_get(tmp_path):
+    store = SpeciesCareStore(str(tmp_path / 'care.sqlite3'))
+    asyncio.run(store.put(_care("1")))
+    assert asyncio.run(store.get("1")) == _care("1")
+    assert asyncio.run(store.get("2")) is None
+    store.close()
+
+
+def test_expired_record_needs_allow_stale(tmp_path):
+    store = SpeciesCareStore(str(tmp_path / 'care.sqlite3'), max_age_days=1)
+    asyncio.run(store.put(_care("1")))
+    store._connect().execute("UPDATE species_care SET fetched_at = ?", (time.time() - 2 * 86400,))
+    assert asyncio.run(store.get("1")) is None
+    assert asyncio.run(store.get("1", allow_stale=True)) == _care("1")
+    assert asyncio.run(store.fresh_ids(["1"])) == set()
+    store.close()
+
+
+def test_corrupt_record_is_a_miss(tmp_path):
+    store = SpeciesCareStore(str(tmp_path / 'care.sqlite3'))
+    asyncio.run(store.put(_care("1")))
+    store._connect().execute("UPDATE species_care SET data = ?", ('{"plant_id": "1"',))
+    assert asyncio.run(store.get("1")) is None
+    store.close()
+
+
+def test_fresh_ids(tmp_path):
+    store = SpeciesCareStore(str(tmp_path / 'nested' / 'care.sqlite3'))
+    for plant_id in ("1", "2"):
+        asyncio.run(store.put(_care(plant_id)))
+    assert asyncio.run(store.fresh_ids(["1", "2", "3"])) == {"1", "2"}
+    store.close()
@@ -0,0 +1,152 @@
+import asyncio
+
+from chat import ChatAnswerCache, ChatSessionStore, estimate_tokens
+
+
+def _cache(**kwargs) -> ChatAnswerCache:
+    return ChatAnswerCache(ttl=60, max_entries=100, max_bytes=1 << 20, **kwargs)
+
+
+def test_rewording_hits_the_same_entry():
+    cache = _cache()
+    cache.store("Как поливать фикус?", "Раз в неделю")
+    assert cache.lookup("как поливать фикус") == "Раз в неделю"
+    assert cache.lookup("Подскажите, пожалуйста: фикусы как поливать!") == "Раз в неделю"
+
+
+def test_different_plant_misses():
+    cache = _cache()
+    cache.store("как поливать фикус", "Раз в неделю")
+    assert cache.lookup("как поливать кактус") is None
+
+
+def test_negation_qualifier_or_missing_plant_misses():
+    cache = _cache()
+    cache.store("почему желтеют листья фикуса", "Перелив или сквозняк")
+    assert cache.lookup("почему НЕ желтеют листья фикуса") is None
+    assert cache.lookup("почему желтеют листья фикуса зимой") is None
+    assert cache.lookup("почему желтеют листья") is None
+    assert cache.lookup("Почему желтеют листья у фикуса?") == "Перелив или сквозняк"
+
+
+def test_qualifiers_are_not_stopwords():
+    cache = _cache()
+    cache.store("как поливать фикус", "Раз в неделю")
+    for question in ("как часто поливать фикус", "как лучше поливать фикус",
+                     "как правильно поливать фикус", "надо поливать фикус"):
+        assert cache.lookup(question) is None, question
+
+
+def test_long_questions_bypass_the_cache():
+    cache = _cache(max_question_chars=20)
+    cache.store("как поливать фикус, который стоит у окна", "Раз в неделю")
+    assert cache.lookup("как поливать фикус, который стоит у окна") is None
+    assert cache.stats()["bypassed"] == 1
+
+
+def test_get_or_compute_shares_one_call():
+    cache = _cache()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "Раз в неделю"
+
+    async def main():
+        return await asyncio.gather(*(cache.get_or_compute("как поливать фикус", compute) for _ in range(3)))
+
+    assert asyncio.run(main()) == ["Раз в неделю"] * 3
+    assert len(calls) == 1
+
+
+def _store(path, **kwargs) -> ChatSessionStore:
+    options = dict(max_sessions=10, idle_ttl=60, token_budget=100)
+    options.update(kwargs)
+    return ChatSessionStore(str(path / 'sessions.sqlite3'), **options)
+
+
+def test_history_alternates_user_and_assistant(tmp_path):
+    async def main():
+        store = _store(tmp_path)
+        session = await store.create()
+        await store.append(session.id, "Привет", "Здравствуйте")
+        history = (await store.get(session.id)).history()
+        await store.close()
+        return history
+
+    assert asyncio.run(main()) == [
+        {"role": "user", "content": "Привет"},
+        {"role": "assistant", "content": "Здравствуйте"},
+    ]
+
+
+def test_unknown_session_is_not_created(tmp_path):
+    async def main():
+        store = _store(tmp_path)
+        await store.append("client-chosen-id", "Привет", "Здравствуйте")
+        session = await store.get("client-chosen-id")
+        await store.close()
+        return session
+
+    assert asyncio.run(main()) is None
+
+
+def test_sessions_are_shared_between_workers(tmp_path):
+    async def main():
+        first, second = _store(tmp_path), _store(tmp_path)
+        session = await first.create()
+        await second.append(session.id, "Привет", "Здравствуйте")
+        turns = (await first.get(session.id)).turns
+        deleted = await second.delete(session.id)
+        gone = await first.get(session.id)
+        await first.close()
+        await second.close()
+        return turns, deleted, gone
+
+    turns, deleted, gone = asyncio.run(main())
+    assert [turn.user for turn in turns] == ["Привет"]
+    assert deleted and gone is None
+
+
+def test_over_budget_history_is_compacted_and_summarized(tmp_path):
+    summaries = []
+
+    async def summarize(previous, turns):
+        summaries.append(len(turns))
+        return "краткое содержание"
+
+    async def main():
+        store = _store(tmp_path, token_budget=estimate_tokens("x" * 400), summarize=summarize)
+        session = await store.create()
+        for _ in range(6):
+            await store.append(session.id, "x" * 50, "y" * 50)
+        await asyncio.gather(*store._summary_tasks)
+        session = await store.get(session.id)
+        await store.close()
+        return store, session
+
+    store, session = asyncio.run(main())
+    assert store.compactions >= 1
+    assert len(session.turns) < 6
+    assert summaries and session.summary == "краткое содержание"
+    assert session.history()[0]["content"].endswith("краткое содержание")
+
+
+def test_idle_and_least_recently_active_sessions_expire(tmp_path):
+    async def main():
+        store = _store(tmp_path, max_sessions=2)
+        first = await store.create()
+        second = await store.create()
+        await store.append(first.id, "Привет", "Здравствуйте")
+        await store.create()
+        evicted = await store.get(second.id)
+        kept = await store.get(first.id)
+        store.idle_ttl = 0
+        expired = await store.get(first.id)
+        await store.close()
+        return evicted, kept, expired, store.sessions
+
+    evicted, kept, expired, count = asyncio.run(main())
+    assert evicted is None and kept is not None and expired is None
+    assert count == 2
@@ -0,0 +1,64 @@
+import io
+import subprocess
+import sys
+from pathlib import Path
+
+from PIL import Image
+
+import images
+from images import build_collage, image_dhash, preprocess_image
+
+
+def _jpeg(size, color='green', exif_orientation=None) -> bytes:
+    image = Image.new('RGB', size, color)
+    output = io.BytesIO()
+    if exif_orientation:
+        exif = Image.Exif()
+        exif[0x0112] = exif_orientation
+        image.save(output, format='JPEG', exif=exif.tobytes())
+    else:
+        image.save(output, format='JPEG')
+    return output.getvalue()
+
+
+def test_small_upright_jpeg_passes_through():
+    data = _jpeg((100, 80))
+    prepared = preprocess_image(data, {'llm': 512, 'plantnet': 1024})
+    assert prepared.variants == {'llm': data, 'plantnet': data}
+    assert prepared.size == (100, 80)
+
+
+def test_large_image_is_downscaled_per_consumer():
+    png = io.BytesIO()
+    Image.new('RGB', (2000, 1000), 'red').save(png, format='PNG')
+    prepared = preprocess_image(png.getvalue(), {'llm': 512, 'plantnet': 1024})
+    sizes = {name: Image.open(io.BytesIO(data)).size for name, data in prepared.variants.items()}
+    assert sizes == {'llm': (512, 256), 'plantnet': (1024, 512)}
+
+
+def test_exif_orientation_is_applied():
+    prepared = preprocess_image(_jpeg((200, 100), exif_orientation=6), {'llm': 512})
+    assert prepared.size == (100, 200)
+    assert Image.open(io.BytesIO(prepared.variants['llm'])).size == (100, 200)
+
+
+def test_dhash_ignores_scale():
+    image = Image.linear_gradient('L').convert('RGB')
+    assert image_dhash(image) == image_dhash(image.resize((64, 64)))
+
+
+def test_collage_tiles_images_into_one_jpeg():
+    images = [_jpeg((300, 200), color) for color in ('red', 'green', 'blue')]
+    assert build_collage(images[:1], 512) == images[0]
+    collage = Image.open(io.BytesIO(build_collage(images, 512)))
+    assert collage.format == 'JPEG'
+    assert collage.size == (512, 512)
+
+
+def test_pool_workers_only_import_the_preprocessing_module():
+    # Spawned pool workers unpickle preprocess_image by module name; that must not pull in the app
+    backend = Path(images.__file__).parent
+    code = "import sys, images; print(sorted({'server', 'fastapi', 'motor', 'openai'} & set(sys.modules)))"
+    output = subprocess.run([sys.executable, '-c', code], cwd=backend, capture_output=True, text=True, check=True)
+    assert preprocess_image.__module__ == build_collage.__module__ == 'images'
+    assert output.stdout.strip() == '[]'
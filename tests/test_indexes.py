@@ -0,0 +1,39 @@
+import asyncio
+
+from mongomock_motor import AsyncMongoMockClient
+from pymongo import ASCENDING, IndexModel
+
+from indexes import REQUIRED_INDEXES, IndexManager
+
+
+def test_ensure_creates_missing_indexes_and_reports_drift():
+    db = AsyncMongoMockClient()['test']
+    manager = IndexManager(REQUIRED_INDEXES)
+
+    async def main():
+        await db.reminders.create_index([("due_date", ASCENDING)], name="due_date")
+        first = await manager.ensure(db)
+        second = await manager.diff(db)
+        return first, second
+
+    first, second = asyncio.run(main())
+    assert first["user_plants"]["created"] == ["id_unique", "user_id_date_added_id"]
+    assert first["reminders"]["unexpected"] == ["due_date"]
+    assert all(not drift["missing"] and not drift["conflicting"] for drift in second.values())
+
+
+def test_diff_flags_conflicting_spec():
+    db = AsyncMongoMockClient()['test']
+    manager = IndexManager({"user_plants": [IndexModel([("id", ASCENDING)], name="id_unique", unique=True)]})
+
+    async def main():
+        await db.user_plants.create_index([("id", ASCENDING)], name="id_unique")
+        return await manager.diff(db)
+
+    assert asyncio.run(main())["user_plants"]["conflicting"] == ["id_unique"]
+
+
+def test_stages_walks_nested_plans():
+    plan = {"stage": "SORT", "inputStage": {"stage": "FETCH", "inputStage": {"stage": "COLLSCAN"}},
+            "inputStages": [{"stage": "IXSCAN"}]}
+    assert list(IndexManager._stages(plan)) == ["SORT", "FETCH", "COLLSCAN", "IXSCAN"]
@@ -0,0 +1,72 @@
+import asyncio
+
+import httpx
+import pytest
+from openai import APIStatusError, AuthenticationError
+
+from llm_router import ModelRouter, llm_error_retryable
+
+
+def _status_error(status: int, cls=APIStatusError, headers=None) -> APIStatusError:
+    request = httpx.Request('POST', 'https://openrouter.test/chat/completions')
+    response = httpx.Response(status, request=request, headers=headers or {})
+    return cls('error', response=response, body=None)
+
+
+def _router(**kwargs) -> ModelRouter:
+    options = dict(alpha=0.5, race_after=0, cooldown=30)
+    options.update(kwargs)
+    return ModelRouter('chat', ['a', 'b'], **options)
+
+
+def test_retryable_errors():
+    assert llm_error_retryable(_status_error(429))
+    assert llm_error_retryable(_status_error(502))
+    assert llm_error_retryable(asyncio.TimeoutError())
+    assert not llm_error_retryable(_status_error(400))
+
+
+def test_falls_back_on_rate_limit_and_cools_the_model_down():
+    router = _router()
+
+    async def call(model):
+        if model == 'a':
+            raise _status_error(429, headers={'retry-after': '120'})
+        return model
+
+    assert asyncio.run(router.run(call)) == 'b'
+    assert router.ranked() == ['b', 'a']
+    assert router.counters['fallbacks'] == 1
+
+
+def test_non_retryable_error_is_raised():
+    router = _router()
+
+    async def call(model):
+        raise _status_error(401, cls=AuthenticationError)
+
+    with pytest.raises(AuthenticationError):
+        asyncio.run(router.run(call))
+
+
+def test_slow_interactive_call_races_the_next_model():
+    router = _router(race_after=0.01)
+
+    async def call(model):
+        await asyncio.sleep(1 if model == 'a' else 0)
+        return model
+
+    assert asyncio.run(router.run(call)) == 'b'
+    assert router.counters['races'] == 1
+    assert router.ranked()[0] == 'b'
+
+
+def test_background_calls_do_not_race():
+    router = _router(race_after=0.01)
+
+    async def call(model):
+        await asyncio.sleep(0.05)
+        return model
+
+    assert asyncio.run(router.run(call, interactive=False)) == 'a'
+    assert router.counters['races'] == 0
@@ -0,0 +1,30 @@
+import asyncio
+
+import aiohttp
+import httpx
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+from metrics import MetricsMiddleware, upstream_error_reason
+
+
+def test_upstream_error_reason():
+    assert upstream_error_reason(asyncio.TimeoutError()) == 'timeout'
+    assert upstream_error_reason(httpx.ReadTimeout('slow')) == 'timeout'
+    assert upstream_error_reason(aiohttp.ClientConnectionError()) == 'connection'
+    assert upstream_error_reason(ValueError()) == 'ValueError'
+
+
+def test_middleware_labels_requests_by_route_template():
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get('/metrics-test/{item_id}')
+    async def item(item_id: str):
+        return {"id": item_id}
+
+    labels = {'method': 'GET', 'route': '/metrics-test/{item_id}', 'status': '200'}
+    before = REGISTRY.get_sample_value('plauntie_http_request_duration_seconds_count', labels) or 0
+    TestClient(app).get('/metrics-test/42')
+    assert REGISTRY.get_sample_value('plauntie_http_request_duration_seconds_count', labels) == before + 1
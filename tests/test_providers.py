@@ -0,0 +1,208 @@
+import asyncio
+import time
+
+import pytest
+from aiohttp import web
+
+from providers import (
+    PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, CircuitBreaker, CircuitOpenError, ProviderClient,
+    QuotaExceededError, QuotaScheduler,
+)
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=60)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def _half_open(breaker: CircuitBreaker):
+    breaker.opened_at = time.monotonic() - breaker.reset_seconds
+
+
+def test_half_open_lets_one_trial_through():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=60)
+    breaker.record_failure()
+    _half_open(breaker)
+    assert breaker.state == "half-open"
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.release()
+    assert breaker.allow()
+
+
+def test_trial_success_closes_and_failure_reopens():
+    breaker = CircuitBreaker(failure_threshold=3, reset_seconds=60)
+    for _ in range(3):
+        breaker.record_failure()
+    _half_open(breaker)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    _half_open(breaker)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.failures == 0
+
+
+def _quota(**kwargs) -> QuotaScheduler:
+    options = dict(name="test", per_minute=0, per_day=0, background_reserve=0.2,
+                   max_wait={PRIORITY_INTERACTIVE: 1.0, PRIORITY_BACKGROUND: 0.0})
+    options.update(kwargs)
+    return QuotaScheduler(**options)
+
+
+def test_daily_reserve_is_kept_for_interactive_calls():
+    quota = _quota(per_day=5)
+    for _ in range(4):
+        assert quota.try_acquire(PRIORITY_BACKGROUND)
+    assert not quota.try_acquire(PRIORITY_BACKGROUND)
+    assert quota.try_acquire(PRIORITY_INTERACTIVE)
+    with pytest.raises(QuotaExceededError):
+        asyncio.run(quota.acquire(PRIORITY_INTERACTIVE))
+
+
+def test_queued_interactive_calls_go_before_background():
+    quota = _quota(per_minute=600, max_wait={PRIORITY_INTERACTIVE: 1.0, PRIORITY_BACKGROUND: 1.0})
+    quota.tokens = 0.0
+    order = []
+
+    async def take(priority, label):
+        await quota.acquire(priority)
+        order.append(label)
+
+    async def main():
+        background = asyncio.create_task(take(PRIORITY_BACKGROUND, "background"))
+        await asyncio.sleep(0)
+        await asyncio.gather(background, take(PRIORITY_INTERACTIVE, "interactive"))
+
+    asyncio.run(main())
+    assert order == ["interactive", "background"]
+
+
+def test_provider_429_blocks_the_minute_bucket():
+    quota = _quota(per_minute=60)
+    quota.throttled(retry_after=30)
+    assert not quota.try_acquire(PRIORITY_INTERACTIVE)
+    assert quota.stats()["blocked_for_seconds"] > 29
+
+
+async def _serve(handlers):
+    app = web.Application()
+    for path, handler in handlers.items():
+        app.router.add_get(path, handler)
+    runner = web.AppRunner(app, shutdown_timeout=0.1)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+def _client(hedge=False) -> ProviderClient:
+    client = ProviderClient("test", connect_timeout=1, read_timeout=5, total_timeout=5, hedge=hedge)
+    client.breaker = CircuitBreaker(failure_threshold=1, reset_seconds=60)
+    return client
+
+
+def test_cancelled_trial_is_released():
+    async def slow(request):
+        await asyncio.sleep(5)
+        return web.json_response({})
+
+    async def main():
+        runner, base = await _serve({'/slow': slow})
+        client = _client()
+        client.breaker.record_failure()
+        _half_open(client.breaker)
+        task = asyncio.create_task(client.get(f"{base}/slow"))
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        state, allowed = client.breaker.state, client.breaker.allow()
+        await client.close()
+        await runner.cleanup()
+        return state, allowed
+
+    assert asyncio.run(main()) == ("half-open", True)
+
+
+def test_unparseable_body_is_recorded_as_a_failure():
+    async def broken(request):
+        return web.Response(text="<html>not json</html>")
+
+    async def main():
+        runner, base = await _serve({'/broken': broken})
+        client = _client()
+        client.breaker.record_failure()
+        _half_open(client.breaker)
+        with pytest.raises(ValueError):
+            await client.get(f"{base}/broken")
+        with pytest.raises(CircuitOpenError):
+            await client.get(f"{base}/broken")
+        stats = client.stats()
+        await client.close()
+        await runner.cleanup()
+        return stats
+
+    stats = asyncio.run(main())
+    assert stats["circuit"] == "open"
+    assert stats["failures"] == 1
+    assert stats["rejected"] == 1
+
+
+def test_hedge_wins_over_a_slow_first_attempt():
+    calls = []
+
+    async def flaky(request):
+        calls.append(1)
+        if len(calls) == 1:
+            await asyncio.sleep(5)
+        return web.json_response({"attempt": len(calls)})
+
+    async def main():
+        runner, base = await _serve({'/flaky': flaky})
+        client = _client(hedge=True)
+        client.hedge_delay = lambda: 0.05
+        response = await client.get(f"{base}/flaky")
+        stats = client.stats()
+        await client.close()
+        await runner.cleanup()
+        return response, stats
+
+    response, stats = asyncio.run(main())
+    assert response.data == {"attempt": 2}
+    assert stats["hedged"] == 1
+    assert stats["hedge_wins"] == 1
+    assert stats["circuit"] == "closed"
+
+
+def test_cancelling_a_hedged_request_cancels_its_attempts():
+    async def slow(request):
+        await asyncio.sleep(5)
+        return web.json_response({})
+
+    async def main():
+        runner, base = await _serve({'/slow': slow})
+        client = _client(hedge=True)
+        client.hedge_delay = lambda: 10
+        task = asyncio.create_task(client.get(f"{base}/slow"))
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await asyncio.sleep(0)
+        leftover = [t for t in asyncio.all_tasks() if t is not asyncio.current_task() and not t.done()
+                    and '_attempt' in repr(t.get_coro())]
+        await client.close()
+        await runner.cleanup()
+        return leftover
+
+    assert asyncio.run(main()) == []
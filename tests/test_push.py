@@ -0,0 +1,106 @@
+import asyncio
+import base64
+import os
+import threading
+import time
+
+from aiohttp import web
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from mongomock_motor import AsyncMongoMockClient
+
+import push
+from push import PushDeliveryService, PushJob
+
+
+def test_dead_endpoints_are_deleted_in_one_batch():
+    db = AsyncMongoMockClient()['test']
+
+    async def main():
+        service = PushDeliveryService(workers=1, queue_size=10, get_database=lambda: db)
+        await db.push_subscriptions.insert_many([
+            {"endpoint": f"https://push.test/{i}", "user_id": "u"} for i in range(3)
+        ])
+        service._dead_endpoints.update({"https://push.test/0", "https://push.test/2"})
+        await service._flush_dead_endpoints()
+        remaining = [doc["endpoint"] async for doc in db.push_subscriptions.find({})]
+        return service, remaining
+
+    service, remaining = asyncio.run(main())
+    assert remaining == ["https://push.test/1"]
+    assert service.pruned == 2
+    assert not service._dead_endpoints
+
+
+def test_dead_endpoints_are_dropped_without_a_database():
+    async def main():
+        service = PushDeliveryService(workers=1, queue_size=10, get_database=lambda: None)
+        service._dead_endpoints.add("https://push.test/0")
+        await service._flush_dead_endpoints()
+        return service
+
+    service = asyncio.run(main())
+    assert not service._dead_endpoints
+    assert service.pruned == 0
+
+
+def test_pushes_per_second_uses_a_sliding_window():
+    async def main():
+        return PushDeliveryService(workers=1, queue_size=10, get_database=lambda: None)
+
+    service = asyncio.run(main())
+    now = time.monotonic()
+    service._recent.extend([now - 120, now - 30, now - 1])
+    assert service.pushes_per_second(window=60) == 2 / 60
+    assert len(service._recent) == 2
+
+
+def _b64(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode()
+
+
+def _subscription(endpoint: str):
+    public_key = ec.generate_private_key(ec.SECP256R1()).public_key().public_bytes(
+        serialization.Encoding.X962, serialization.PublicFormat.UncompressedPoint,
+    )
+    return {"endpoint": endpoint, "keys": {"p256dh": _b64(public_key), "auth": _b64(os.urandom(16))}}
+
+
+def test_payload_is_encrypted_off_the_event_loop(monkeypatch):
+    vapid_key = ec.generate_private_key(ec.SECP256R1()).private_numbers().private_value.to_bytes(32, 'big')
+    monkeypatch.setattr(push, 'VAPID_PRIVATE_KEY', _b64(vapid_key))
+    encrypt_threads, received = [], []
+    encrypt = PushDeliveryService._encrypt
+
+    def tracked_encrypt(*args):
+        encrypt_threads.append(threading.current_thread())
+        return encrypt(*args)
+
+    monkeypatch.setattr(PushDeliveryService, '_encrypt', staticmethod(tracked_encrypt))
+
+    async def accept(request):
+        received.append((request.headers.get('Content-Encoding'), await request.read()))
+        return web.Response(status=201)
+
+    async def main():
+        app = web.Application()
+        app.router.add_post('/push', accept)
+        runner = web.AppRunner(app, shutdown_timeout=0.1)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        service = PushDeliveryService(workers=1, queue_size=10, get_database=lambda: None)
+        service.start()
+        try:
+            endpoint = f"http://127.0.0.1:{runner.addresses[0][1]}/push"
+            await service._deliver(PushJob(_subscription(endpoint), "Полейте фикус"))
+        finally:
+            await service.stop()
+            await runner.cleanup()
+        return service
+
+    service = asyncio.run(main())
+    assert service.sent == 1
+    assert encrypt_threads and encrypt_threads[0] is not threading.main_thread()
+    encoding, body = received[0]
+    assert encoding == "aes128gcm" and "Полейте".encode() not in body
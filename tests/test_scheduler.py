@@ -0,0 +1,60 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from mongomock_motor import AsyncMongoMockClient
+
+from models import Reminder
+from scheduler import ReminderScheduler
+
+
+def _reminder(reminder_id: str, user_id: str, due_in: float) -> Reminder:
+    return Reminder(id=reminder_id, user_id=user_id, plant_id="p", plant_nickname="Фикус",
+                    reminder_type="watering", due_date=datetime.utcnow() + timedelta(seconds=due_in))
+
+
+def _scheduler(db, dispatched, **kwargs) -> ReminderScheduler:
+    async def dispatch(reminders):
+        dispatched.extend(reminders)
+
+    options = dict(window=3600, poll_interval=60, max_lateness=3600, batch_size=100)
+    options.update(kwargs)
+    return ReminderScheduler(**options, get_database=lambda: db, dispatch=dispatch)
+
+
+def test_pop_due_returns_due_reminders_in_order():
+    scheduler = _scheduler(None, [])
+    scheduler._window_end = datetime.utcnow() + timedelta(hours=1)
+    for reminder_id, due_in in (("late", -10), ("later", 600), ("early", -20)):
+        scheduler.schedule(_reminder(reminder_id, "u", due_in))
+    scheduler.discard("late")
+    assert scheduler._pop_due(datetime.utcnow()) == ["early"]
+    assert len(scheduler) == 2
+
+
+def test_dispatch_claims_each_reminder_once():
+    db = AsyncMongoMockClient()['test']
+    dispatched = []
+
+    async def main():
+        reminders = [_reminder("r1", "u", -5), _reminder("r2", "u", -5)]
+        await db.reminders.insert_many([r.model_dump() for r in reminders])
+        await db.reminders.update_one({"id": "r2"}, {"$set": {"notified_at": datetime.utcnow()}})
+
+        first = _scheduler(db, dispatched)
+        second = _scheduler(db, dispatched)
+        await first._load_window(datetime.utcnow())
+        await second._load_window(datetime.utcnow())
+        await first._dispatch(first._pop_due(datetime.utcnow()))
+        await second._dispatch(second._pop_due(datetime.utcnow()))
+
+    asyncio.run(main())
+    assert [reminder.id for reminder in dispatched] == ["r1"]
+
+
+def test_digest_pulls_in_reminders_due_soon_for_the_same_user():
+    scheduler = _scheduler(None, [])
+    scheduler.digest_window = timedelta(minutes=30)
+    scheduler._window_end = datetime.utcnow() + timedelta(hours=1)
+    for reminder_id, user_id, due_in in (("due", "u", -1), ("soon", "u", 600), ("other", "v", 600), ("far", "u", 3000)):
+        scheduler.schedule(_reminder(reminder_id, user_id, due_in))
+    assert scheduler._digest_companions(["due"], datetime.utcnow()) == ["soon"]
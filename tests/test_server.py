@@ -0,0 +1,139 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+
+import server
+from chat import ChatSessionStore
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(server, 'db', AsyncMongoMockClient()['test'])
+    return TestClient(server.app)
+
+
+def _insert_reminders(count: int):
+    docs = [{
+        "id": f"r{i}", "user_id": "u", "plant_id": "p", "plant_nickname": "Фикус", "reminder_type": "watering",
+        "due_date": datetime.utcnow() + timedelta(hours=i), "completed": False, "created_at": datetime.utcnow(),
+        "notified_at": None, "notify_claim": "claim", "completion_id": "c",
+    } for i in range(count)]
+    asyncio.run(server.db.reminders.insert_many(docs))
+
+
+def test_listing_returns_only_model_fields(client):
+    _insert_reminders(1)
+    body = client.get("/api/user/u/reminders").json()
+    assert set(body[0]) <= set(server.Reminder.model_fields)
+    assert {"id", "due_date", "notified_at"} <= set(body[0])
+
+
+def test_listing_fields_and_cursor(client):
+    _insert_reminders(3)
+    response = client.get("/api/user/u/reminders", params={"fields": "id", "limit": 2},
+                          headers={"Origin": "https://app.test"})
+    assert [set(item) for item in response.json()] == [{"id", "due_date"}] * 2
+    assert "x-next-cursor" in response.headers["access-control-expose-headers"].lower()
+    rest = client.get("/api/user/u/reminders", params={"fields": "id", "cursor": response.headers["X-Next-Cursor"]})
+    assert [item["id"] for item in rest.json()] == ["r2"]
+    assert "X-Next-Cursor" not in rest.headers
+    assert client.get("/api/user/u/reminders", params={"fields": "id,notify_claim"}).status_code == 400
+
+
+def test_listing_schema_allows_trimmed_items(client):
+    schema = client.get("/openapi.json").json()
+    response = schema["paths"]["/api/user/{user_id}/reminders"]["get"]["responses"]["200"]
+    assert response["content"]["application/json"]["schema"]["items"]["$ref"].endswith("/ReminderFields")
+    assert "X-Next-Cursor" in response["headers"]
+    assert "required" not in schema["components"]["schemas"]["ReminderFields"]
+
+
+def test_chat_with_unknown_session_is_a_404(client, monkeypatch, tmp_path):
+    store = ChatSessionStore(str(tmp_path / 'sessions.sqlite3'), max_sessions=10, idle_ttl=60, token_budget=1000)
+    monkeypatch.setattr(server, 'chat_sessions', store)
+    body = {"message": "Как поливать фикус?", "session_id": "made-up"}
+    assert client.post("/api/chat", json=body).status_code == 404
+    assert client.post("/api/chat/stream", json=body).status_code == 404
+    session_id = client.post("/api/chat/sessions").json()["session_id"]
+    assert str(uuid.UUID(session_id, version=4)) == session_id
+    assert client.get(f"/api/chat/sessions/{session_id}").json()["turns"] == []
+    assert client.delete(f"/api/chat/sessions/{session_id}").status_code == 200
+    assert client.get(f"/api/chat/sessions/{session_id}").status_code == 404
+
+
+def _fake_identification(monkeypatch, plantnet_delay: float, llm_delay: float = 0.0):
+    prompts = []
+
+    async def identify_plant_plantnet(images):
+        await asyncio.sleep(plantnet_delay)
+        return server.PlantIdentification(identified_name="Ficus elastica", confidence=0.9)
+
+    async def get_image_analysis(image, prompt):
+        prompts.append(prompt)
+        await asyncio.sleep(llm_delay)
+        return "Это фикус"
+
+    monkeypatch.setattr(server.plant_service, 'identify_plant_plantnet', identify_plant_plantnet)
+    monkeypatch.setattr(server.llm_service, 'get_image_analysis', get_image_analysis)
+    return prompts
+
+
+def test_identification_sends_one_llm_request_with_the_plantnet_name(monkeypatch):
+    prompts = _fake_identification(monkeypatch, plantnet_delay=0.02)
+    monkeypatch.setattr(server, 'IDENTIFY_ENRICH_DEADLINE_SECONDS', 1.0)
+    result = asyncio.run(server.run_identification_pipeline([(b'jpeg', 'auto')], b'jpeg'))
+    assert prompts == [server.identify_prompt_for("Ficus elastica")]
+    assert (result.identified_name, result.plauntie_description, result.partial) == ("Ficus elastica", "Это фикус", False)
+
+
+def test_identification_falls_back_to_the_generic_prompt_after_the_enrich_deadline(monkeypatch):
+    prompts = _fake_identification(monkeypatch, plantnet_delay=0.2)
+    monkeypatch.setattr(server, 'IDENTIFY_ENRICH_DEADLINE_SECONDS', 0.02)
+    result = asyncio.run(server.run_identification_pipeline([(b'jpeg', 'auto')], b'jpeg', photo_note="Коллаж."))
+    assert prompts == ["Коллаж. " + server.IDENTIFY_PROMPT_GENERIC]
+    assert result.identified_name == "Ficus elastica"
+    assert not result.partial
+
+
+def test_identification_is_partial_when_the_llm_misses_its_deadline(monkeypatch):
+    _fake_identification(monkeypatch, plantnet_delay=0, llm_delay=1)
+    monkeypatch.setattr(server, 'IDENTIFY_LLM_TIMEOUT_SECONDS', 0.05)
+    result = asyncio.run(server.run_identification_pipeline([(b'jpeg', 'auto')], b'jpeg'))
+    assert result.identified_name == "Ficus elastica"
+    assert result.plauntie_description is None
+    assert result.partial
+
+
+def test_bulk_add_reports_reminder_failures_per_item(client, monkeypatch):
+    scheduled = []
+    monkeypatch.setattr(server.reminder_scheduler, 'schedule', scheduled.append)
+    asyncio.run(server.db.reminders.create_index([("plant_nickname", 1), ("reminder_type", 1)], unique=True))
+    asyncio.run(server.db.reminders.insert_one({"plant_nickname": "Taken", "reminder_type": "watering"}))
+    plants = [{"plant_id": "1", "nickname": "Free"}, {"plant_id": "2", "nickname": "Taken"}]
+    body = client.post("/api/user/u/plants/bulk", json={"plants": plants}).json()
+    assert [result["ok"] for result in body["results"]] == [True, False]
+    assert body["succeeded"] == 1 and body["failed"] == 1
+    assert body["results"][1]["plant"]["nickname"] == "Taken"
+    assert "reminders" in body["results"][1]["error"]
+    assert asyncio.run(server.db.user_plants.count_documents({})) == 2
+    assert sorted(reminder.plant_nickname for reminder in scheduled) == ["Free", "Free", "Taken"]
+
+
+def test_bulk_complete_reports_repeated_ids(client, monkeypatch):
+    discarded = []
+    monkeypatch.setattr(server.reminder_scheduler, 'discard', discarded.append)
+    reminder = server.Reminder(id="r1", user_id="u", plant_id="p", plant_nickname="Фикус",
+                               reminder_type="watering", due_date=datetime.utcnow(), frequency_days=7)
+    asyncio.run(server.db.reminders.insert_one(reminder.model_dump()))
+    body = client.post("/api/user/u/reminders/bulk-complete", json={"reminder_ids": ["r1", "r1", "r2"]}).json()
+    assert [(result["reminder_id"], result["ok"]) for result in body["results"]] == [
+        ("r1", True), ("r1", False), ("r2", False),
+    ]
+    assert body["results"][1]["error"] == "Duplicate reminder id"
+    assert body["succeeded"] == 1 and body["failed"] == 2
+    assert discarded == ["r1"]
+    assert asyncio.run(server.db.reminders.count_documents({"completed": False})) == 1
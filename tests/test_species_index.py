@@ -0,0 +1,47 @@
+import json
+
+from species_index import SpeciesIndex, read_species_records
+
+RECORDS = [
+    {"id": 1, "common_name": "Rubber plant", "scientific_name": ["Ficus elastica"], "other_name": ["Фикус каучуконосный"]},
+    {"id": 2, "common_name": "Weeping fig", "scientific_name": ["Ficus benjamina"]},
+    {"id": 3, "common_name": "Swiss cheese plant", "scientific_name": ["Monstera deliciosa"]},
+    {"id": 3, "common_name": "Duplicate", "scientific_name": ["Monstera deliciosa"]},
+]
+
+
+def _index(tmp_path) -> SpeciesIndex:
+    path = str(tmp_path / 'species.idx')
+    SpeciesIndex.build(RECORDS, path)
+    return SpeciesIndex(path)
+
+
+def test_build_skips_duplicate_ids(tmp_path):
+    index = _index(tmp_path)
+    assert len(index) == 3
+    index.close()
+
+
+def test_search_tolerates_typos_and_ranks_exact_first(tmp_path):
+    index = _index(tmp_path)
+    assert index.search("monstera delicosa")[0].name == "Swiss cheese plant"
+    assert [result.id for result in index.search("ficus")][:2] in (["1", "2"], ["2", "1"])
+    assert index.search("weeping fig")[0].id == "2"
+    index.close()
+
+
+def test_search_matches_other_names(tmp_path):
+    index = _index(tmp_path)
+    assert index.search("фикус каучуконосный")[0].id == "1"
+    assert index.search("x") == []
+    index.close()
+
+
+def test_open_if_exists(tmp_path):
+    assert SpeciesIndex.open_if_exists(str(tmp_path / 'missing.idx')) is None
+
+
+def test_read_species_records_unwraps_pages(tmp_path):
+    path = tmp_path / 'dump.jsonl'
+    path.write_text("\n".join(json.dumps(page) for page in ({"data": RECORDS[:2]}, RECORDS[2])), encoding='utf-8')
+    assert [record["id"] for record in read_species_records(str(path))] == [1, 2, 3]
@@ -0,0 +1,54 @@
+from translation import QueryTranslator, RussianStemmer
+
+ENTRIES = [
+    ("роза", "rose"), ("фиалка", "violet"), ("фиалка узамбарская", "african violet"), ("фикус", "ficus"),
+    ("мята", "mint"), ("орхидея", "orchid"), ("щучий хвост", "snake plant"),
+]
+
+
+def test_words_fold_case_and_yo():
+    assert RussianStemmer.words("Ёлка, КАКТУС!") == ["елка", "кактус"]
+
+
+def test_stemmer_leaves_latin_words_alone():
+    assert RussianStemmer().stem("monstera") == "monstera"
+
+
+def test_translate_keeps_latin_words_and_drops_unknown_russian():
+    translator = QueryTranslator(ENTRIES)
+    assert translator.translate("фикус benjamina") == "ficus benjamina"
+    assert translator.translate("красивый фикус") == "ficus"
+    assert translator.translate("кактус") is None
+
+
+def test_translate_matches_inflected_nouns():
+    translator = QueryTranslator(ENTRIES)
+    assert translator.translate("розы") == "rose"
+    assert translator.translate("розу") == "rose"
+    assert translator.translate("мяту") == "mint"
+    assert translator.translate("орхидеи") == "orchid"
+    assert translator.translate("орхидею") == "orchid"
+
+
+def test_translate_prefers_longest_phrase():
+    translator = QueryTranslator(ENTRIES)
+    assert translator.translate("фиалка узамбарская") == "african violet"
+    assert translator.translate("фиалки узамбарские") == "african violet"
+    assert translator.translate("фиалка") == "violet"
+
+
+def test_translate_keeps_adjectives_off_noun_entries():
+    translator = QueryTranslator(ENTRIES)
+    assert translator.translate("мятый") is None
+    assert translator.translate("мятая") is None
+    assert translator.translate("мятые листья") is None
+    assert translator.translate("розовая роза") == "rose"
+    assert translator.translate("щучьего хвоста") == "snake plant"
+
+
+def test_from_file_skips_comments(tmp_path):
+    path = tmp_path / 'translations.tsv'
+    path.write_text("# ru\ten\nроза\trose\nбез перевода\n", encoding='utf-8')
+    translator = QueryTranslator.from_file(str(path))
+    assert translator.size == 1
+    assert QueryTranslator.from_file(str(tmp_path / 'missing.tsv')).size == 0
@@ -0,0 +1,80 @@
+import asyncio
+import io
+import tempfile
+
+import pytest
+from fastapi import FastAPI, HTTPException, UploadFile
+from fastapi.testclient import TestClient
+from PIL import Image
+
+import uploads
+from uploads import UploadSizeLimitMiddleware, prepare_upload, prepare_uploads, read_upload
+
+
+@pytest.fixture(autouse=True)
+def thread_preprocessing(monkeypatch):
+    monkeypatch.setattr(uploads, 'IMAGE_PREPROCESS_WORKERS', 0)
+
+
+def _upload(data: bytes) -> UploadFile:
+    return UploadFile(io.BytesIO(data), size=len(data), filename='plant.jpg')
+
+
+def _jpeg(size=(64, 64)) -> bytes:
+    output = io.BytesIO()
+    Image.new('RGB', size, 'green').save(output, format='JPEG')
+    return output.getvalue()
+
+
+def test_prepare_upload_decodes_image():
+    prepared = asyncio.run(prepare_upload(_upload(_jpeg())))
+    assert prepared.size == (64, 64)
+    assert set(prepared.variants) == set(uploads.IMAGE_MAX_EDGES)
+
+
+def test_upload_is_read_from_the_request_spool_file():
+    data = _jpeg()
+    spool = tempfile.SpooledTemporaryFile(max_size=16)
+    spool.write(data)
+    upload = UploadFile(spool, size=len(data), filename='plant.jpg')
+    assert spool._rolled
+    assert asyncio.run(read_upload(upload)) == data
+    assert asyncio.run(prepare_upload(upload)).size == (64, 64)
+
+
+def test_invalid_image_is_a_400():
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(prepare_upload(_upload(b'not an image')))
+    assert raised.value.status_code == 400
+
+
+def test_oversized_upload_is_a_413(monkeypatch):
+    monkeypatch.setattr(uploads, 'MAX_UPLOAD_BYTES', 100)
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(prepare_upload(_upload(_jpeg())))
+    assert raised.value.status_code == 413
+    unsized = UploadFile(io.BytesIO(_jpeg()), filename='plant.jpg')
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(read_upload(unsized))
+    assert raised.value.status_code == 413
+
+
+def test_prepare_uploads_fails_on_any_bad_file():
+    with pytest.raises(HTTPException):
+        asyncio.run(prepare_uploads([_upload(_jpeg()), _upload(b'broken')]))
+
+
+def test_middleware_limits_multipart_bodies_per_path():
+    app = FastAPI()
+    app.add_middleware(UploadSizeLimitMiddleware, max_bytes=1000, path_limits={'/multi': 5000})
+
+    @app.post('/single')
+    @app.post('/multi')
+    async def accept():
+        return {"ok": True}
+
+    client = TestClient(app)
+    files = {'file': ('plant.jpg', b'x' * 2000, 'image/jpeg')}
+    assert client.post('/single', files=files).status_code == 413
+    assert client.post('/multi', files=files).status_code == 200
+    assert client.post('/single', content=b'x' * 2000).status_code == 200